@@ -149,25 +149,65 @@ CORS_ALLOWED_ORIGINS = [
 # Search configuration
 HAYSTACK_CONNECTIONS = {
     'default': {
-        'ENGINE': 'haystack.backends.whoosh_backend.WhooshEngine',
+        # Whoosh with per-process pooled searchers for Haystack queries; the
+        # search page and the API use FTS5 (see poetry/search.py)
+        'ENGINE': 'poetry.search_backends.PooledWhooshEngine',
         'PATH': BASE_DIR / 'whoosh_index',
     },
 }
 
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+HAYSTACK_SIGNAL_PROCESSOR = 'poetry.search_signals.QueuedSignalProcessor'
 
-# Caching
+# Whoosh compaction and write lock recovery (see poetry/search_index.py)
+SEARCH_INDEX_MAINTENANCE = {
+    'OFF_PEAK_HOURS': (2, 6),
+    'MAX_SEGMENTS': config('SEARCH_INDEX_MAX_SEGMENTS', default=8, cast=int),
+    'MAX_DELETED_RATIO': 0.2,
+    'STALE_LOCK_AFTER': config('SEARCH_INDEX_STALE_LOCK_AFTER', default=600, cast=int),
+    'WRITER_TIMEOUT': 30,
+}
+
+# Ranked search result ids (see poetry/search_cache.py)
+SEARCH_RESULT_CACHE = {
+    'TIMEOUT': config('SEARCH_RESULT_CACHE_TTL', default=600, cast=int),
+    'MAX_RESULTS': 1000,
+}
+
+# Version-keyed page blocks such as the home page (see poetry/caching.py)
+BLOCK_CACHE = {
+    'TIMEOUT': config('BLOCK_CACHE_TTL', default=3600, cast=int),
+    'LOCK_TIMEOUT': 30,
+    'WAIT': 5,
+}
+
+# Materialized statistics page (see poetry/site_stats.py)
+SITE_STATISTICS = {
+    'TOP_N': 10,
+    'RECENT_N': 5,
+    'REFRESH_INTERVAL': 60,
+}
+
+# Caching: per-process LRU in front of a SQLite file shared by all workers
+# (see poetry/cache_backends.py). The test runner points it at a temporary
+# file, since tests clear the cache.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'poetry.cache_backends.TwoTierCache',
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache' / 'default.sqlite3')),
         'TIMEOUT': config('CACHE_TTL', default=60, cast=int),
         'OPTIONS': {
-            'MAX_ENTRIES': 1000,
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=20000, cast=int),
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+            'EARLY_REFRESH_BETA': 1.0,
+            'STATS_INTERVAL': 30,
+            'CULL_INTERVAL': 60,
         }
     }
 }
 
+TEST_RUNNER = 'poetry.testing.TestRunner'
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -221,4 +261,18 @@ PAGINATION_SETTINGS = {
     'BOOKS_PER_PAGE': 15,
     'POEMS_PER_PAGE': 20,
     'SEARCH_RESULTS_PER_PAGE': 15,
-}
\ No newline at end of file
+}
+
+# Write-behind view counter (see poetry/buffers.py)
+VIEW_COUNT_BUFFER = {
+    'FLUSH_INTERVAL': config('VIEW_COUNT_FLUSH_INTERVAL', default=10, cast=int),
+    'FLUSH_THRESHOLD': config('VIEW_COUNT_FLUSH_THRESHOLD', default=100, cast=int),
+    'FLUSH_SIGNAL_FILE': BASE_DIR / 'logs' / 'flush_view_counts.signal',
+}
+
+# Write-behind reading history (see poetry/buffers.py)
+READING_HISTORY_BUFFER = {
+    'FLUSH_INTERVAL': config('READING_HISTORY_FLUSH_INTERVAL', default=5, cast=int),
+    'FLUSH_THRESHOLD': config('READING_HISTORY_FLUSH_THRESHOLD', default=200, cast=int),
+    'FLUSH_SIGNAL_FILE': BASE_DIR / 'logs' / 'flush_view_counts.signal',
+}
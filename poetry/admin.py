@@ -1,7 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
-from django.db.models import Count
 from django.utils.safestring import mark_safe
 from .models import Poet, Book, Poem, Favorite, ReadingHistory
 
@@ -54,22 +53,6 @@ class PoetAdmin(admin.ModelAdmin):
     
     actions = ['make_featured', 'make_unfeatured']
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(
-            books_count=Count('books'),
-            poems_count=Count('books__poems')
-        )
-
-    def books_count(self, obj):
-        return obj.books_count
-    books_count.short_description = 'Китобҳо'
-    books_count.admin_order_field = 'books_count'
-
-    def poems_count(self, obj):
-        return obj.poems_count
-    poems_count.short_description = 'Шеърҳо'
-    poems_count.admin_order_field = 'poems_count'
-
     def make_featured(self, request, queryset):
         queryset.update(is_featured=True)
         self.message_user(request, f"{queryset.count()} шоир намоён карда шуд.")
@@ -116,9 +99,7 @@ class BookAdmin(admin.ModelAdmin):
     actions = ['make_featured', 'make_unfeatured']
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('poet').annotate(
-            poems_count=Count('poems')
-        )
+        return super().get_queryset(request).select_related('poet')
 
     def poet_link(self, obj):
         url = reverse('admin:poetry_poet_change', args=[obj.poet.id])
@@ -126,11 +107,6 @@ class BookAdmin(admin.ModelAdmin):
     poet_link.short_description = 'Шоир'
     poet_link.admin_order_field = 'poet__name'
 
-    def poems_count(self, obj):
-        return obj.poems_count
-    poems_count.short_description = 'Шеърҳо'
-    poems_count.admin_order_field = 'poems_count'
-
     def make_featured(self, request, queryset):
         queryset.update(is_featured=True)
         self.message_user(request, f"{queryset.count()} китоб намоён карда шуд.")
@@ -0,0 +1,128 @@
+"""
+Tajik/Persian script-folding analyzer for the Whoosh index.
+
+Poems are stored in Tajik Cyrillic or Perso-Arabic script, and a reader may
+type a query in either. Every token, at index and at query time, is reduced
+to one canonical key:
+
+1. NFKC normalization, lowercasing, and removal of ZWNJ and Arabic diacritics.
+   Arabic presentation forms and the Arabic ي/ك/ى variants become the
+   Persian letters.
+2. Whole Persian words found in the ``PERSIAN_TO_TAJIK_MAPPING`` dictionary
+   (plus ``settings.PERSIAN_TO_TAJIK_DICTIONARY``) are converted to Tajik.
+3. Light stemming strips common Tajik/Persian plural, object and possessive
+   suffixes (``-ҳо``, ``-он``, ``-ро``, ``-ам``... / ``ها``, ``ان``, ``را``).
+4. Both scripts are folded to a consonant skeleton over a shared alphabet,
+   in the spirit of the ``custom_slugify`` transliteration. Short vowels are
+   written in Cyrillic but not in Perso-Arabic, so vowels are dropped, except
+   for long ``о``/``ا`` and word-initial vowels (``ин`` = ``این`` -> ``an``,
+   ``ишқ`` = ``عشق`` -> ``awq``).
+   Letters that only differ by script or spelling variant share one key
+   (ӯ/у, ӣ/и, ҳ/х/ح/خ/ه, қ/ғ/ق/غ, ی/ي, ک/ك...).
+
+The key is deliberately lossy. Cross-script recall matters more here than
+telling apart short words that differ only in a short vowel. BM25 and phrase
+positions still rank exact matches first.
+"""
+import re
+import unicodedata
+
+from whoosh.analysis import Filter, RegexTokenizer
+
+# Unicode cleanup applied before anything else
+PRE_FOLD = str.maketrans({
+    '\u200c': None, '\u200d': None, '\u0640': None,  # ZWNJ, ZWJ, tatweel
+    'ي': 'ی', 'ى': 'ی', 'ك': 'ک', 'ۀ': 'ه', 'ة': 'ه', 'أ': 'ا', 'إ': 'ا', 'ٱ': 'ا',
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},  # Persian digits
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},  # Arabic digits
+    'ў': 'ӯ',  # Short u from Russian/Uzbek layouts, common in typed Tajik
+})
+ARABIC_MARKS_RE = re.compile('[\u064b-\u065f\u0670]')
+
+CONSONANTS = {
+    # Tajik Cyrillic
+    'б': 'b', 'п': 'p', 'т': 't', 'ҷ': 'j', 'ч': 'c', 'д': 'd', 'р': 'r', 'з': 'z', 'ж': 'x',
+    'с': 's', 'ш': 'w', 'ф': 'f', 'к': 'k', 'г': 'g', 'л': 'l', 'м': 'm', 'н': 'n',
+    'х': 'h', 'ҳ': 'h', 'қ': 'q', 'ғ': 'q', 'о': 'a',
+    # Perso-Arabic
+    'ب': 'b', 'پ': 'p', 'ت': 't', 'ط': 't', 'ج': 'j', 'چ': 'c', 'د': 'd', 'ر': 'r',
+    'ز': 'z', 'ذ': 'z', 'ض': 'z', 'ظ': 'z', 'ژ': 'x', 'س': 's', 'ث': 's', 'ص': 's', 'ش': 'w',
+    'ف': 'f', 'ک': 'k', 'گ': 'g', 'ل': 'l', 'م': 'm', 'ن': 'n',
+    'ح': 'h', 'خ': 'h', 'ه': 'h', 'ق': 'q', 'غ': 'q', 'ا': 'a', 'آ': 'a',
+}
+# Short vowels, glides and signs with no reliable counterpart in the other script
+DROPPED = set('аеэиӣуӯюяёйвъь') | set('ویعءئؤ')
+VOWEL_STARTS = set('аеэиӣуӯюяёо') | set('اآع')
+
+TAJIK_SUFFIXES = sorted([
+    'ҳо', 'ҳоро', 'он', 'ён', 'гон', 'ро',
+    'ам', 'ат', 'аш', 'амон', 'атон', 'ашон', 'ятон', 'яшон',
+], key=len, reverse=True)
+PERSIAN_SUFFIXES = sorted(['ها', 'های', 'هایی', 'ان', 'را', 'شان', 'تان', 'مان'], key=len, reverse=True)
+MIN_STEM = 3
+
+
+def is_persian(text):
+    return any('\u0600' <= char <= '\u06ff' for char in text)
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text).lower().translate(PRE_FOLD)
+    return ARABIC_MARKS_RE.sub('', text)
+
+
+def to_tajik(word):
+    """Dictionary conversion of a whole Persian word; unknown words are kept"""
+    from .utils import get_persian_to_tajik_converter
+    converted = get_persian_to_tajik_converter().replace(word)
+    return normalize(converted) if not is_persian(converted) else word
+
+
+def stem(word):
+    suffixes = PERSIAN_SUFFIXES if is_persian(word) else TAJIK_SUFFIXES
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def skeleton(word):
+    out = []
+    for index, char in enumerate(word):
+        if index == 0 and char in VOWEL_STARTS:
+            key = 'a'
+        elif char in DROPPED:
+            continue
+        else:
+            key = CONSONANTS.get(char, char)
+        # Doubled consonants are written once in Perso-Arabic (tashdid)
+        if not out or out[-1] != key:
+            out.append(key)
+    # A final ه is usually a silent vowel marker; drop final h in both scripts
+    if len(out) > 1 and out[-1] == 'h':
+        out.pop()
+    return ''.join(out)
+
+
+def fold(token):
+    """Canonical, script-independent search key for one token"""
+    word = normalize(token)
+    if is_persian(word):
+        word = to_tajik(word)
+    return skeleton(stem(word))
+
+
+class ScriptFoldingFilter(Filter):
+    """Replace each token's text with its folded key, dropping empty keys"""
+
+    def __call__(self, tokens):
+        for token in tokens:
+            text = fold(token.text)
+            if text:
+                token.text = text
+                yield token
+
+
+def FoldingAnalyzer():
+    """Word tokenizer (keeping ZWNJ-joined words whole) | script folding"""
+    return RegexTokenizer(r'[\w\u200c\u200d]+') | ScriptFoldingFilter()
@@ -1,24 +1,31 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets, filters, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q, Count
-from .models import Poet, Book, Poem
-from .serializers import PoetSerializer, BookSerializer, PoemSerializer, PoemListSerializer
+from django.db.models import F
+from django.utils import timezone
+from .models import Poet, Book, Poem, BookProgress
+from .serializers import (
+    PoetSerializer, BookSerializer, PoemSerializer, PoemListSerializer, PoemSearchSerializer,
+    SuggestionSerializer, ReadingProgressBatchSerializer, BookProgressSerializer
+)
 from .filters import PoetFilter, BookFilter, PoemFilter
+from . import autocomplete
+from .buffers import reading_events
+from .pagination import KeysetPagination
+from .search import FullTextSearchFilter
+from .search_cache import cached_search
+from .site_stats import get_statistics
 
 
 class PoetViewSet(viewsets.ReadOnlyModelViewSet):
     """API endpoint for poets"""
-    queryset = Poet.objects.all().annotate(
-        books_count=Count('books'),
-        poems_count=Count('books__poems')
-    )
+    queryset = Poet.objects.all()
     serializer_class = PoetSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_class = PoetFilter
     search_fields = ['name', 'biography']
-    ordering_fields = ['name', 'birth_date', 'created_at']
+    ordering_fields = ['name', 'birth_date', 'created_at', 'books_count', 'poems_count']
     ordering = ['name']
     lookup_field = 'slug'
 
@@ -26,7 +33,7 @@ class PoetViewSet(viewsets.ReadOnlyModelViewSet):
     def books(self, request, slug=None):
         """Get all books by a specific poet"""
         poet = self.get_object()
-        books = poet.books.all()
+        books = poet.books.select_related('poet')
         serializer = BookSerializer(books, many=True)
         return Response(serializer.data)
 
@@ -34,21 +41,19 @@ class PoetViewSet(viewsets.ReadOnlyModelViewSet):
     def poems(self, request, slug=None):
         """Get all poems by a specific poet"""
         poet = self.get_object()
-        poems = Poem.objects.filter(book__poet=poet)
+        poems = Poem.objects.filter(book__poet=poet).select_related('book__poet')
         serializer = PoemListSerializer(poems, many=True)
         return Response(serializer.data)
 
 
 class BookViewSet(viewsets.ReadOnlyModelViewSet):
     """API endpoint for books"""
-    queryset = Book.objects.select_related('poet').annotate(
-        poems_count=Count('poems')
-    )
+    queryset = Book.objects.select_related('poet')
     serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_class = BookFilter
     search_fields = ['title', 'description', 'poet__name']
-    ordering_fields = ['title', 'publication_date', 'created_at']
+    ordering_fields = ['title', 'publication_date', 'created_at', 'poems_count']
     ordering = ['-publication_date']
     lookup_field = 'slug'
 
@@ -56,7 +61,7 @@ class BookViewSet(viewsets.ReadOnlyModelViewSet):
     def poems(self, request, slug=None):
         """Get all poems in a specific book"""
         book = self.get_object()
-        poems = book.poems.all()
+        poems = book.poems.select_related('book__poet')
         serializer = PoemSerializer(poems, many=True)
         return Response(serializer.data)
 
@@ -65,11 +70,12 @@ class PoemViewSet(viewsets.ReadOnlyModelViewSet):
     """API endpoint for poems"""
     queryset = Poem.objects.select_related('book__poet')
     serializer_class = PoemSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_class = PoemFilter
     search_fields = ['title', 'content', 'book__title', 'book__poet__name']
     ordering_fields = ['title', 'order', 'created_at']
-    ordering = ['order']
+    ordering = ['order', 'id']
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -83,17 +89,60 @@ class PoemViewSet(viewsets.ReadOnlyModelViewSet):
         if not query:
             return Response({'results': []})
 
-        poems = self.queryset.filter(
-            Q(title__icontains=query) |
-            Q(content__icontains=query) |
-            Q(book__title__icontains=query) |
-            Q(book__poet__name__icontains=query)
-        )
+        poems = cached_search(self.queryset, query)
         
         page = self.paginate_queryset(poems)
         if page is not None:
-            serializer = PoemListSerializer(page, many=True)
+            serializer = PoemSearchSerializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = PoemListSerializer(poems, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        serializer = PoemSearchSerializer(poems, many=True)
+        return Response(serializer.data)
+
+
+class AutocompleteViewSet(viewsets.ViewSet):
+    """Ranked poet, book and poem title completions for the search box"""
+
+    def list(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 0))
+        except ValueError:
+            limit = 0
+        suggestions = autocomplete.index.complete(request.query_params.get('q', ''), max(limit, 0))
+        return Response({'results': SuggestionSerializer(suggestions, many=True).data})
+
+
+class StatisticsViewSet(viewsets.ViewSet):
+    """Site totals, most viewed and recently added poets, books and poems"""
+
+    def list(self, request):
+        return Response(get_statistics().as_dict())
+
+
+class ReadingProgressViewSet(viewsets.ViewSet):
+    """Batched reading progress reports from the poem page; buffered, never written inline"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request):
+        serializer = ReadingProgressBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        now = timezone.now()
+        events = serializer.validated_data['events']
+        for event in events:
+            read_at = min(event.get('read_at') or now, now)
+            reading_events.record(request.user.pk, event['poem'], event['progress'], read_at)
+        return Response({'accepted': len(events)}, status=status.HTTP_202_ACCEPTED)
+
+
+class BookProgressViewSet(viewsets.ReadOnlyModelViewSet):
+    """The signed-in user's reading progress per book, most recently read first"""
+    serializer_class = BookProgressSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'book__slug'
+    lookup_url_kwarg = 'slug'
+
+    def get_queryset(self):
+        queryset = BookProgress.objects.filter(user=self.request.user).select_related('book__poet', 'last_poem')
+        if self.request.query_params.get('unfinished'):
+            queryset = queryset.filter(read_count__lt=F('book__poems_count'))
+        return queryset.order_by('-last_read_at', '-id')
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PoetryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'poetry'
+
+    def ready(self):
+        from . import autocomplete  # noqa: F401  (keeps the autocomplete trie current)
+        from . import caching  # noqa: F401  (bumps per-model cache and search versions on writes)
+        from . import counters  # noqa: F401  (connects the counter receivers)
+        from . import favorites  # noqa: F401  (invalidates cached favorite sets)
+        from . import navigation  # noqa: F401  (relinks previous/next poems on writes)
+        from . import progress  # noqa: F401  (rolls reading history up per book)
+        from . import site_stats  # noqa: F401  (keeps the statistics snapshot current)
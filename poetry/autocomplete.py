@@ -0,0 +1,333 @@
+"""
+In-process prefix index for search box autocomplete.
+
+Poet names, book titles and poem titles are kept in a character trie keyed
+on script-folded words, so ``ҳоф``, ``حاف`` and ``Хоф`` all complete to
+``Ҳофизи Шерозӣ``. Keys are the consonant skeleton of
+``poetry.analysis`` without stemming or dictionary conversion: both work on
+whole words and would break the prefix property for partly typed words.
+
+Every node stores its best ``MAX_SUGGESTIONS`` entries (by ``view_count``),
+so a one-word query is a walk down the trie and a list slice, however short
+the prefix. Several words are matched by walking the longest one and
+checking the others against each candidate's words.
+
+The index is built lazily on first use and kept current incrementally:
+
+* Poet, Book and Poem saves and deletes in this process are applied from
+  their signals.
+* Other processes' writes bump the models' cache versions
+  (``poetry.caching``); at most every ``SYNC_INTERVAL`` seconds a changed
+  version re-reads the rows updated since the last sync.
+* Deletes in other processes and ``view_count`` flushes (which do not touch
+  ``updated_at``) are picked up by the full rebuild every
+  ``REBUILD_INTERVAL`` seconds. A rebuild reads the tables into a new trie
+  without holding the index lock, so the old trie keeps serving and taking
+  updates meanwhile; updates made during the read are replayed on the new
+  trie when it is swapped in.
+"""
+import heapq
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+
+from .analysis import normalize, skeleton
+from .caching import model_versions
+from .conf import get_settings
+from .models import Book, Poem, Poet
+
+WORD_RE = re.compile(r'\w+')
+
+DEFAULT_AUTOCOMPLETE = {
+    'MAX_SUGGESTIONS': 10,
+    'SYNC_INTERVAL': 5,
+    'REBUILD_INTERVAL': 3600,
+}
+
+# kind -> (model, label field)
+SOURCES = {
+    'poet': (Poet, 'name'),
+    'book': (Book, 'title'),
+    'poem': (Poem, 'title'),
+}
+URL_NAMES = {'poet': 'poetry:poet_detail', 'book': 'poetry:book_detail', 'poem': 'poetry:poem_detail'}
+
+
+def source_versions():
+    return model_versions(*(model for model, _ in SOURCES.values()))
+
+
+def get_autocomplete_settings():
+    return get_settings('AUTOCOMPLETE', DEFAULT_AUTOCOMPLETE)
+
+
+def word_keys(text):
+    """Folded key of each word in text, in order, without empty keys"""
+    keys = (skeleton(word) for word in WORD_RE.findall(normalize(text or '')))
+    return [key for key in keys if key]
+
+
+class Suggestion(namedtuple('Suggestion', 'kind pk label slug weight')):
+    __slots__ = ()
+
+    @property
+    def key(self):
+        return (self.kind, self.pk)
+
+    @property
+    def url(self):
+        return reverse(URL_NAMES[self.kind], kwargs={'slug': self.slug})
+
+
+def rank(suggestion):
+    return (-suggestion.weight, suggestion.label, suggestion.kind, suggestion.pk)
+
+
+class Node:
+    __slots__ = ('children', 'entries', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = set()
+        self.top = ()
+
+
+class AutocompleteIndex:
+    """Trie of folded words with the top suggestions cached on each node"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._replay = None
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.root = None
+            self.suggestions = {}
+            self.words = {}
+            self.version = None
+            self.synced_at = None
+            self.built_at = 0.0
+            self.checked_at = 0.0
+
+    @property
+    def limit(self):
+        return get_autocomplete_settings()['MAX_SUGGESTIONS']
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    # Building and updating
+
+    def rows(self, kind, since=None):
+        model, field = SOURCES[kind]
+        queryset = model._base_manager.all()
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since)
+        for pk, label, slug, weight in queryset.values_list('pk', field, 'slug', 'view_count').iterator():
+            yield Suggestion(kind, pk, label, slug, weight)
+
+    def build(self):
+        """Replace the whole trie with one read of the three tables"""
+        with self._build_lock:
+            self._build()
+
+    def _build(self):
+        with self._lock:
+            # Updates arriving while the tables are read, for the new trie
+            self._replay = []
+        try:
+            self._read_and_swap()
+        finally:
+            with self._lock:
+                self._replay = None
+
+    def _read_and_swap(self):
+        version = source_versions()
+        synced_at = timezone.now()
+        root = Node()
+        suggestions = {}
+        words = {}
+        for kind in SOURCES:
+            for suggestion in self.rows(kind):
+                keys = tuple(word_keys(suggestion.label))
+                suggestions[suggestion.key] = suggestion
+                words[suggestion.key] = keys
+                for key in set(keys):
+                    self._walk(root, key, create=True)[-1].entries.add(suggestion)
+        self._fill(root, self.limit)
+        with self._lock:
+            self.root = root
+            self.suggestions = suggestions
+            self.words = words
+            self.version = version
+            self.synced_at = synced_at
+            self.built_at = self.checked_at = time.monotonic()
+            replay, self._replay = self._replay, None
+            for apply, arg in replay:
+                apply(arg)
+
+    def _fill(self, root, limit):
+        # Post-order without recursion: titles can be long
+        stack = [(root, False)]
+        while stack:
+            node, done = stack.pop()
+            if done:
+                self._recompute(node, limit)
+                continue
+            stack.append((node, True))
+            stack.extend((child, False) for child in node.children.values())
+
+    def _recompute(self, node, limit):
+        candidates = set(node.entries)
+        for child in node.children.values():
+            candidates.update(child.top)
+        node.top = tuple(heapq.nsmallest(limit, candidates, key=rank))
+
+    def _walk(self, root, key, create=False):
+        path = [root]
+        node = root
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[char] = Node()
+            node = child
+            path.append(node)
+        return path
+
+    def _update_path(self, key, suggestion, add):
+        path = self._walk(self.root, key, create=add)
+        if path is None:
+            return
+        if add:
+            path[-1].entries.add(suggestion)
+        else:
+            path[-1].entries.discard(suggestion)
+        limit = self.limit
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            self._recompute(node, limit)
+            if depth and not node.entries and not node.children:
+                del path[depth - 1].children[key[depth - 1]]
+
+    def remove(self, key):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self.remove, key))
+            if self.root is not None:
+                self._discard(key)
+
+    def _discard(self, key):
+        suggestion = self.suggestions.pop(key, None)
+        if suggestion is None:
+            return
+        for word in set(self.words.pop(key)):
+            self._update_path(word, suggestion, add=False)
+
+    def add(self, suggestion):
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((self.add, suggestion))
+            if self.root is None:
+                return
+            if self.suggestions.get(suggestion.key) == suggestion:
+                return
+            self._discard(suggestion.key)
+            keys = tuple(word_keys(suggestion.label))
+            self.suggestions[suggestion.key] = suggestion
+            self.words[suggestion.key] = keys
+            for word in set(keys):
+                self._update_path(word, suggestion, add=True)
+
+    def sync(self):
+        """Apply rows updated since the last build or sync"""
+        version = source_versions()
+        # updated_at is set before the row commits; overlap by a second
+        since = self.synced_at - timedelta(seconds=1)
+        synced_at = timezone.now()
+        for kind in SOURCES:
+            for suggestion in self.rows(kind, since=since):
+                self.add(suggestion)
+        with self._lock:
+            self.version = version
+            self.synced_at = synced_at
+
+    def ensure_current(self):
+        options = get_autocomplete_settings()
+        now = time.monotonic()
+        if self.root is None or now - self.built_at > options['REBUILD_INTERVAL']:
+            # Only the first build is waited for; during later ones the old trie serves
+            if self._build_lock.acquire(blocking=self.root is None):
+                try:
+                    if self.root is None or time.monotonic() - self.built_at > options['REBUILD_INTERVAL']:
+                        self._build()
+                finally:
+                    self._build_lock.release()
+        elif now - self.checked_at > options['SYNC_INTERVAL']:
+            self.checked_at = now
+            if source_versions() != self.version:
+                self.sync()
+
+    # Querying
+
+    def complete(self, query, limit=None):
+        """Up to limit suggestions whose words start with every query word"""
+        self.ensure_current()
+        limit = min(limit or self.limit, self.limit)
+        keys = word_keys(query)
+        if not keys:
+            return []
+        keys.sort(key=len)
+        # add() and remove() change nodes in place: walk under the lock
+        with self._lock:
+            path = self._walk(self.root, keys[-1])
+            if path is None:
+                return []
+            node = path[-1]
+            if len(keys) == 1:
+                return list(node.top[:limit])
+
+            others = keys[:-1]
+            candidates = []
+            stack = [node]
+            while stack:
+                current = stack.pop()
+                candidates.extend(current.entries)
+                stack.extend(current.children.values())
+            matches = {
+                suggestion for suggestion in candidates
+                if all(any(word.startswith(key) for word in self.words.get(suggestion.key, ()))
+                       for key in others)
+            }
+        return heapq.nsmallest(limit, matches, key=rank)
+
+
+index = AutocompleteIndex()
+
+
+@receiver(post_save, sender=Poet)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Poem)
+def suggestion_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    kind = sender._meta.model_name
+    label = getattr(instance, SOURCES[kind][1])
+    index.add(Suggestion(kind, instance.pk, label, instance.slug, instance.view_count))
+
+
+@receiver(post_delete, sender=Poet)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Poem)
+def suggestion_deleted(sender, instance, **kwargs):
+    index.remove((sender._meta.model_name, instance.pk))
@@ -0,0 +1,303 @@
+"""
+Write-behind buffers for hot write paths.
+
+Detail pages used to save ``view_count`` on every hit, which on SQLite is one
+write transaction per page view. Increments are now accumulated in memory and
+applied in bulk with ``F()`` expressions. Poem reads by signed-in users
+(``ReadingHistory``) are buffered the same way and flushed as one bulk upsert.
+
+Delivery semantics (at-most-once):
+
+* Increments live only in the process that recorded them until a flush.
+  A crash or ``kill -9`` loses at most ``FLUSH_THRESHOLD`` increments or
+  ``FLUSH_INTERVAL`` seconds worth of views, whichever comes first.
+* Flushes run on a background flusher thread per buffer. A request that
+  crosses ``FLUSH_THRESHOLD`` only wakes it, so no request pays for the
+  bulk write.
+* A flush swaps the pending counters out under a lock and applies them in a
+  single transaction. If the transaction fails the counters are merged back
+  and retried on the next flush, so an increment is never applied twice.
+* Buffers are flushed on normal interpreter shutdown.
+* With ``WRITE_THROUGH`` every recorded value is flushed at once, in the
+  recording thread (the test runner turns this on).
+
+Features that derive data from flushed writes subscribe with ``connect()``;
+their receivers run after the flush's transaction, and a failing receiver
+is logged without undoing or retrying the flush.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .conf import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIEW_COUNT_BUFFER = {
+    'FLUSH_INTERVAL': 10,
+    'FLUSH_THRESHOLD': 100,
+    'FLUSH_SIGNAL_FILE': None,
+    'WRITE_THROUGH': False,
+}
+
+DEFAULT_READING_HISTORY_BUFFER = {
+    'FLUSH_INTERVAL': 5,
+    'FLUSH_THRESHOLD': 200,
+    'FLUSH_SIGNAL_FILE': None,
+    'WRITE_THROUGH': False,
+}
+
+
+class WriteBehindBuffer:
+    """
+    Thread-safe in-process accumulator flushed on a size or age threshold.
+
+    Subclasses implement ``merge()`` to fold a new value into the pending
+    entry for a key and ``apply()`` to write a batch to the database;
+    whatever ``apply()`` returns is passed on to the receivers.
+    """
+    settings_name = None
+    defaults = {}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._flush_requested_at = None
+        self._timer = None
+        self._wake = threading.Event()
+        self._receivers = []
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    @property
+    def options(self):
+        return get_settings(self.settings_name, self.defaults)
+
+    def __len__(self):
+        return self._size
+
+    def merge(self, current, value):
+        raise NotImplementedError
+
+    def apply(self, batch):
+        raise NotImplementedError
+
+    def connect(self, receiver):
+        """Call receiver(batch, result) after every successful flush"""
+        if receiver not in self._receivers:
+            self._receivers.append(receiver)
+
+    def add(self, key, value):
+        """Record a value for key and wake the flusher if a threshold was crossed"""
+        options = self.options
+        with self._lock:
+            self._pending[key] = self.merge(self._pending.get(key), value)
+            self._size += 1
+            due = (
+                self._size >= options['FLUSH_THRESHOLD'] or
+                time.monotonic() - self._last_flush >= options['FLUSH_INTERVAL']
+            )
+        if options['WRITE_THROUGH']:
+            self.flush()
+            return
+        self._ensure_timer()
+        if due:
+            self._wake.set()
+
+    def clear(self):
+        """Drop everything pending without writing it"""
+        with self._lock:
+            self._pending = {}
+            self._size = 0
+
+    def flush(self):
+        """Apply everything pending; returns the number of keys written"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            size, self._size = self._size, 0
+            self._last_flush = time.monotonic()
+        if not batch:
+            return 0
+        try:
+            with transaction.atomic():
+                result = self.apply(batch)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception('%s flush failed, %d keys kept for retry', self.__class__.__name__, len(batch))
+            with self._lock:
+                for key, value in batch.items():
+                    current = self._pending.get(key)
+                    self._pending[key] = value if current is None else self.merge(value, current)
+                self._size += size
+            return 0
+        self.flushed += len(batch)
+        for receiver in self._receivers:
+            try:
+                receiver(batch, result)
+            except Exception:
+                logger.exception('%s receiver %r failed', self.__class__.__name__, receiver)
+        return len(batch)
+
+    def _ensure_timer(self):
+        if self._timer is not None and self._timer.is_alive():
+            return
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Thread(
+                target=self._run_timer, name=f'{self.__class__.__name__}-flusher', daemon=True
+            )
+            self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            interval = self.options['FLUSH_INTERVAL']
+            woken = self._wake.wait(min(interval, 1))
+            self._wake.clear()
+            if self._size and (
+                woken or time.monotonic() - self._last_flush >= interval or self._flush_requested()
+            ):
+                self.flush()
+
+    def _flush_requested(self):
+        """Check the signal file touched by the flush management command"""
+        path = self.options.get('FLUSH_SIGNAL_FILE')
+        if not path:
+            return False
+        try:
+            requested_at = os.stat(path).st_mtime
+        except OSError:
+            return False
+        if requested_at == self._flush_requested_at:
+            return False
+        self._flush_requested_at = requested_at
+        return True
+
+
+class ViewCountBuffer(WriteBehindBuffer):
+    """Buffers ``view_count`` increments keyed by (model label, pk)"""
+    settings_name = 'VIEW_COUNT_BUFFER'
+    defaults = DEFAULT_VIEW_COUNT_BUFFER
+
+    def merge(self, current, value):
+        return (current or 0) + value
+
+    def record(self, instance, amount=1):
+        self.add((instance._meta.label, instance.pk), amount)
+
+    def pending_for(self, instance):
+        """Unflushed increments for instance, for read-your-writes display"""
+        return self._pending.get((instance._meta.label, instance.pk), 0)
+
+    def apply(self, batch):
+        """Returns the number of views applied, leaving out rows deleted since"""
+        # One UPDATE per (model, delta) so hot and cold rows batch together
+        grouped = defaultdict(list)
+        for (label, pk), delta in batch.items():
+            grouped[(label, delta)].append(pk)
+        applied = 0
+        for (label, delta), pks in grouped.items():
+            model = apps.get_model(label)
+            applied += delta * model._base_manager.filter(pk__in=pks).update(view_count=F('view_count') + delta)
+        return applied
+
+
+view_counts = ViewCountBuffer()
+
+
+class ReadingHistoryBuffer(WriteBehindBuffer):
+    """
+    Buffers reading events keyed by (user id, poem id) as (progress, read_at),
+    keeping the furthest progress and the latest read_at for a key. A flush
+    inserts the new rows in bulk and raises the existing ones with one
+    ``Greatest`` UPDATE per chunk, so an older or shorter report (from this
+    or another process) never moves a row backwards.
+    """
+    settings_name = 'READING_HISTORY_BUFFER'
+    defaults = DEFAULT_READING_HISTORY_BUFFER
+
+    def merge(self, current, value):
+        if current is None:
+            return value
+        return (max(current[0], value[0]), max(current[1], value[1]))
+
+    def record(self, user_id, poem_id, progress=0, read_at=None):
+        self.add((user_id, poem_id), (progress, read_at or timezone.now()))
+
+    def apply(self, batch):
+        from django.contrib.auth import get_user_model
+        from .progress import record_reads
+        ReadingHistory = apps.get_model('poetry', 'ReadingHistory')
+        Poem = apps.get_model('poetry', 'Poem')
+        # Drop events for poems or users deleted since, or the batch would fail forever
+        books = dict(
+            Poem._base_manager.filter(pk__in={poem for _, poem in batch}).order_by().values_list('pk', 'book_id')
+        )
+        users = set(get_user_model()._base_manager.filter(
+            pk__in={user for user, _ in batch}
+        ).values_list('pk', flat=True))
+        batch = {key: value for key, value in batch.items() if key[0] in users and key[1] in books}
+
+        ReadingHistory.objects.bulk_create(
+            [
+                ReadingHistory(user_id=user, poem_id=poem, reading_progress=progress, read_at=read_at)
+                for (user, poem), (progress, read_at) in batch.items()
+            ],
+            batch_size=500, ignore_conflicts=True,
+        )
+        items = list(batch.items())
+        for start in range(0, len(items), 500):
+            chunk = items[start:start + 500]
+            pairs = Q()
+            progress_whens = []
+            read_at_whens = []
+            for (user, poem), (progress, read_at) in chunk:
+                key = Q(user_id=user, poem_id=poem)
+                pairs |= key
+                progress_whens.append(When(key, then=Value(progress)))
+                read_at_whens.append(When(key, then=Value(read_at)))
+            # Only the batch's own pairs, not every row of its users x poems
+            ReadingHistory.objects.filter(pairs).update(
+                reading_progress=Greatest(
+                    'reading_progress',
+                    Case(*progress_whens, default=F('reading_progress'), output_field=IntegerField()),
+                ),
+                read_at=Greatest(
+                    'read_at', Case(*read_at_whens, default=F('read_at'), output_field=DateTimeField()),
+                ),
+            )
+        # bulk_create sends no signals: roll the reads up into BookProgress here
+        record_reads((user, poem, books[poem], read_at) for (user, poem), (_, read_at) in batch.items())
+
+
+reading_events = ReadingHistoryBuffer()
+
+
+def request_flush():
+    """Ask every process sharing FLUSH_SIGNAL_FILE to flush on its next tick"""
+    path = view_counts.options.get('FLUSH_SIGNAL_FILE')
+    if not path:
+        return False
+    with open(path, 'a'):
+        os.utime(path, None)
+    return True
+
+
+@atexit.register
+def _flush_on_exit():
+    for buffer in (view_counts, reading_events):
+        try:
+            buffer.flush()
+        except Exception:
+            logger.exception('Could not flush %s at exit', buffer.__class__.__name__)
@@ -0,0 +1,362 @@
+"""
+Two-tier cache backend: an in-process LRU in front of a shared SQLite file.
+
+With ``LocMemCache`` every worker process warmed its own copy of every key.
+``TwoTierCache`` keeps a small LRU per process (L1) in front of one SQLite
+database on local disk that all workers share (L2), so a value computed by
+one worker is a local read for the others. No external service is needed.
+
+Cross-process invalidation uses version counters in a small memory-mapped
+file next to the database. Every key hashes to one of ``VERSION_SLOTS``
+counters and ``clear()`` bumps an epoch counter. A write bumps the key's
+counter after it commits to L2; an L1 entry remembers the counters it was
+read under and is only served while they are unchanged. Reading two
+integers from the map is the whole cost of an L1 hit, and a hash collision
+costs an extra L2 read, never a stale value.
+
+``get_or_set`` refreshes hot keys early (probabilistic early expiration,
+"XFetch"): the closer a key is to expiry and the longer it took to compute,
+the likelier a reader recomputes it before it expires, so a popular key
+does not expire under all of its readers at once.
+
+``stats`` counts L1 hits, L2 hits, misses and early refreshes for this
+process. Every ``STATS_INTERVAL`` seconds the counts are added to a table in
+the shared file, and ``cache_stats`` reports the hit ratios across workers.
+
+Expired and excess L2 rows are culled by at most one write per
+``CULL_INTERVAL`` seconds in each process, rather than counting the table
+on a share of all writes.
+
+OPTIONS: ``MAX_ENTRIES`` and ``CULL_FREQUENCY`` apply to L2 as usual;
+``CULL_INTERVAL``, ``L1_MAX_ENTRIES``, ``L1_TIMEOUT`` (upper bound on an L1 entry's age, should
+a writer die between commit and bump), ``EARLY_REFRESH_BETA`` and
+``STATS_INTERVAL``.
+"""
+import fcntl
+import math
+import mmap
+import os
+import pickle
+import random
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict, namedtuple
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+VERSION_SLOTS = 4096
+SLOT = struct.Struct('<Q')
+
+Entry = namedtuple('Entry', 'value expires delta versions cached_at')
+
+
+class VersionMap:
+    """Shared counters in a memory-mapped file; slot 0 is the epoch"""
+
+    def __init__(self, path, slots=VERSION_SLOTS):
+        self.path = path
+        self.slots = slots
+        size = slots * SLOT.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            self.map = mmap.mmap(fd, size)
+        except Exception:
+            os.close(fd)
+            raise
+        self.fd = fd
+
+    def slot(self, key):
+        return 1 + zlib.crc32(key.encode()) % (self.slots - 1)
+
+    def read(self, key):
+        return (SLOT.unpack_from(self.map, 0)[0], SLOT.unpack_from(self.map, self.slot(key) * SLOT.size)[0])
+
+    def bump(self, index):
+        offset = index * SLOT.size
+        # Read-increment-write under a file lock so concurrent bumps never collapse into one
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        try:
+            SLOT.pack_into(self.map, offset, SLOT.unpack_from(self.map, offset)[0] + 1)
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def bump_key(self, key):
+        self.bump(self.slot(key))
+
+    def bump_epoch(self):
+        self.bump(0)
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = os.fspath(location)
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 60))
+        self.beta = float(options.get('EARLY_REFRESH_BETA', 1.0))
+        self.stats_interval = float(options.get('STATS_INTERVAL', 30))
+        self.cull_interval = float(options.get('CULL_INTERVAL', 60))
+        self.stats = Counter()
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._versions = None
+        self._versions_pid = None
+        self._unsaved_stats = Counter()
+        self._stats_saved_at = time.monotonic()
+        self._culled_at = time.monotonic()
+
+    # Storage
+
+    @property
+    def versions(self):
+        if self._versions is None or self._versions_pid != os.getpid():
+            with self._lock:
+                if self._versions is None or self._versions_pid != os.getpid():
+                    # flock is shared by a forked child, so each process opens its own
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._versions = VersionMap(f'{self.path}.versions')
+                    self._versions_pid = os.getpid()
+        return self._versions
+
+    @property
+    def db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            # One connection per thread, and never reuse a parent's after fork
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, delta REAL NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires);
+                CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            ''')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _write(self, sql, params=()):
+        connection = self.db
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = connection.execute(sql, params)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return cursor.rowcount
+
+    def _count(self, name):
+        self.stats[name] += 1
+        self._unsaved_stats[name] += 1
+        if time.monotonic() - self._stats_saved_at > self.stats_interval:
+            self.save_stats()
+
+    def save_stats(self):
+        """Add this process's counts since the last call to the shared totals"""
+        with self._lock:
+            unsaved, self._unsaved_stats = self._unsaved_stats, Counter()
+            self._stats_saved_at = time.monotonic()
+        if unsaved:
+            self.db.executemany(
+                'INSERT INTO stats (name, value) VALUES (?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+                unsaved.items(),
+            )
+
+    def shared_stats(self):
+        self.save_stats()
+        return Counter(dict(self.db.execute('SELECT name, value FROM stats')))
+
+    @staticmethod
+    def hit_ratios(stats):
+        """Share of lookups served by each tier"""
+        lookups = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        if not lookups:
+            return {'l1': 0.0, 'l2': 0.0, 'miss': 0.0}
+        return {
+            'l1': stats['l1_hits'] / lookups,
+            'l2': stats['l2_hits'] / lookups,
+            'miss': stats['misses'] / lookups,
+        }
+
+    # L1
+
+    def _remember(self, key, pickled, expires, delta, versions):
+        # Pickled like LocMemCache, so callers mutating a result never change the cache
+        with self._lock:
+            self._l1[key] = Entry(pickled, expires, delta, versions, time.monotonic())
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _lookup(self, key):
+        """Entry for a full key from L1 or L2, or None"""
+        now = time.time()
+        versions = self.versions.read(key)
+        entry = self._l1.get(key)
+        if entry is not None:
+            fresh = (
+                entry.versions == versions
+                and (entry.expires is None or entry.expires > now)
+                and time.monotonic() - entry.cached_at < self.l1_timeout
+            )
+            if fresh:
+                with self._lock:
+                    if key in self._l1:
+                        self._l1.move_to_end(key)
+                self._count('l1_hits')
+                return entry._replace(value=pickle.loads(entry.value))
+            self._forget(key)
+
+        # versions were read before L2, so a write committed after this read bumps them
+        row = self.db.execute('SELECT value, expires, delta FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            self._count('misses')
+            return None
+        self._remember(key, row[0], row[1], row[2], versions)
+        self._count('l2_hits')
+        return Entry(pickle.loads(row[0]), row[1], row[2], versions, None)
+
+    # Cache API
+
+    def get(self, key, default=None, version=None):
+        entry = self._lookup(self.make_and_validate_key(key, version=version))
+        return default if entry is None else entry.value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, delta=0):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        self._write(
+            'INSERT OR REPLACE INTO entries (key, value, expires, delta) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires, delta),
+        )
+        self.versions.bump_key(key)
+        self._forget(key)
+        self._maybe_cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        added = self._write(
+            'INSERT INTO entries (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires, delta = 0 '
+            'WHERE entries.expires IS NOT NULL AND entries.expires <= ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires, time.time()),
+        )
+        if added:
+            self.versions.bump_key(key)
+            self._maybe_cull()
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        touched = self._write(
+            'UPDATE entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        if touched:
+            self.versions.bump_key(key)
+        return bool(touched)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        deleted = self._write('DELETE FROM entries WHERE key = ?', (key,))
+        self.versions.bump_key(key)
+        self._forget(key)
+        return bool(deleted)
+
+    def has_key(self, key, version=None):
+        return self._lookup(self.make_and_validate_key(key, version=version)) is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        connection = self.db
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT value FROM entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE entries SET value = ? WHERE key = ?', (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        self.versions.bump_key(key)
+        self._forget(key)
+        return value
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self.make_and_validate_key(key, version=version)
+        entry = self._lookup(full_key)
+        if entry is not None and not self._refresh_early(entry):
+            return entry.value
+
+        started = time.monotonic()
+        value = default() if callable(default) else default
+        if value is None:
+            return None
+        if entry is None:
+            self.add(key, value, timeout=timeout, version=version)
+            # Another process may have added first; serve what is stored
+            return self.get(key, value, version=version)
+        self._count('early_refreshes')
+        self.set(key, value, timeout=timeout, version=version, delta=time.monotonic() - started)
+        return value
+
+    def _refresh_early(self, entry):
+        if entry.expires is None or not entry.delta:
+            return False
+        # XFetch: recompute with rising probability as expiry approaches
+        return time.time() - entry.delta * self.beta * math.log(random.random() or 1e-12) >= entry.expires
+
+    def clear(self):
+        self._write('DELETE FROM entries')
+        self.versions.bump_epoch()
+        with self._lock:
+            self._l1.clear()
+
+    def _maybe_cull(self):
+        # Time-based, so the DELETE and COUNT(*) stay off nearly every write
+        with self._lock:
+            if time.monotonic() - self._culled_at < self.cull_interval:
+                return
+            self._culled_at = time.monotonic()
+        self.cull()
+
+    def cull(self):
+        """Drop expired rows, then the soonest to expire while over MAX_ENTRIES"""
+        now = time.time()
+        self._write('DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?', (now,))
+        count = self.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        if count > self._max_entries:
+            # Culls are rate limited, so always get back under MAX_ENTRIES
+            excess = count // self._cull_frequency if self._cull_frequency else count
+            excess = max(excess, count - self._max_entries)
+            self._write(
+                'DELETE FROM entries WHERE key IN '
+                '(SELECT key FROM entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                (excess,),
+            )
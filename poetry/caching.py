@@ -0,0 +1,112 @@
+"""
+Version-keyed cache blocks with single-flight recomputation.
+
+Each content model has a change version in the cache, bumped by its saves
+and deletes. A block that depends on some models is stored under a key that
+embeds their current versions (``versioned_key``), so a write orphans the
+old entry instead of deleting it; nothing has to know which blocks a model
+feeds. Reading the versions is one ``get_many``. Cached search results
+(``poetry.search_cache``) and the autocomplete index key on the same
+versions.
+
+``single_flight`` fills a missing key behind a ``cache.add`` lock: one
+caller computes while the others poll for the value, so a cold key costs
+the database one recomputation rather than one per concurrent request. A
+waiter that outlasts ``WAIT`` seconds (a slow or dead holder) computes for
+itself rather than failing the request.
+
+Writes that bypass signals (``bulk_create``, ``QuerySet.update``) must call
+``bump_model_version`` themselves.
+"""
+import os
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .conf import get_settings
+
+DEFAULT_BLOCK_CACHE = {
+    'TIMEOUT': 3600,
+    'LOCK_TIMEOUT': 30,
+    'WAIT': 5,
+    'POLL_INTERVAL': 0.05,
+}
+
+MISSING = object()
+
+
+def get_block_cache_settings():
+    return get_settings('BLOCK_CACHE', DEFAULT_BLOCK_CACHE)
+
+
+def version_key(model):
+    return f'poetry:version:{model._meta.label_lower}'
+
+
+def model_versions(*models):
+    keys = [version_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, 1, timeout=None)
+            found[key] = cache.get(key, 1)
+    return [found[key] for key in keys]
+
+
+def bump_model_version(model):
+    key = version_key(model)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+        return cache.get(key)
+
+
+def versioned_key(prefix, *models):
+    """Cache key for a block derived from models, changing with any of their versions"""
+    return f'{prefix}:' + '.'.join(str(version) for version in model_versions(*models))
+
+
+def single_flight(key, compute, timeout=None):
+    """cache[key], computing it with compute() in at most one caller at a time"""
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        return value
+
+    options = get_block_cache_settings()
+    timeout = options['TIMEOUT'] if timeout is None else timeout
+    lock_key = f'{key}:lock'
+    deadline = time.monotonic() + options['WAIT']
+    while True:
+        if cache.add(lock_key, os.getpid(), options['LOCK_TIMEOUT']):
+            try:
+                # The previous holder may have filled it since our first look
+                value = cache.get(key, MISSING)
+                if value is MISSING:
+                    value = compute()
+                    cache.set(key, value, timeout)
+                return value
+            finally:
+                cache.delete(lock_key)
+        time.sleep(options['POLL_INTERVAL'])
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        if time.monotonic() > deadline:
+            return compute()
+
+
+@receiver([post_save, post_delete], sender='poetry.Poet')
+@receiver([post_save, post_delete], sender='poetry.Book')
+@receiver([post_save, post_delete], sender='poetry.Poem')
+def model_changed(sender, raw=False, **kwargs):
+    if raw:
+        return
+    bump_model_version(sender)
+    if transaction.get_connection().in_atomic_block:
+        # Again after commit: a reader racing the transaction may have cached
+        # pre-commit rows under the version bumped above
+        transaction.on_commit(lambda: bump_model_version(sender))
@@ -0,0 +1,14 @@
+"""
+App settings.
+
+Each feature reads one settings dict (``VIEW_COUNT_BUFFER``,
+``SEARCH_RESULT_CACHE``, ...) whose keys override the feature's defaults.
+"""
+from django.conf import settings
+
+
+def get_settings(name, defaults):
+    """Merge a settings dict from Django settings over defaults"""
+    options = dict(defaults)
+    options.update(getattr(settings, name, {}))
+    return options
@@ -0,0 +1,130 @@
+"""
+Denormalized ``books_count`` / ``poems_count`` columns.
+
+Listings read the stored counters instead of aggregating through joins. The
+counters are kept current by the save/delete receivers below with ``F()``
+updates, so concurrent writers never lose increments. Writes that bypass
+signals (``bulk_create``, ``QuerySet.update``) must call ``add_poems`` /
+``add_books`` themselves; ``update_stats`` recomputes everything in bulk when
+the counters drift.
+"""
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+def adjust(queryset, values=None, **deltas):
+    """
+    Add deltas to counter columns of every row in queryset, never below zero;
+    values are other columns to set in the same UPDATE
+    """
+    changes = dict(values or {})
+    for field, delta in deltas.items():
+        if delta > 0:
+            changes[field] = F(field) + delta
+        elif delta < 0:
+            changes[field] = Greatest(F(field) + delta, 0)
+    if changes:
+        queryset.update(**changes)
+
+
+def add_poems(book_id, count=1):
+    """Count poems added to (or, negative, removed from) a book and its poet"""
+    from .models import Book, Poet
+    adjust(Book.objects.filter(pk=book_id), poems_count=count)
+    adjust(Poet.objects.filter(books__id=book_id), poems_count=count)
+
+
+def add_books(poet_id, count=1, poems=0):
+    from .models import Poet
+    adjust(Poet.objects.filter(pk=poet_id), books_count=count, poems_count=poems)
+
+
+class CounterCacheMixin:
+    """
+    Model support for stored counters and other derived columns.
+
+    ``protected_fields`` (counters, and columns such as the poem neighbor
+    links maintained by other writers) are left out of plain saves of
+    existing rows, so saving an instance loaded before a concurrent insert
+    or relink does not write a stale value back. ``counted_parent`` names the
+    foreign key whose loaded value is remembered, letting the save receiver
+    detect moves between parents; ``tracked_fields`` are remembered the same
+    way for ``changed_since_load``. Both are remembered again after each
+    save, once every post_save receiver has seen the old values.
+    """
+    protected_fields = ()
+    counted_parent = None
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded()
+        return instance
+
+    def remember_loaded(self):
+        # Deferred fields are not in __dict__; remember None rather than query
+        if self.counted_parent:
+            self._loaded_parent_id = self.__dict__.get(self._meta.get_field(self.counted_parent).attname)
+        self._loaded_values = {
+            name: self.__dict__.get(self._meta.get_field(name).attname) for name in self.tracked_fields
+        }
+
+    def changed_since_load(self, *names):
+        """Whether any of the named tracked fields changed since load, or was never loaded"""
+        loaded = getattr(self, '_loaded_values', {})
+        for name in names:
+            value = loaded.get(name)
+            if value is None or value != self.__dict__.get(self._meta.get_field(name).attname):
+                return True
+        return False
+
+    def save(self, *args, **kwargs):
+        if (self.protected_fields and not self._state.adding
+                and kwargs.get('update_fields') is None and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.protected_fields
+            ]
+        result = super().save(*args, **kwargs)
+        self.remember_loaded()
+        return result
+
+
+@receiver(post_save, sender='poetry.Poem')
+def poem_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_parent_id', None)
+    if created:
+        add_poems(instance.book_id)
+    elif previous is not None and previous != instance.book_id:
+        add_poems(previous, -1)
+        add_poems(instance.book_id)
+
+
+@receiver(post_delete, sender='poetry.Poem')
+def poem_deleted(sender, instance, **kwargs):
+    # Cascades delete poems before their book, so the book row still exists here
+    add_poems(instance.book_id, -1)
+
+
+@receiver(post_save, sender='poetry.Book')
+def book_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_loaded_parent_id', None)
+    if created:
+        add_books(instance.poet_id)
+    elif previous is not None and previous != instance.poet_id:
+        poems = sender.objects.filter(pk=instance.pk).values_list('poems_count', flat=True).first() or 0
+        add_books(previous, -1, -poems)
+        add_books(instance.poet_id, 1, poems)
+
+
+@receiver(post_delete, sender='poetry.Book')
+def book_deleted(sender, instance, **kwargs):
+    # The book's poems were already subtracted one by one by poem_deleted
+    add_books(instance.poet_id, -1)
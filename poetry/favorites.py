@@ -0,0 +1,146 @@
+"""
+Favorites service.
+
+``Favorite`` rows point at poets, books or poems by ``content_type`` and
+``object_id``. ``hydrate`` loads them with one ``in_bulk`` per type instead
+of one query per row.
+
+Each user's favorites are also cached as a set of (type, id) pairs, so
+``is_favorited`` (detail pages) and the ``favorited_by`` template filter
+(every card on a list page) never query. The set is loaded once per cache
+timeout and kept on the user object for the rest of the request.
+
+The set is stored under a per-user version, read before the rows are, and
+every save and delete of a ``Favorite`` row (toggles, the admin, cascades
+from deleted users) bumps the version at once and again on commit. A set
+loaded from rows read before the commit is therefore stored under a
+version nobody reads any more, instead of being served for ``TIMEOUT``.
+"""
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .conf import get_settings
+from .models import Book, Favorite, Poem, Poet
+
+DEFAULT_FAVORITES_CACHE = {
+    'TIMEOUT': 3600,
+}
+
+# content_type -> (model, select_related)
+KINDS = {
+    'poet': (Poet, ()),
+    'book': (Book, ('poet',)),
+    'poem': (Poem, ('book__poet',)),
+}
+
+
+def get_favorites_settings():
+    return get_settings('FAVORITES_CACHE', DEFAULT_FAVORITES_CACHE)
+
+
+def version_key(user_id):
+    return f'poetry:favorites:version:{user_id}'
+
+
+def favorites_version(user_id):
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump_favorites_version(user_id):
+    key = version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+
+
+def cache_key(user_id, version):
+    return f'poetry:favorites:{user_id}:{version}'
+
+
+def kind_of(obj):
+    return obj._meta.model_name
+
+
+def hydrate(favorites):
+    """{content_type: [objects]} for favorites, in their order, skipping deleted objects"""
+    favorites = list(favorites)
+    ids = {kind: [] for kind in KINDS}
+    for favorite in favorites:
+        if favorite.content_type in ids:
+            ids[favorite.content_type].append(favorite.object_id)
+
+    loaded = {
+        kind: model.objects.select_related(*related).in_bulk(ids[kind]) if ids[kind] else {}
+        for kind, (model, related) in KINDS.items()
+    }
+    objects = {kind: [] for kind in KINDS}
+    for favorite in favorites:
+        obj = loaded.get(favorite.content_type, {}).get(favorite.object_id)
+        if obj is not None:
+            objects[favorite.content_type].append(obj)
+    return objects
+
+
+def load_favorite_keys(user, version=None):
+    if version is None:
+        version = favorites_version(user.pk)
+    keys = frozenset(Favorite.objects.filter(user=user).values_list('content_type', 'object_id'))
+    cache.set(cache_key(user.pk, version), keys, get_favorites_settings()['TIMEOUT'])
+    user._favorite_keys = keys
+    return keys
+
+
+def favorite_keys(user):
+    """The user's favorites as a frozenset of (content_type, object_id)"""
+    if not user.is_authenticated:
+        return frozenset()
+    keys = getattr(user, '_favorite_keys', None)
+    if keys is None:
+        version = favorites_version(user.pk)
+        keys = cache.get(cache_key(user.pk, version))
+        if keys is None:
+            return load_favorite_keys(user, version)
+        user._favorite_keys = keys
+    return keys
+
+
+def is_favorited(user, obj):
+    return (kind_of(obj), obj.pk) in favorite_keys(user)
+
+
+def toggle(user, content_type, object_id):
+    """Add or remove a favorite; returns whether it is now favorited"""
+    if content_type not in KINDS:
+        raise ValueError(f'Unknown content type: {content_type}')
+    object_id = int(object_id)
+    deleted, _ = Favorite.objects.filter(
+        user=user, content_type=content_type, object_id=object_id
+    ).delete()
+    if not deleted:
+        try:
+            with transaction.atomic():
+                Favorite.objects.create(user=user, content_type=content_type, object_id=object_id)
+        except IntegrityError:
+            # A concurrent request (a double click) added it first
+            pass
+    user._favorite_keys = None
+    transaction.on_commit(lambda: load_favorite_keys(user))
+    return not deleted
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+def favorite_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    user_id = instance.user_id
+    bump_favorites_version(user_id)
+    # Sets loaded by other requests before this write commits are orphaned too
+    transaction.on_commit(lambda: bump_favorites_version(user_id))
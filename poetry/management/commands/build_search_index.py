@@ -0,0 +1,218 @@
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections as db_connections
+from django.db.models import Q
+from django.utils import timezone
+from haystack import connections
+from haystack.constants import ID
+from whoosh.filedb.filestore import FileStorage
+
+from poetry.models import IndexQueueEntry
+from poetry.search_index import (
+    TrackedWriter, get_maintenance_settings, read_watermark, replace_documents, staging_folder,
+    write_watermark,
+)
+from poetry.search_queue import get_backend, prepare_document
+
+
+def build_shard(using, label, low, high, folder, schema, indexname):
+    """Worker: index rows low <= pk < high of label into an index in its own folder"""
+    from django.apps import apps
+
+    model = apps.get_model(label)
+    index = connections[using].get_unified_index().get_index(model)
+    backend = connections[using].get_backend()
+
+    # A private folder per shard: writers share the index's temp directory name
+    storage = FileStorage(os.path.join(folder, f'{label}-{low}')).create()
+    writer = storage.create_index(schema, indexname=indexname).writer()
+    count = 0
+    rows = index.index_queryset(using=using).filter(pk__gte=low, pk__lt=high).order_by('pk')
+    for obj in rows.iterator(chunk_size=1000):
+        doc = prepare_document(backend, index, obj)
+        if doc is not None:
+            writer.add_document(**doc)
+            count += 1
+    if not count:
+        writer.cancel()
+        return 0, None
+    writer.commit()
+    return count, storage.folder
+
+
+def id_ranges(queryset, shard_size):
+    """Half-open pk ranges holding about shard_size rows each"""
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    bounds = [pk for position, pk in enumerate(pks.iterator(chunk_size=10000)) if position % shard_size == 0]
+    if not bounds:
+        return []
+    last = queryset.order_by('-pk').values_list('pk', flat=True).first()
+    return list(zip(bounds, bounds[1:] + [last + 1]))
+
+
+def freshness_filter(index, since):
+    """Rows changed since `since`, directly or through a related object the index reads"""
+    model = index.get_model()
+    paths = {''}
+    for field in index.fields.values():
+        attr = field.model_attr or ''
+        parts = attr.split('__')[:-1]
+        paths.update('__'.join(parts[:depth]) for depth in range(1, len(parts) + 1))
+
+    conditions = []
+    for path in sorted(paths):
+        related = model
+        for name in filter(None, path.split('__')):
+            related = related._meta.get_field(name).related_model
+        if any(field.name == 'updated_at' for field in related._meta.fields):
+            lookup = f'{path}__updated_at__gte' if path else 'updated_at__gte'
+            conditions.append(Q(**{lookup: since}))
+    return reduce(or_, conditions) if conditions else Q()
+
+
+def queued_deletions(label):
+    """
+    pks of label rows deleted but possibly still indexed: deletes stay in
+    the index queue until process_index_queue applies them, and applying
+    them again is harmless.
+    """
+    return set(IndexQueueEntry.objects.filter(
+        model=label, action=IndexQueueEntry.ACTION_DELETE
+    ).values_list('object_id', flat=True))
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Whoosh index in parallel, or update it incrementally since the last build'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only reindex rows updated since the stored watermark and drop rows deleted through the index queue'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes building index shards (default: CPU count)'
+        )
+        parser.add_argument(
+            '--shard-size',
+            type=int,
+            default=20000,
+            help='Rows per worker shard (default: 20000)'
+        )
+        parser.add_argument(
+            '--using',
+            default='default',
+            help='Haystack connection (default: default)'
+        )
+
+    def handle(self, *args, **options):
+        self.using = options['using']
+        self.verbosity = options['verbosity']
+        backend = get_backend(self.using)
+        if not hasattr(backend, 'path'):
+            raise CommandError('build_search_index only supports the Whoosh backend')
+        self.backend = backend
+        self.indexes = connections[self.using].get_unified_index().get_indexes()
+
+        if options['incremental']:
+            since = read_watermark(backend.path)
+            if since is None:
+                raise CommandError('No watermark stored yet; run a full build first')
+            self.update_since(since)
+        else:
+            started = timezone.now()
+            self.rebuild(max(1, options['workers']), max(1, options['shard_size']))
+            # Catch rows edited while the shards were being read
+            self.update_since(started)
+
+    def rebuild(self, workers, shard_size):
+        self.stdout.write('Rebuilding search index...')
+        backend = self.backend
+        schema = backend.schema
+        staging = staging_folder(backend.path)
+        indexname = backend.index.indexname
+
+        jobs = []
+        for model, index in self.indexes.items():
+            for low, high in id_ranges(index.index_queryset(using=self.using), shard_size):
+                jobs.append((self.using, model._meta.label_lower, low, high, staging, schema, indexname))
+
+        started = time.monotonic()
+        shards = []
+        documents = 0
+        try:
+            for count, folder in self.run_shards(jobs, workers):
+                if folder is not None:
+                    shards.append(FileStorage(folder).open_index(indexname))
+                    documents += count
+                self.progress(documents, started)
+
+            timeout = get_maintenance_settings()['WRITER_TIMEOUT']
+            replace_documents(backend.index, schema, shards, timeout=timeout)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        backend.index = backend.index.refresh()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {documents} documents from {len(shards)} shards '
+            f'({documents / elapsed if elapsed else 0:.0f} docs/sec)'
+        ))
+
+    def run_shards(self, jobs, workers):
+        if workers == 1 or len(jobs) < 2:
+            for job in jobs:
+                yield build_shard(*job)
+            return
+        # Forked workers must open their own database connections
+        db_connections.close_all()
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            yield from executor.map(build_shard, *zip(*jobs))
+
+    def update_since(self, since):
+        started_at = timezone.now()
+        started = time.monotonic()
+        backend = self.backend
+        backend.index = backend.index.refresh()
+        updated = deleted = 0
+
+        writer = TrackedWriter(backend.index, timeout=get_maintenance_settings()['WRITER_TIMEOUT'])
+        for model, index in self.indexes.items():
+            label = model._meta.label_lower
+            rows = index.index_queryset(using=self.using).filter(freshness_filter(index, since)).distinct()
+            for obj in rows.iterator(chunk_size=1000):
+                doc = prepare_document(backend, index, obj)
+                if doc is not None:
+                    writer.update_document(**doc)
+                    updated += 1
+
+            for pk in queued_deletions(label):
+                writer.delete_by_term(ID, f'{label}.{pk}')
+                deleted += 1
+
+        if updated or deleted:
+            writer.commit()
+        else:
+            # An empty commit would still merge the freshly built segments
+            writer.cancel()
+        write_watermark(backend.path, started_at)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {updated} and removed {deleted} documents changed since {since:%Y-%m-%d %H:%M:%S} '
+            f'({(updated + deleted) / elapsed if elapsed else 0:.0f} docs/sec)'
+        ))
+
+    def progress(self, documents, started):
+        if self.verbosity > 1:
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{documents} documents ({documents / elapsed if elapsed else 0:.0f} docs/sec)')
@@ -0,0 +1,28 @@
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from poetry.cache_backends import TwoTierCache
+
+
+class Command(BaseCommand):
+    help = 'Show per-tier hit ratios of a two-tier cache, summed over all worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--alias', default='default', help='Cache alias (default: default)')
+        parser.add_argument('--reset', action='store_true', help='Zero the shared counters afterwards')
+
+    def handle(self, *args, **options):
+        cache = caches[options['alias']]
+        if not isinstance(cache, TwoTierCache):
+            raise CommandError(f'Cache "{options["alias"]}" is not a TwoTierCache')
+
+        stats = cache.shared_stats()
+        ratios = cache.hit_ratios(stats)
+        entries = cache.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        self.stdout.write(f'L2 entries: {entries}')
+        self.stdout.write(f'L1 hits: {stats["l1_hits"]} ({ratios["l1"]:.1%})')
+        self.stdout.write(f'L2 hits: {stats["l2_hits"]} ({ratios["l2"]:.1%})')
+        self.stdout.write(f'Misses: {stats["misses"]} ({ratios["miss"]:.1%})')
+        self.stdout.write(f'Early refreshes: {stats["early_refreshes"]}')
+        if options['reset']:
+            cache.db.execute('DELETE FROM stats')
+            self.stdout.write('Counters reset')
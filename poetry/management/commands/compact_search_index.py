@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from whoosh.index import LockError
+
+from poetry.search_index import (
+    compact, get_maintenance_settings, in_off_peak_window, index_status, recover_lock,
+)
+from poetry.search_queue import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Merge small or mostly-deleted Whoosh segments during the off-peak window'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--optimize',
+            action='store_true',
+            help='Merge every segment into one'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Run even outside the SEARCH_INDEX_MAINTENANCE off-peak hours'
+        )
+        parser.add_argument(
+            '--recover-lock',
+            action='store_true',
+            help='Clear a stale write lock whose owner has exited before compacting'
+        )
+        parser.add_argument(
+            '--max-segments',
+            type=int,
+            help='Segments to keep at most (default: SEARCH_INDEX_MAINTENANCE MAX_SEGMENTS)'
+        )
+        parser.add_argument(
+            '--using',
+            default='default',
+            help='Haystack connection (default: default)'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['using'])
+        if not hasattr(backend, 'path'):
+            raise CommandError('compact_search_index only supports the Whoosh backend')
+
+        if options['recover_lock']:
+            recovered = recover_lock(backend.index)
+            if recovered:
+                self.stdout.write(self.style.WARNING(f'Write lock: {recovered}'))
+
+        if not options['force'] and not in_off_peak_window():
+            start, end = get_maintenance_settings()['OFF_PEAK_HOURS']
+            self.stdout.write(
+                f'Outside the off-peak window ({start:02d}:00-{end:02d}:00), skipping; use --force to run now'
+            )
+            return
+
+        before = index_status(backend.index)
+        started = time.monotonic()
+        try:
+            merged = compact(backend.index, optimize=options['optimize'], max_segments=options['max_segments'])
+        except LockError:
+            raise CommandError('Search index is locked by another writer; see search_index_status')
+        after = index_status(backend.index.refresh())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {merged} segments in {time.monotonic() - started:.1f}s: "
+            f"{len(before['segments'])} -> {len(after['segments'])} segments, "
+            f"{before['deleted_count']} -> {after['deleted_count']} deleted documents"
+        ))
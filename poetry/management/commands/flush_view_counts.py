@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from poetry.buffers import reading_events, view_counts, request_flush
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered view counts and reading history to the database'
+
+    def handle(self, *args, **options):
+        # Other worker processes pick the signal up on their next timer tick
+        if request_flush():
+            self.stdout.write('Flush requested from running workers')
+
+        flushed = view_counts.flush()
+        read = reading_events.flush()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully flushed {flushed} buffered view counts and {read} reading events')
+        )
@@ -0,0 +1,207 @@
+import csv
+import json
+import os
+import sys
+import time
+from collections import Counter
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from poetry.caching import bump_model_version
+from poetry.counters import add_poems
+from poetry.models import Poet, Book, Poem, ImportCheckpoint
+from poetry.navigation import relink
+from poetry.search_queue import enqueue_many
+from poetry.site_stats import refresh as refresh_site_statistics
+from poetry.slugs import assign_unique_slugs
+from poetry.text import text_stats
+
+REQUIRED_COLUMNS = ('poet', 'book', 'title', 'content')
+
+
+class Command(BaseCommand):
+    help = 'Stream a JSONL or CSV corpus of poems into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='JSONL or CSV file with poet, book, title and content columns ("-" for stdin)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['auto', 'jsonl', 'csv'],
+            default='auto',
+            help='Input format (default: guessed from the file extension)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Poems per bulk insert and transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Name under which committed rows are recorded; an existing checkpoint is resumed from'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        checkpoint = options['checkpoint']
+        done = self.read_checkpoint(checkpoint, path)
+        if done:
+            self.stdout.write(f'Resuming after {done} rows')
+
+        self.poets = dict(Poet.objects.order_by('-id').values_list('name', 'id'))
+        self.books = {
+            (poet_id, title): book_id
+            for poet_id, title, book_id in Book.objects.order_by('-id').values_list('poet_id', 'title', 'id')
+        }
+        self.next_order = {}
+
+        handle = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            rows = islice(self.read_rows(handle, path, options['format']), done, None)
+            imported = skipped = 0
+            resumed = done
+            started = time.monotonic()
+
+            while True:
+                chunk = list(islice(rows, batch_size))
+                if not chunk:
+                    break
+
+                with transaction.atomic():
+                    poems = [poem for poem in (self.build_poem(*row) for row in chunk) if poem is not None]
+                    assign_unique_slugs(poems)
+                    Poem.objects.bulk_create(poems)
+                    # bulk_create skips the signals that maintain stored counters
+                    books = Counter(poem.book_id for poem in poems)
+                    for book_id, count in books.items():
+                        add_poems(book_id, count)
+                    relink(list(books))
+                    enqueue_many(Poem, [poem.pk for poem in poems])
+                    transaction.on_commit(lambda: bump_model_version(Poem))
+                    # Committed with the chunk, so a crash never replays imported rows
+                    done += len(chunk)
+                    self.write_checkpoint(checkpoint, path, done)
+
+                imported += len(poems)
+                skipped += len(chunk) - len(poems)
+
+                elapsed = time.monotonic() - started
+                rate = (done - resumed) / elapsed if elapsed else 0
+                self.stdout.write(f'{done} rows, {imported} poems imported ({rate:.0f} rows/sec)')
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+        # bulk_create skipped the signals that maintain the statistics snapshot
+        if imported:
+            refresh_site_statistics()
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully imported {imported} poems ({skipped} rows skipped)')
+        )
+
+    def read_rows(self, handle, path, fmt):
+        """Yield (line number, row dict) pairs"""
+        if fmt == 'auto':
+            fmt = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+        if fmt == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                raise CommandError(f'Line {number}: invalid JSON ({exc})')
+            if not isinstance(row, dict):
+                raise CommandError(f'Line {number}: expected a JSON object, got {type(row).__name__}')
+            yield number, row
+
+    def build_poem(self, number, row):
+        if any(not row.get(column) or not isinstance(row[column], str) for column in REQUIRED_COLUMNS):
+            self.stderr.write(
+                f'Line {number}: skipping row without {", ".join(REQUIRED_COLUMNS)}: {row.get("title", "")!r}'
+            )
+            return None
+
+        try:
+            order = None if row.get('order') in (None, '') else int(row['order'])
+            difficulty_level = int(row.get('difficulty_level') or 1)
+        except (TypeError, ValueError):
+            self.stderr.write(
+                f'Line {number}: skipping row with a non-integer order or difficulty_level: {row.get("title")!r}'
+            )
+            return None
+        if (order is not None and order < 0) or not 1 <= difficulty_level <= 5:
+            self.stderr.write(
+                f'Line {number}: skipping row with a negative order or a difficulty_level outside 1-5: '
+                f'{row.get("title")!r}'
+            )
+            return None
+
+        book_id = self.get_book_id(row)
+        if order is None:
+            order = self.next_order[book_id]
+        self.next_order[book_id] = max(self.next_order[book_id], order + 1)
+
+        content = row['content']
+        word_count, line_count = text_stats(content)
+        return Poem(
+            title=row['title'].strip(),
+            book_id=book_id,
+            content=content,
+            order=order,
+            is_featured=str(row.get('is_featured', '')).lower() in ('1', 'true', 'yes'),
+            difficulty_level=difficulty_level,
+            word_count=word_count,
+            line_count=line_count,
+        )
+
+    def get_book_id(self, row):
+        poet_name = row['poet'].strip()
+        poet_id = self.poets.get(poet_name)
+        if poet_id is None:
+            poet = Poet.objects.create(name=poet_name, biography=row.get('poet_biography', ''))
+            poet_id = self.poets[poet_name] = poet.id
+
+        title = row['book'].strip()
+        book_id = self.books.get((poet_id, title))
+        if book_id is None:
+            book = Book.objects.create(
+                title=title, poet_id=poet_id, description=row.get('book_description', '')
+            )
+            book_id = self.books[(poet_id, title)] = book.id
+
+        if book_id not in self.next_order:
+            current = Poem.objects.filter(book_id=book_id).aggregate(order=Max('order'))['order']
+            self.next_order[book_id] = 0 if current is None else current + 1
+        return book_id
+
+    def read_checkpoint(self, checkpoint, path):
+        if not checkpoint:
+            return 0
+        state = ImportCheckpoint.objects.filter(name=checkpoint).first()
+        if state is None:
+            return 0
+        if state.path != os.path.abspath(path):
+            raise CommandError(f'Checkpoint {checkpoint} belongs to {state.path}')
+        return state.rows
+
+    def write_checkpoint(self, checkpoint, path, rows):
+        if not checkpoint:
+            return
+        ImportCheckpoint.objects.update_or_create(
+            name=checkpoint, defaults={'path': os.path.abspath(path), 'rows': rows}
+        )
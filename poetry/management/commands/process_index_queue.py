@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from whoosh.index import LockError
+from poetry.search_queue import drain
+
+
+class Command(BaseCommand):
+    help = 'Apply queued search index updates in coalesced batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Queue entries per Whoosh commit (default: 500)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the queue instead of exiting when it is empty'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2.0,
+            help='Seconds to sleep between polls in --loop mode (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        total_entries = total_documents = 0
+
+        while True:
+            try:
+                entries, documents = drain(batch_size=options['batch_size'])
+            except LockError:
+                if not options['loop']:
+                    raise
+                # Entries stay queued; search_index_status shows who holds the lock
+                self.stderr.write('Search index is locked by another writer, retrying')
+                time.sleep(options['interval'])
+                continue
+            total_entries += entries
+            total_documents += documents
+            if entries:
+                self.stdout.write(f'Applied {entries} queue entries ({documents} documents)')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully processed {total_entries} queue entries ({total_documents} documents)'
+            )
+        )
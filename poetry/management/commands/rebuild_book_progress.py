@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from poetry.progress import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute every per-user book progress rollup from the reading history'
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Successfully rebuilt {count} book progress rows'))
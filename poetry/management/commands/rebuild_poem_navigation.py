@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from poetry.navigation import relink
+
+
+class Command(BaseCommand):
+    help = 'Recompute the previous/next links between the poems of every book'
+
+    def handle(self, *args, **options):
+        changed = relink()
+        self.stdout.write(self.style.SUCCESS(f'Successfully relinked {changed} poems'))
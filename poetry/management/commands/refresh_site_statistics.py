@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from poetry.site_stats import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized site statistics snapshot'
+
+    def handle(self, *args, **options):
+        stats = refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Site statistics refreshed: {stats.total_poets} poets, {stats.total_books} books, '
+            f'{stats.total_poems} poems, {stats.total_views} views'
+        ))
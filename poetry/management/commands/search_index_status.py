@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from poetry.search_index import get_maintenance_settings, index_status, lock_status, plan_merge, read_toc
+from poetry.search_queue import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Report Whoosh index segments, document counts, deleted ratio and write lock state'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--using',
+            default='default',
+            help='Haystack connection (default: default)'
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['using'])
+        if not hasattr(backend, 'path'):
+            raise CommandError('search_index_status only supports the Whoosh backend')
+        ix = backend.index
+        status = index_status(ix)
+        lock = lock_status(ix)
+        settings = get_maintenance_settings()
+
+        self.stdout.write(f"Index {backend.path} (generation {status['generation']})")
+        self.stdout.write(f"Segments: {len(status['segments'])}")
+        for segment in status['segments']:
+            self.stdout.write(f"  {segment['id']}: {segment['docs']} docs, {segment['deleted']} deleted")
+        self.stdout.write(
+            f"Documents: {status['doc_count']} live, {status['deleted_count']} deleted "
+            f"(deleted ratio {status['deleted_ratio']:.1%})"
+        )
+
+        if lock['stale']:
+            self.stdout.write(self.style.ERROR(f"Write lock: STALE, {lock['reason']}"))
+        elif lock['held']:
+            self.stdout.write(self.style.WARNING(f"Write lock: {lock['reason']}"))
+        else:
+            self.stdout.write(f"Write lock: {lock['reason']}")
+
+        merge, _ = plan_merge(read_toc(ix).segments, settings['MAX_SEGMENTS'], settings['MAX_DELETED_RATIO'])
+        if merge:
+            self.stdout.write(self.style.WARNING(
+                f'Compaction recommended: {len(merge)} segments to merge (run compact_search_index)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Compaction not needed'))
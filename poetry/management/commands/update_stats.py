@@ -1,10 +1,25 @@
-from django.core.management.base import BaseCommand
+import os
+import time
+from datetime import datetime, time as day_start
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from poetry.models import Poet, Book, Poem
+from poetry.text import text_stats
+
+
+def compute_stats(rows):
+    """Worker: [(id, content)] -> [(id, word_count, line_count)]"""
+    return [(pk, *text_stats(content)) for pk, content in rows]
 
 
 class Command(BaseCommand):
-    help = 'Update statistics for all poets, books, and poems'
+    help = 'Update statistics for all poets, books, and poems, repairing stored counters'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -14,51 +29,163 @@ class Command(BaseCommand):
             default='all',
             help='Which model to update (default: all)'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Poems fetched, computed and written per chunk (default: 2000)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Processes computing text statistics; 1 computes in-process'
+        )
+        parser.add_argument(
+            '--since',
+            help='Only rows updated at or after this ISO date or datetime'
+        )
 
     def handle(self, *args, **options):
         model = options['model']
-        
-        if model in ['poets', 'all']:
-            self.update_poet_stats()
-        
-        if model in ['books', 'all']:
-            self.update_book_stats()
-        
+        self.verbosity = options['verbosity']
+        self.chunk_size = options['chunk_size']
+        self.workers = max(1, options['workers'])
+        self.since = self.parse_since(options['since'])
+
+        # Poem stats first so book and poet aggregates see fresh counts
         if model in ['poems', 'all']:
             self.update_poem_stats()
 
+        if model in ['books', 'all']:
+            self.update_book_stats()
+
+        if model in ['poets', 'all']:
+            self.update_poet_stats()
+
+    def parse_since(self, value):
+        if not value:
+            return None
+        since = parse_datetime(value)
+        if since is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid --since value: {value}')
+            since = datetime.combine(day, day_start.min)
+        if timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        return since
+
     def update_poet_stats(self):
         self.stdout.write('Updating poet statistics...')
         poets = Poet.objects.all()
-        
-        for poet in poets:
-            # This will be handled by the manager methods
-            pass
-            
+        if self.since:
+            # A subquery rather than a join, which would repeat poets once per changed poem
+            poets = poets.filter(
+                pk__in=Poem.objects.filter(updated_at__gte=self.since).values('book__poet_id')
+            )
+
+        # Two grouped queries: counting both through one join inflates books
+        stored = {pk: (books, poems) for pk, books, poems in poets.values_list('pk', 'books_count', 'poems_count')}
+        totals = {pk: [0, 0] for pk in stored}
+        for row in Book.objects.filter(poet__in=poets).values('poet_id').annotate(n=Count('id')).order_by():
+            totals[row['poet_id']][0] = row['n']
+        for row in Poem.objects.filter(book__poet__in=poets).values('book__poet_id').annotate(n=Count('id')).order_by():
+            totals[row['book__poet_id']][1] = row['n']
+
+        self.report(totals, 'books={0} poems={1}', 'poet')
+        dirty = [
+            Poet(pk=pk, books_count=books, poems_count=poems)
+            for pk, (books, poems) in totals.items() if stored[pk] != (books, poems)
+        ]
+        with transaction.atomic():
+            Poet.objects.bulk_update(dirty, ['books_count', 'poems_count'], batch_size=500)
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully updated {poets.count()} poets')
+            self.style.SUCCESS(f'Successfully updated {len(dirty)} of {len(totals)} poets')
         )
 
     def update_book_stats(self):
         self.stdout.write('Updating book statistics...')
         books = Book.objects.all()
-        
-        for book in books:
-            # Update poems count and other stats if needed
-            pass
-            
+        if self.since:
+            # A subquery, so the filter's join does not restrict the counted poems
+            books = books.filter(pk__in=Poem.objects.filter(updated_at__gte=self.since).values('book_id'))
+
+        stored = dict(books.values_list('pk', 'poems_count'))
+        totals = {pk: [0] for pk in stored}
+        for row in Poem.objects.filter(book__in=books).values('book_id').annotate(n=Count('id')).order_by():
+            totals[row['book_id']][0] = row['n']
+
+        self.report(totals, 'poems={0}', 'book')
+        dirty = [
+            Book(pk=pk, poems_count=poems)
+            for pk, (poems,) in totals.items() if stored[pk] != poems
+        ]
+        with transaction.atomic():
+            Book.objects.bulk_update(dirty, ['poems_count'], batch_size=500)
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully updated {books.count()} books')
+            self.style.SUCCESS(f'Successfully updated {len(dirty)} of {len(totals)} books')
         )
 
     def update_poem_stats(self):
         self.stdout.write('Updating poem statistics...')
-        poems = Poem.objects.all()
-        
-        for poem in poems:
-            # Re-save to trigger word_count and line_count calculation
-            poem.save()
-            
+        poems = Poem.objects.only('id', 'content', 'word_count', 'line_count').order_by('pk')
+        if self.since:
+            poems = poems.filter(updated_at__gte=self.since)
+
+        started = time.monotonic()
+        seen = changed = 0
+        rows = poems.iterator(chunk_size=self.chunk_size)
+
+        def chunks():
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    return
+                yield chunk
+
+        for chunk, results in self.compute(chunks()):
+            by_id = {poem.pk: poem for poem in chunk}
+            dirty = []
+            for pk, word_count, line_count in results:
+                poem = by_id[pk]
+                if (poem.word_count, poem.line_count) != (word_count, line_count):
+                    poem.word_count, poem.line_count = word_count, line_count
+                    dirty.append(poem)
+            if dirty:
+                with transaction.atomic():
+                    Poem.objects.bulk_update(dirty, ['word_count', 'line_count'], batch_size=500)
+
+            seen += len(chunk)
+            changed += len(dirty)
+            if self.verbosity > 1:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'{seen} poems scanned ({seen / elapsed if elapsed else 0:.0f}/sec)')
+
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully updated {poems.count()} poems')
-        )
\ No newline at end of file
+            self.style.SUCCESS(f'Successfully updated {changed} of {seen} poems')
+        )
+
+    def compute(self, chunks):
+        """Yield (chunk, stats) pairs, keeping at most 2 chunks per worker in flight"""
+        if self.workers == 1:
+            for chunk in chunks:
+                yield chunk, compute_stats([(poem.pk, poem.content) for poem in chunk])
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = []
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(
+                    compute_stats, [(poem.pk, poem.content) for poem in chunk]
+                )))
+                if len(pending) >= self.workers * 2:
+                    chunk, future = pending.pop(0)
+                    yield chunk, future.result()
+            for chunk, future in pending:
+                yield chunk, future.result()
+
+    def report(self, totals, template, label):
+        if self.verbosity > 1:
+            for pk, values in sorted(totals.items()):
+                self.stdout.write(f'  {label} #{pk}: {template.format(*values)}')
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0003_favorite_readinghistory_alter_book_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndexQueueEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('action', models.CharField(choices=[('update', 'Навсозӣ'), ('delete', 'Нест кардан')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Навбати индекс',
+                'verbose_name_plural': 'Навбати индекс',
+                'ordering': ['id'],
+            },
+        ),
+    ]
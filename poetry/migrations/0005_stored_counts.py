@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:55
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, key):
+    """Correlated COUNT(*) of queryset rows whose key matches the outer pk"""
+    return Coalesce(Subquery(
+        queryset.filter(**{key: OuterRef('pk')}).order_by().values(key)
+        .annotate(n=Count('pk')).values('n'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def backfill_counts(apps, schema_editor):
+    Poet = apps.get_model('poetry', 'Poet')
+    Book = apps.get_model('poetry', 'Book')
+    Poem = apps.get_model('poetry', 'Poem')
+    Book.objects.update(poems_count=count_of(Poem.objects.all(), 'book'))
+    Poet.objects.update(
+        books_count=count_of(Book.objects.all(), 'poet'),
+        poems_count=count_of(Poem.objects.all(), 'book__poet'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0004_index_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='poems_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Шеърҳо'),
+        ),
+        migrations.AddField(
+            model_name='poet',
+            name='books_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Китобҳо'),
+        ),
+        migrations.AddField(
+            model_name='poet',
+            name='poems_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Шеърҳо'),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
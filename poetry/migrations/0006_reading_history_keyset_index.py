@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 13:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0005_stored_counts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='readinghistory',
+            index=models.Index(fields=['user', '-read_at', '-id'], name='poetry_read_user_id_b6df95_idx'),
+        ),
+    ]
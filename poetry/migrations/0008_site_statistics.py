@@ -0,0 +1,30 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0007_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_poets', models.PositiveIntegerField(default=0, verbose_name='Шумораи шоирон')),
+                ('total_books', models.PositiveIntegerField(default=0, verbose_name='Шумораи китобҳо')),
+                ('total_poems', models.PositiveIntegerField(default=0, verbose_name='Шумораи шеърҳо')),
+                ('total_views', models.PositiveBigIntegerField(default=0, verbose_name='Шумораи умумии бозидҳо')),
+                ('most_viewed', models.JSONField(default=dict, verbose_name='Серхонандатаринҳо')),
+                ('recent_additions', models.JSONField(default=dict, verbose_name='Иловаҳои нав')),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True, verbose_name='Санаи ҳисоби пурра')),
+            ],
+            options={
+                'verbose_name': 'Омори сайт',
+                'verbose_name_plural': 'Омори сайт',
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0008_site_statistics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='readinghistory',
+            name='read_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
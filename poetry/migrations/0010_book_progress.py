@@ -0,0 +1,59 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_progress(apps, schema_editor):
+    ReadingHistory = apps.get_model('poetry', 'ReadingHistory')
+    BookProgress = apps.get_model('poetry', 'BookProgress')
+    rows = ReadingHistory.objects.values('user_id', 'poem__book_id').annotate(
+        read_count=Count('id'), last_read_at=Max('read_at')
+    ).order_by()
+    latest = {}
+    for user, book, poem in ReadingHistory.objects.order_by('read_at', 'id').values_list(
+        'user_id', 'poem__book_id', 'poem_id'
+    ).iterator():
+        latest[(user, book)] = poem
+    BookProgress.objects.bulk_create(
+        [
+            BookProgress(
+                user_id=row['user_id'], book_id=row['poem__book_id'], read_count=row['read_count'],
+                last_poem_id=latest[(row['user_id'], row['poem__book_id'])], last_read_at=row['last_read_at'],
+            )
+            for row in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0009_reading_history_read_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_count', models.PositiveIntegerField(default=0, verbose_name='Шеърҳои хондашуда')),
+                ('last_read_at', models.DateTimeField(verbose_name='Охирин бор хонда шуд')),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reader_progress', to='poetry.book', verbose_name='Китоб')),
+                ('last_poem', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='poetry.poem', verbose_name='Шеъри охирин')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='book_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Пешравии китоб',
+                'verbose_name_plural': 'Пешравии китобҳо',
+                'ordering': ['-last_read_at'],
+                'indexes': [models.Index(fields=['user', '-last_read_at'], name='poetry_book_user_id_6cb791_idx')],
+                'unique_together': {('user', 'book')},
+            },
+        ),
+        migrations.RunPython(backfill_progress, migrations.RunPython.noop),
+    ]
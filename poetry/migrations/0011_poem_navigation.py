@@ -0,0 +1,42 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import Lag, Lead
+
+
+def link_neighbors(apps, schema_editor):
+    Poem = apps.get_model('poetry', 'Poem')
+    window = {
+        'partition_by': [F('book_id')],
+        'order_by': [F('order').asc(), F('title').asc(), F('pk').asc()],
+    }
+    rows = Poem.objects.annotate(
+        previous_id=Window(Lag('pk'), **window), next_id=Window(Lead('pk'), **window)
+    ).order_by().values_list('pk', 'previous_id', 'next_id')
+    Poem.objects.bulk_update(
+        [Poem(pk=pk, previous_poem_id=previous_id, next_poem_id=next_id) for pk, previous_id, next_id in rows],
+        ['previous_poem', 'next_poem'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0010_book_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poem',
+            name='next_poem',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='poetry.poem'),
+        ),
+        migrations.AddField(
+            model_name='poem',
+            name='previous_poem',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='poetry.poem'),
+        ),
+        migrations.RunPython(link_neighbors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-17 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0011_poem_navigation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitestatistics',
+            name='dirty',
+            field=models.BooleanField(default=False, verbose_name='Рӯйхатҳо кӯҳна шудаанд'),
+        ),
+    ]
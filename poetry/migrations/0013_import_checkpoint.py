@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-17 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('poetry', '0012_site_statistics_dirty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('path', models.CharField(max_length=1024)),
+                ('rows', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Нуқтаи воридот',
+                'verbose_name_plural': 'Нуқтаҳои воридот',
+            },
+        ),
+    ]
@@ -1,68 +1,26 @@
 from django.db import models
 from django.urls import reverse
-from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from taggit.managers import TaggableManager
 from django.contrib.auth.models import User
-import re
-
-
-def custom_slugify(value):
-    """Custom slugify function that handles Persian/Tajik characters better"""
-    if not value:
-        return ''
-    
-    value = str(value)
-    
-    # Tajik Cyrillic and Persian to Latin transliteration map
-    char_map = {
-        # Tajik Cyrillic to Latin
-        'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'ғ': 'gh', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh',
-        'з': 'z', 'и': 'i', 'ӣ': 'i', 'й': 'y', 'к': 'k', 'қ': 'q', 'л': 'l', 'м': 'm', 'н': 'n',
-        'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ӯ': 'u', 'ф': 'f', 'х': 'kh',
-        'ҳ': 'h', 'ч': 'ch', 'ҷ': 'j', 'ш': 'sh', 'ъ': '', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
-        
-        # Persian/Arabic to Latin (for backward compatibility)
-        'ا': 'a', 'ب': 'b', 'پ': 'p', 'ت': 't', 'ث': 's', 'ج': 'j', 'چ': 'ch', 'ح': 'h', 'خ': 'kh',
-        'د': 'd', 'ذ': 'z', 'ر': 'r', 'ز': 'z', 'ژ': 'zh', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd',
-        'ط': 't', 'ظ': 'z', 'ع': 'a', 'غ': 'gh', 'ف': 'f', 'ق': 'q', 'ک': 'k', 'گ': 'g', 'ل': 'l',
-        'م': 'm', 'ن': 'n', 'و': 'v', 'ه': 'h', 'ی': 'y', 'ء': '', 'آ': 'a', 'أ': 'a', 'إ': 'e',
-        'ة': 'h', 'ى': 'a', 'ئ': 'y', 'ؤ': 'v'
-    }
-    
-    # Replace characters with Latin equivalents
-    for char, latin in char_map.items():
-        value = value.replace(char, latin)
-    
-    # Use Django's slugify for the rest
-    slug = slugify(value)
-    
-    # If still empty after slugify, create a fallback
-    if not slug:
-        # Remove non-alphanumeric characters and create basic slug
-        slug = re.sub(r'[^\w\s-]', '', value).strip().lower()
-        slug = re.sub(r'[-\s]+', '-', slug)
-        if not slug:
-            slug = 'item'  # fallback
-    
-    return slug
+from .buffers import view_counts
+from .counters import CounterCacheMixin
+from .slugs import UniqueSlugMixin
+from .text import text_stats
 
 
 class PoetManager(models.Manager):
     def with_stats(self):
-        """Get poets with book and poem counts"""
-        return self.annotate(
-            books_count=models.Count('books'),
-            poems_count=models.Count('books__poems')
-        )
+        """Get poets with book and poem counts (stored on the row)"""
+        return self.all()
 
     def featured(self):
         """Get featured poets (those with most books)"""
-        return self.with_stats().filter(books_count__gt=0).order_by('-books_count')[:6]
+        return self.filter(books_count__gt=0).order_by('-books_count')[:6]
 
 
-class Poet(models.Model):
+class Poet(CounterCacheMixin, UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=200, verbose_name="Ном", db_index=True)
     slug = models.SlugField(unique=True, blank=True, db_index=True)
     birth_date = models.DateField(null=True, blank=True, verbose_name="Санаи таваллуд")
@@ -73,10 +31,14 @@ class Poet(models.Model):
     nationality = models.CharField(max_length=100, blank=True, verbose_name="Миллият")
     is_featured = models.BooleanField(default=False, verbose_name="Намоён кардан")
     view_count = models.PositiveIntegerField(default=0, verbose_name="Шумораи бозид")
+    books_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Китобҳо")
+    poems_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Шеърҳо")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     objects = PoetManager()
+    slug_source = 'name'
+    protected_fields = ('books_count', 'poems_count')
     tags = TaggableManager(blank=True, verbose_name="Нишонаҳо")
 
     class Meta:
@@ -92,19 +54,6 @@ class Poet(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = custom_slugify(self.name)
-            # Ensure uniqueness
-            if self.__class__.objects.filter(slug=self.slug).exists():
-                counter = 1
-                new_slug = f"{self.slug}-{counter}"
-                while self.__class__.objects.filter(slug=new_slug).exists():
-                    counter += 1
-                    new_slug = f"{self.slug}-{counter}"
-                self.slug = new_slug
-        super().save(*args, **kwargs)
-
     def get_absolute_url(self):
         return reverse('poet_detail', kwargs={'slug': self.slug})
 
@@ -121,9 +70,9 @@ class Poet(models.Model):
         return self.death_date is None
 
     def increment_view_count(self):
-        """Increment view count"""
+        """Increment view count through the write-behind buffer"""
         self.view_count += 1
-        self.save(update_fields=['view_count'])
+        view_counts.record(self)
 
 
 class BookManager(models.Manager):
@@ -136,7 +85,7 @@ class BookManager(models.Manager):
         return self.order_by('-created_at')[:limit]
 
 
-class Book(models.Model):
+class Book(CounterCacheMixin, UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=200, verbose_name="Унвон", db_index=True)
     slug = models.SlugField(unique=True, blank=True, db_index=True)
     poet = models.ForeignKey(Poet, on_delete=models.CASCADE, related_name='books', verbose_name="Шоир")
@@ -148,10 +97,13 @@ class Book(models.Model):
     language = models.CharField(max_length=50, default='Тоҷикӣ', verbose_name="Забон")
     is_featured = models.BooleanField(default=False, verbose_name="Намоён кардан")
     view_count = models.PositiveIntegerField(default=0, verbose_name="Шумораи бозид")
+    poems_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Шеърҳо")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     objects = BookManager()
+    protected_fields = ('poems_count',)
+    counted_parent = 'poet'
     tags = TaggableManager(blank=True, verbose_name="Нишонаҳо")
 
     class Meta:
@@ -167,31 +119,13 @@ class Book(models.Model):
     def __str__(self):
         return f"{self.title} - {self.poet.name}"
 
-    def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = custom_slugify(self.title)
-            # Ensure uniqueness
-            if self.__class__.objects.filter(slug=self.slug).exists():
-                counter = 1
-                new_slug = f"{self.slug}-{counter}"
-                while self.__class__.objects.filter(slug=new_slug).exists():
-                    counter += 1
-                    new_slug = f"{self.slug}-{counter}"
-                self.slug = new_slug
-        super().save(*args, **kwargs)
-
     def get_absolute_url(self):
         return reverse('book_detail', kwargs={'slug': self.slug})
 
     def increment_view_count(self):
-        """Increment view count"""
+        """Increment view count through the write-behind buffer"""
         self.view_count += 1
-        self.save(update_fields=['view_count'])
-
-    # @property
-    # def poems_count(self):
-    #     """Get total number of poems in this book"""
-    #     return self.poems.count()
+        view_counts.record(self)
 
 
 class PoemManager(models.Manager):
@@ -208,7 +142,7 @@ class PoemManager(models.Manager):
         return self.filter(book__poet=poet)
 
 
-class Poem(models.Model):
+class Poem(CounterCacheMixin, UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=200, verbose_name="Унвон", db_index=True)
     slug = models.SlugField(blank=True, db_index=True)
     book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='poems', verbose_name="Китоб")
@@ -223,10 +157,21 @@ class Poem(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(5)],
         verbose_name="Дараҷаи душворӣ"
     )
+    # Neighbors within the book in reading order, maintained by poetry.navigation
+    previous_poem = models.ForeignKey(
+        'self', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+'
+    )
+    next_poem = models.ForeignKey(
+        'self', null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     objects = PoemManager()
+    slug_scope = ('book',)
+    protected_fields = ('previous_poem', 'next_poem')
+    counted_parent = 'book'
+    tracked_fields = ('book', 'order', 'title')
     tags = TaggableManager(blank=True, verbose_name="Нишонаҳо")
 
     class Meta:
@@ -245,21 +190,9 @@ class Poem(models.Model):
         return f"{self.title} - {self.book.title}"
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = custom_slugify(self.title)
-            # Ensure uniqueness within the same book
-            if self.__class__.objects.filter(book=self.book, slug=self.slug).exists():
-                counter = 1
-                new_slug = f"{self.slug}-{counter}"
-                while self.__class__.objects.filter(book=self.book, slug=new_slug).exists():
-                    counter += 1
-                    new_slug = f"{self.slug}-{counter}"
-                self.slug = new_slug
-        
         # Auto-calculate word and line counts
         if self.content:
-            self.word_count = len(self.content.split())
-            self.line_count = len([line for line in self.content.split('\n') if line.strip()])
+            self.word_count, self.line_count = text_stats(self.content)
         
         super().save(*args, **kwargs)
 
@@ -267,15 +200,21 @@ class Poem(models.Model):
         return reverse('poem_detail', kwargs={'book_slug': self.book.slug, 'poem_slug': self.slug})
 
     def get_previous_poem(self):
-        return self.book.poems.filter(order__lt=self.order).last()
+        # Links loaded with the poem (select_related) are used as is; otherwise
+        # ask the neighbor, since a sibling's save may have relinked this poem
+        if self._meta.get_field('previous_poem').is_cached(self):
+            return self.previous_poem
+        return Poem.objects.filter(next_poem=self.pk).first()
 
     def get_next_poem(self):
-        return self.book.poems.filter(order__gt=self.order).first()
+        if self._meta.get_field('next_poem').is_cached(self):
+            return self.next_poem
+        return Poem.objects.filter(previous_poem=self.pk).first()
 
     def increment_view_count(self):
-        """Increment view count"""
+        """Increment view count through the write-behind buffer"""
         self.view_count += 1
-        self.save(update_fields=['view_count'])
+        view_counts.record(self)
 
     @property
     def reading_time(self):
@@ -309,7 +248,8 @@ class ReadingHistory(models.Model):
     """Track user reading history"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reading_history')
     poem = models.ForeignKey(Poem, on_delete=models.CASCADE)
-    read_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: buffered reads are written later with the time they happened
+    read_at = models.DateTimeField(default=timezone.now)
     reading_progress = models.PositiveIntegerField(
         default=100,
         validators=[MinValueValidator(0), MaxValueValidator(100)],
@@ -319,8 +259,110 @@ class ReadingHistory(models.Model):
     class Meta:
         unique_together = ['user', 'poem']
         ordering = ['-read_at']
+        indexes = [
+            models.Index(fields=['user', '-read_at', '-id']),
+        ]
         verbose_name = "Таърихи хондан"
         verbose_name_plural = "Таърихи хондан"
 
     def __str__(self):
         return f"{self.user.username} - {self.poem.title}"
+
+
+class BookProgress(models.Model):
+    """Per-user reading rollup of a book, maintained from ReadingHistory writes by poetry.progress"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='book_progress')
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='reader_progress', verbose_name="Китоб")
+    read_count = models.PositiveIntegerField(default=0, verbose_name="Шеърҳои хондашуда")
+    last_poem = models.ForeignKey(
+        Poem, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Шеъри охирин"
+    )
+    last_read_at = models.DateTimeField(verbose_name="Охирин бор хонда шуд")
+
+    class Meta:
+        unique_together = ['user', 'book']
+        ordering = ['-last_read_at']
+        indexes = [
+            models.Index(fields=['user', '-last_read_at']),
+        ]
+        verbose_name = "Пешравии китоб"
+        verbose_name_plural = "Пешравии китобҳо"
+
+    def __str__(self):
+        return f"{self.user.username} - {self.book.title} ({self.read_count})"
+
+    @property
+    def percent(self):
+        """Share of the book's poems read, from the stored poem counter"""
+        total = self.book.poems_count
+        return min(100, round(self.read_count * 100 / total)) if total else 0
+
+
+class IndexQueueEntry(models.Model):
+    """Pending search index update, drained by the process_index_queue command"""
+    ACTION_UPDATE = 'update'
+    ACTION_DELETE = 'delete'
+
+    model = models.CharField(max_length=100)
+    object_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=[
+        (ACTION_UPDATE, 'Навсозӣ'),
+        (ACTION_DELETE, 'Нест кардан'),
+    ])
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = "Навбати индекс"
+        verbose_name_plural = "Навбати индекс"
+
+    def __str__(self):
+        return f"{self.action} {self.model} #{self.object_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """Corpus rows committed by import_corpus, saved in each chunk's transaction"""
+    name = models.CharField(max_length=255, unique=True)
+    path = models.CharField(max_length=1024)
+    rows = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Нуқтаи воридот"
+        verbose_name_plural = "Нуқтаҳои воридот"
+
+    def __str__(self):
+        return f"{self.name}: {self.rows}"
+
+
+class SiteStatistics(models.Model):
+    """Materialized site totals and top lists, kept current by poetry.site_stats"""
+    total_poets = models.PositiveIntegerField(default=0, verbose_name="Шумораи шоирон")
+    total_books = models.PositiveIntegerField(default=0, verbose_name="Шумораи китобҳо")
+    total_poems = models.PositiveIntegerField(default=0, verbose_name="Шумораи шеърҳо")
+    total_views = models.PositiveBigIntegerField(default=0, verbose_name="Шумораи умумии бозидҳо")
+    most_viewed = models.JSONField(default=dict, verbose_name="Серхонандатаринҳо")
+    recent_additions = models.JSONField(default=dict, verbose_name="Иловаҳои нав")
+    refreshed_at = models.DateTimeField(null=True, blank=True, verbose_name="Санаи ҳисоби пурра")
+    dirty = models.BooleanField(default=False, verbose_name="Рӯйхатҳо кӯҳна шудаанд")
+
+    class Meta:
+        verbose_name = "Омори сайт"
+        verbose_name_plural = "Омори сайт"
+
+    def __str__(self):
+        return f"{self.total_poets} / {self.total_books} / {self.total_poems}"
+
+    def as_dict(self):
+        """The statistics page context: totals, most viewed and recent lists"""
+        return {
+            'total_poets': self.total_poets,
+            'total_books': self.total_books,
+            'total_poems': self.total_poems,
+            'total_views': self.total_views,
+            'most_viewed_poets': self.most_viewed.get('poets', []),
+            'most_viewed_books': self.most_viewed.get('books', []),
+            'most_viewed_poems': self.most_viewed.get('poems', []),
+            'recent_additions': self.recent_additions,
+            'refreshed_at': self.refreshed_at,
+        }
@@ -0,0 +1,63 @@
+"""
+Previous/next links between the poems of a book.
+
+The poem page used to find its neighbors with two queries per view
+(``order__lt`` reversed through ``Meta.ordering``, then ``order__gt``), and
+poems sharing an ``order`` value were skipped entirely. Each poem now stores
+``previous_poem`` and ``next_poem``, so the page loads both neighbors with
+the poem itself through ``select_related``.
+
+The links follow the book listing's order, ``(order, title)``, with the
+primary key breaking the remaining ties. ``relink`` recomputes them for some
+books with one ``LAG``/``LEAD`` window query and writes back only the rows
+whose links changed. The receivers below relink the affected book after
+every poem delete, and after saves that create a poem or change its
+``order``, ``title`` or ``book`` (reordering, renames and moves between
+books) compared with the loaded values. Writes that bypass signals (``bulk_create``,
+``QuerySet.update``) must call ``relink`` themselves; the
+``rebuild_poem_navigation`` command relinks every book.
+"""
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Lag, Lead
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Poem
+
+READING_ORDER = [F('order').asc(), F('title').asc(), F('pk').asc()]
+
+
+def relink(book_ids=None):
+    """Recompute the neighbor links of the given books (all books if None); returns the rows changed"""
+    window = {'partition_by': [F('book_id')], 'order_by': READING_ORDER}
+    poems = Poem._base_manager.all()
+    if book_ids is not None:
+        poems = poems.filter(book_id__in=book_ids)
+    rows = poems.annotate(
+        previous_id=Window(Lag('pk'), **window), next_id=Window(Lead('pk'), **window)
+    ).order_by().values_list('pk', 'previous_poem_id', 'next_poem_id', 'previous_id', 'next_id')
+
+    changed = [
+        Poem(pk=pk, previous_poem_id=previous_id, next_poem_id=next_id)
+        for pk, stored_previous, stored_next, previous_id, next_id in rows.iterator()
+        if (stored_previous, stored_next) != (previous_id, next_id)
+    ]
+    with transaction.atomic():
+        Poem._base_manager.bulk_update(changed, ['previous_poem', 'next_poem'], batch_size=500)
+    return len(changed)
+
+
+@receiver(post_save, sender=Poem)
+def poem_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or not (created or instance.changed_since_load('book', 'order', 'title')):
+        return
+    # Poems still linked to this one belong to the book it left, if it moved
+    relink(Poem._base_manager.filter(
+        Q(pk=instance.pk) | Q(previous_poem=instance.pk) | Q(next_poem=instance.pk)
+    ).values('book_id'))
+
+
+@receiver(post_delete, sender=Poem)
+def poem_deleted(sender, instance, **kwargs):
+    relink([instance.book_id])
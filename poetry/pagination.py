@@ -0,0 +1,269 @@
+"""
+Keyset (cursor) pagination.
+
+Page-number pagination runs a ``COUNT(*)`` and an ``OFFSET`` scan that gets
+slower the deeper a client pages. Keyset pagination instead remembers the
+sort key of the last row served and asks for rows strictly after it, e.g.
+``WHERE (order > 3) OR (order = 3 AND id > 41) ORDER BY order, id``, which an
+index on the ordering answers directly at any depth. There is no total count.
+
+The ordering must be total: it always ends with the primary key, and the
+fields (or annotations) before it must not be NULL. Cursors are opaque URL-safe tokens that
+carry the ordering they were issued for, so a cursor cannot be replayed
+against a different ordering.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def total_ordering(queryset, ordering=None):
+    """ordering (or the queryset's own) with the primary key appended as tie-breaker"""
+    ordering = list(ordering or queryset.query.order_by or queryset.model._meta.ordering)
+    names = {name.lstrip('-') for name in ordering}
+    pk_name = queryset.model._meta.pk.name
+    if not names & {'pk', pk_name}:
+        ordering.append(f'-{pk_name}' if ordering and ordering[-1].startswith('-') else pk_name)
+    return ordering
+
+
+def resolve_field(model, path):
+    """Concrete field a (possibly related) ordering path ends in"""
+    field = None
+    for name in path.split('__'):
+        if field is not None:
+            model = field.related_model
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+    if field.is_relation and field.attname != path.split('__')[-1]:
+        raise FieldDoesNotExist(f'{path} is a relation; order by its column ({field.attname}) instead')
+    return field
+
+
+def read_key(obj, path):
+    for name in path.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def encode_cursor(ordering, position, reverse=False):
+    payload = {'o': ordering, 'p': position}
+    if reverse:
+        payload['r'] = 1
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        return payload['o'], payload['p'], bool(payload.get('r'))
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor(token)
+
+
+def after(ordering, values):
+    """Q matching rows that sort strictly after values under ordering"""
+    condition = Q()
+    equal = Q()
+    for name, value in zip(ordering, values):
+        field = name.lstrip('-')
+        lookup = 'lt' if name.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def flip(ordering):
+    return [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by keyset; ``page(cursor)`` reads per_page + 1 rows
+    and never counts.
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.ordering = total_ordering(queryset, ordering)
+        self.queryset = queryset.order_by(*self.ordering)
+        self.per_page = per_page
+        annotations = queryset.query.annotations
+        try:
+            self.fields = [
+                annotations[name.lstrip('-')].output_field if name.lstrip('-') in annotations
+                else resolve_field(queryset.model, name.lstrip('-'))
+                for name in self.ordering
+            ]
+        except FieldDoesNotExist as exc:
+            raise ValueError(f'Keyset ordering must name model fields: {exc}')
+
+    def position(self, obj):
+        values = [read_key(obj, name.lstrip('-')) for name in self.ordering]
+        # isoformat keeps microseconds, which the keyset comparison needs
+        return [value.isoformat() if isinstance(value, (datetime.date, datetime.time)) else value
+                for value in values]
+
+    def page(self, cursor=None):
+        reverse = False
+        queryset = self.queryset
+        if cursor:
+            ordering, position, reverse = decode_cursor(cursor)
+            if ordering != self.ordering or len(position) != len(self.fields):
+                raise InvalidCursor(cursor)
+            try:
+                values = [field.to_python(value) for field, value in zip(self.fields, position)]
+            except Exception:
+                raise InvalidCursor(cursor)
+            if reverse:
+                queryset = queryset.order_by(*flip(self.ordering)).filter(after(flip(self.ordering), values))
+            else:
+                queryset = queryset.filter(after(self.ordering, values))
+
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if more or reverse:
+                next_cursor = encode_cursor(self.ordering, self.position(rows[-1]))
+            if cursor and (more or not reverse):
+                previous_cursor = encode_cursor(self.ordering, self.position(rows[0]), reverse=True)
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        """Like page(), but an invalid cursor falls back to the first page"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+class PositionPaginator:
+    """
+    Paginate an already ranked sequence, such as cached search results,
+    with the same cursor format; the cursor position is the offset.
+    """
+    ordering = ['position']
+
+    def __init__(self, sequence, per_page):
+        self.sequence = sequence
+        self.per_page = per_page
+
+    def page(self, cursor=None):
+        offset = 0
+        if cursor:
+            ordering, position, _ = decode_cursor(cursor)
+            if ordering != self.ordering or not isinstance(position, list) or len(position) != 1 \
+                    or not isinstance(position[0], int):
+                raise InvalidCursor(cursor)
+            offset = max(position[0], 0)
+
+        rows = list(self.sequence[offset:offset + self.per_page])
+        end = offset + self.per_page
+        next_cursor = encode_cursor(self.ordering, [end]) if end < len(self.sequence) else None
+        previous_cursor = None
+        if offset:
+            previous_cursor = encode_cursor(self.ordering, [max(offset - self.per_page, 0)])
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+    def get_page(self, cursor=None):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+class KeysetPagination(BasePagination):
+    """
+    DRF keyset pagination. The ordering is the view's ``keyset_ordering``
+    when set, otherwise the queryset's ordering (so ``OrderingFilter`` still
+    applies), always completed with the primary key. Ranked sequences that
+    are not querysets (cached search results) are paged by position.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if isinstance(queryset, QuerySet):
+            paginator = KeysetPaginator(
+                queryset, self.get_page_size(request), getattr(view, 'keyset_ordering', None)
+            )
+        else:
+            paginator = PositionPaginator(queryset, self.get_page_size(request))
+        try:
+            self.page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return self.page.object_list
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,133 @@
+"""
+Per-user, per-book reading progress.
+
+Book pages used to count the reader's ``ReadingHistory`` rows through a join
+on every view. ``BookProgress`` keeps the rollup instead (poems read, the
+last poem and when it was read), so a book page, the "continue reading"
+shelf and the API read it with one indexed lookup.
+
+The rollup is maintained where history is written: the reading history
+buffer passes each flushed batch to ``record_reads`` after its upsert, and
+the signals below cover rows saved or deleted one at a time.
+``record_reads`` moves the bookmark and recounts ``read_count`` for the
+touched (user, book) pairs with one grouped ``COUNT``, so two workers
+flushing the same read never both count it as new. A deleted history row
+re-reads its one (user, book) pair. ``rebuild`` (the ``rebuild_book_progress`` command)
+recomputes everything from the history.
+"""
+from django.db import transaction
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BookProgress, Poem, ReadingHistory
+
+
+def read_counts(users, books):
+    """{(user_id, book_id): poems read} from the history, in one grouped query"""
+    rows = ReadingHistory.objects.filter(user_id__in=users, poem__book_id__in=books).values_list(
+        'user_id', 'poem__book_id'
+    ).annotate(count=Count('id')).order_by()
+    return {(user, book): count for user, book, count in rows}
+
+
+def record_reads(reads):
+    """
+    Fold reads, already written to the history, into the rollup. reads are
+    (user_id, poem_id, book_id, read_at) tuples.
+    """
+    pairs = {}
+    for user, poem, book, read_at in reads:
+        last_poem, last_read_at = pairs.get((user, book), (None, None))
+        if last_read_at is None or read_at > last_read_at:
+            last_poem, last_read_at = poem, read_at
+        pairs[(user, book)] = (last_poem, last_read_at)
+    if not pairs:
+        return
+
+    users = {user for user, _ in pairs}
+    books = {book for _, book in pairs}
+    with transaction.atomic():
+        current = {
+            (progress.user_id, progress.book_id): progress
+            for progress in BookProgress.objects.select_for_update().filter(user_id__in=users, book_id__in=books)
+        }
+        # Counted under the lock, after the history writes
+        counts = read_counts(users, books)
+        changed = []
+        created = []
+        for (user, book), (poem, read_at) in pairs.items():
+            progress = current.get((user, book))
+            if progress is None:
+                created.append(BookProgress(
+                    user_id=user, book_id=book, read_count=counts.get((user, book), 0),
+                    last_poem_id=poem, last_read_at=read_at,
+                ))
+                continue
+            progress.read_count = counts.get((user, book), 0)
+            if read_at >= progress.last_read_at:
+                progress.last_poem_id, progress.last_read_at = poem, read_at
+            changed.append(progress)
+        BookProgress.objects.bulk_update(changed, ['read_count', 'last_poem', 'last_read_at'], batch_size=500)
+        BookProgress.objects.bulk_create(created, batch_size=500)
+
+
+def recount(user_id, book_id):
+    """Recompute one (user, book) rollup from the history, if it exists"""
+    with transaction.atomic():
+        progress = BookProgress.objects.select_for_update().filter(user_id=user_id, book_id=book_id).first()
+        if progress is None:
+            return
+        history = ReadingHistory.objects.filter(user_id=user_id, poem__book_id=book_id)
+        latest = history.order_by('-read_at', '-id').values_list('poem_id', 'read_at').first()
+        if latest is None:
+            progress.delete()
+            return
+        progress.read_count = history.count()
+        progress.last_poem_id, progress.last_read_at = latest
+        progress.save(update_fields=['read_count', 'last_poem', 'last_read_at'])
+
+
+def rebuild():
+    """Recompute every rollup from the history; returns the number of rows"""
+    rows = ReadingHistory.objects.values('user_id', 'poem__book_id').annotate(
+        read_count=Count('id'), last_read_at=Max('read_at')
+    ).order_by()
+    latest = {}
+    for user, book, poem, read_at in ReadingHistory.objects.order_by('read_at', 'id').values_list(
+        'user_id', 'poem__book_id', 'poem_id', 'read_at'
+    ).iterator():
+        latest[(user, book)] = poem
+    progress = [
+        BookProgress(
+            user_id=row['user_id'], book_id=row['poem__book_id'], read_count=row['read_count'],
+            last_poem_id=latest[(row['user_id'], row['poem__book_id'])], last_read_at=row['last_read_at'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        BookProgress.objects.all().delete()
+        BookProgress.objects.bulk_create(progress, batch_size=500)
+    return len(progress)
+
+
+def book_of(history):
+    if 'poem' in history._state.fields_cache:
+        return history.poem.book_id
+    return Poem._base_manager.filter(pk=history.poem_id).values_list('book_id', flat=True).first()
+
+
+@receiver(post_save, sender=ReadingHistory)
+def history_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    book_id = book_of(instance)
+    if book_id is not None:
+        record_reads([(instance.user_id, instance.poem_id, book_id, instance.read_at)])
+
+
+@receiver(post_delete, sender=ReadingHistory)
+def history_deleted(sender, instance, **kwargs):
+    book_id = book_of(instance)
+    if book_id is not None:
+        recount(instance.user_id, book_id)
@@ -0,0 +1,173 @@
+"""
+Full-text search over poems, books and poets.
+
+On SQLite the ``poetry_*_fts`` FTS5 tables (migration 0007) mirror the
+searchable columns as external-content indexes kept in sync by triggers, so
+bulk writes are covered too. Matches are ranked with bm25, every term is a
+prefix query and a highlighted snippet is annotated on each row. Elsewhere,
+or on SQLite builds without FTS5, ``search`` falls back to the ``icontains``
+filters the views used before.
+"""
+import re
+import threading
+
+from django.db import DatabaseError, connections
+from django.db.models import FloatField, Q, TextField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from rest_framework.filters import SearchFilter
+
+from .models import Book, Poem, Poet
+
+# Wrap matched terms in snippets; render_snippet escapes and turns them into <mark>
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 16
+TERM_RE = re.compile(r'\w+')
+
+
+class FullText:
+    def __init__(self, table, columns, weights, snippet_column, related=()):
+        self.table = table
+        self.columns = columns
+        self.weights = weights
+        self.snippet_column = snippet_column
+        # (lookup, model) pairs: rows whose related object matches also match
+        self.related = related
+
+
+FULL_TEXT = {
+    Poem: FullText('poetry_poem_fts', ['title', 'content'], (10.0, 1.0), 1,
+                   related=[('book', Book), ('book__poet', Poet)]),
+    Book: FullText('poetry_book_fts', ['title', 'description'], (10.0, 1.0), 1,
+                   related=[('poet', Poet)]),
+    Poet: FullText('poetry_poet_fts', ['name', 'biography'], (10.0, 1.0), 1),
+}
+
+_available = {}
+_lock = threading.Lock()
+
+
+def fts_available(using='default'):
+    """True when the FTS5 tables exist on this database (checked once per process)"""
+    with _lock:
+        if using not in _available:
+            connection = connections[using]
+            available = False
+            if connection.vendor == 'sqlite':
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute(
+                            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = %s",
+                            [FULL_TEXT[Poem].table],
+                        )
+                        available = cursor.fetchone()[0] == 1
+                except DatabaseError:
+                    pass
+            _available[using] = available
+        return _available[using]
+
+
+def build_match(query):
+    """FTS5 MATCH expression requiring every word of query, each as a prefix"""
+    terms = TERM_RE.findall(query or '')
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching_ids(model, match):
+    table = FULL_TEXT[model].table
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+
+
+def search(queryset, query, ranked=True, snippets=True):
+    """
+    Filter queryset to rows matching query.
+
+    With FTS5 and ``ranked``, rows are annotated with ``search_rank`` (bm25,
+    lower is better; rows matched only through a related object rank last) and,
+    with ``snippets``, ``search_snippet``, and ordered by rank then id.
+    """
+    model = queryset.model
+    config = FULL_TEXT[model]
+    if not fts_available(queryset.db):
+        return fallback_search(queryset, query)
+
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+
+    condition = Q(pk__in=matching_ids(model, match))
+    for lookup, related in config.related:
+        condition |= Q(**{f'{lookup}__in': matching_ids(related, match)})
+    queryset = queryset.filter(condition)
+    if not ranked:
+        return queryset
+
+    table = config.table
+    weights = ', '.join(map(str, config.weights))
+    queryset = queryset.annotate(
+        search_rank=Coalesce(
+            RawSQL(f'SELECT bm25({table}, {weights}) FROM {table} WHERE {own_row(model)}', [match],
+                   output_field=FloatField()),
+            0.0,
+        ),
+    ).order_by('search_rank', 'pk')
+    return annotate_snippets(queryset, query) if snippets else queryset
+
+
+def own_row(model):
+    table = FULL_TEXT[model].table
+    return f'{table} MATCH %s AND rowid = {model._meta.db_table}.{model._meta.pk.column}'
+
+
+def annotate_snippets(queryset, query):
+    """Annotate ``search_snippet`` on rows of queryset, e.g. a page of cached results"""
+    model = queryset.model
+    match = build_match(query)
+    if not match or not fts_available(queryset.db):
+        return queryset
+    config = FULL_TEXT[model]
+    return queryset.annotate(
+        search_snippet=RawSQL(
+            f"SELECT snippet({config.table}, {config.snippet_column}, %s, %s, '…', {SNIPPET_TOKENS}) "
+            f'FROM {config.table} WHERE {own_row(model)}',
+            [MARK_START, MARK_END, match],
+            output_field=TextField(),
+        ),
+    )
+
+
+def render_snippet(snippet):
+    """HTML-escaped snippet with matched terms wrapped in <mark>"""
+    if not snippet:
+        return ''
+    html = escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+def fallback_search(queryset, query):
+    """The LIKE scan used when FTS5 is unavailable"""
+    query = (query or '').strip()
+    if not query:
+        return queryset.none()
+    config = FULL_TEXT[queryset.model]
+    condition = Q()
+    for column in config.columns:
+        condition |= Q(**{f'{column}__icontains': query})
+    for lookup, related in config.related:
+        for column in FULL_TEXT[related].columns[:1]:
+            condition |= Q(**{f'{lookup}__{column}__icontains': query})
+    return queryset.filter(condition)
+
+
+class FullTextSearchFilter(SearchFilter):
+    """DRF SearchFilter that routes ?search= through the FTS5 index"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or queryset.model not in FULL_TEXT:
+            return super().filter_queryset(request, queryset, view)
+        # OrderingFilter runs next and decides the order
+        return search(queryset, ' '.join(terms), ranked=False)
@@ -0,0 +1,189 @@
+"""
+Whoosh backend with pooled, long-lived searchers.
+
+Haystack's Whoosh backend refreshes the index and opens a new searcher for
+every query, which re-reads the TOC and opens every segment again. Here each
+process keeps a small pool of searchers for the current index generation.
+
+Before a query the pool checks the generation cheaply: it stats the index
+directory and only lists it (to find the newest ``_MAIN_<n>.toc``) when the
+directory changed, or at least once every ``GENERATION_CHECK_INTERVAL``
+seconds in case the filesystem's mtime resolution hides a change. When the
+generation moved on, idle searchers are refreshed with
+``Searcher.refresh()``, which reuses the readers of unchanged segments.
+
+Each query checks out its own searcher (searchers are not shared between
+threads) and gives it back afterwards. ``stats`` counts hits (an idle
+searcher was reused), misses (one had to be opened), refreshes and
+directory listings.
+
+Only Haystack queries (``SearchQuerySet`` searches and ``more_like_this``)
+go through the pool. The site's search page and the API search SQLite's
+FTS5 tables instead (see poetry/search.py).
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+from haystack.backends.whoosh_backend import WhooshEngine, WhooshSearchBackend
+
+GENERATION_CHECK_INTERVAL = 1.0
+MAX_IDLE_SEARCHERS = 4
+
+
+class SearcherPool:
+    """Per-process pool of Whoosh searchers for the latest index generation"""
+
+    def __init__(self, max_idle=MAX_IDLE_SEARCHERS):
+        self.max_idle = max_idle
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []
+        self.generation = None
+        self._latest = None
+        self._stamp = None
+        self._checked_at = 0.0
+
+    def _latest_generation(self, ix):
+        folder = getattr(ix.storage, 'folder', None)
+        stamp = os.stat(folder).st_mtime_ns if folder else None
+        now = time.monotonic()
+        if stamp is None or stamp != self._stamp or now - self._checked_at > GENERATION_CHECK_INTERVAL:
+            # Stat before listing: a TOC written after the listing changes the stamp again
+            self._stamp = stamp
+            self._checked_at = now
+            self._latest = ix.latest_generation()
+            self.stats['generation_reads'] += 1
+        return self._latest
+
+    def acquire(self, ix):
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Forked worker: never share the parent's open segment files
+                self._reset()
+            generation = self._latest_generation(ix)
+            if generation != self.generation:
+                self.generation = generation
+                self._idle = [searcher.refresh() for searcher in self._idle]
+                if self._idle:
+                    self.stats['refreshes'] += 1
+            if self._idle:
+                self.stats['hits'] += 1
+                return self._idle.pop()
+            self.stats['misses'] += 1
+        return ix.searcher()
+
+    def release(self, searcher):
+        with self._lock:
+            current = (
+                os.getpid() == self._pid
+                and searcher.reader().generation() == self.generation
+                and len(self._idle) < self.max_idle
+            )
+            if current:
+                self._idle.append(searcher)
+                return
+        searcher.close()
+
+    def clear(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self.generation = None
+            self._stamp = None
+        for searcher in idle:
+            searcher.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_searcher_pool(path):
+    """The searcher pool for the Whoosh index at path"""
+    path = os.path.abspath(path)
+    with _pools_lock:
+        if path not in _pools:
+            _pools[path] = SearcherPool()
+        return _pools[path]
+
+
+class PooledSearcher:
+    """Checked-out searcher; close() returns it to the pool"""
+
+    def __init__(self, pool, searcher):
+        self._pool = pool
+        self._searcher = searcher
+
+    def __getattr__(self, name):
+        return getattr(self._searcher, name)
+
+    def close(self):
+        if self._searcher is not None:
+            searcher, self._searcher = self._searcher, None
+            self._pool.release(searcher)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class PooledIndex:
+    """
+    Stand-in for ``backend.index`` while a query runs: refresh() is left to the
+    pool's generation check and searcher() checks one out of the pool.
+    """
+
+    def __init__(self, index, pool):
+        self._index = index
+        self._pool = pool
+        self._checked_out = []
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+    def refresh(self):
+        return self
+
+    def searcher(self, **kwargs):
+        searcher = PooledSearcher(self._pool, self._pool.acquire(self._index))
+        self._checked_out.append(searcher)
+        return searcher
+
+    def doc_count(self):
+        with self.searcher() as searcher:
+            return searcher.doc_count()
+
+    def release_all(self):
+        # Haystack returns early without closing searchers on some paths
+        for searcher in self._checked_out:
+            searcher.close()
+
+
+class PooledWhooshSearchBackend(WhooshSearchBackend):
+    def _pooled(self, method, *args, **kwargs):
+        if not self.setup_complete:
+            self.setup()
+        index = self.index
+        self.index = pooled = PooledIndex(index, get_searcher_pool(self.path))
+        try:
+            return method(*args, **kwargs)
+        finally:
+            pooled.release_all()
+            self.index = index
+
+    def search(self, query_string, **kwargs):
+        return self._pooled(super().search, query_string, **kwargs)
+
+    def more_like_this(self, model_instance, *args, **kwargs):
+        return self._pooled(super().more_like_this, model_instance, *args, **kwargs)
+
+
+class PooledWhooshEngine(WhooshEngine):
+    backend = PooledWhooshSearchBackend
@@ -0,0 +1,124 @@
+"""
+Search result cache.
+
+Popular searches (a famous poet's name, a well-known first line) repeat all
+the time. ``cached_search`` stores the ranked list of matching primary keys
+under a key built from the normalized query and the SQL of the searched
+queryset (so differently filtered callers never share an entry), so every
+page of a repeated search only loads its own rows with ``in_bulk`` (plus
+their snippets). At most ``MAX_RESULTS`` ids are cached, together with the
+full match count; pages past them are ranked live.
+
+Queries are normalized before they are searched, not just for the key:
+NFKC, case folding, Arabic letter variants folded to their Persian forms
+(ي/ى -> ی, ك -> ک...), Arabic diacritics removed and whitespace collapsed.
+The lossy consonant-skeleton folding of ``poetry.analysis`` is not applied,
+because the FTS5 tables do not fold scripts and a cache key must determine
+its result.
+
+Keys embed the Poet, Book and Poem versions of ``poetry.caching``
+(``versioned_key``), which any write of those models bumps; a bump orphans
+every cached result at once and the old entries simply expire. Writes that
+bypass signals must call ``bump_model_version`` themselves.
+"""
+import hashlib
+import json
+import re
+
+from django.core.cache import cache
+
+from .analysis import normalize
+from .caching import versioned_key
+from .conf import get_settings
+from .models import Book, Poem, Poet
+from .search import annotate_snippets, search
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+DEFAULT_SEARCH_RESULT_CACHE = {
+    'TIMEOUT': 600,
+    'MAX_RESULTS': 1000,
+}
+
+
+def get_cache_settings():
+    return get_settings('SEARCH_RESULT_CACHE', DEFAULT_SEARCH_RESULT_CACHE)
+
+
+def normalize_query(query):
+    # FTS5 splits words at ZWNJ, so keep it a word boundary rather than dropping it
+    text = (query or '').replace('\u200c', ' ')
+    return WHITESPACE_RE.sub(' ', normalize(text)).strip()
+
+
+def result_key(queryset, query):
+    # The row filter only: select_related and ordering do not change the matches
+    payload = json.dumps(
+        [queryset.model._meta.label_lower, query, str(queryset.order_by().values('pk').query)],
+        ensure_ascii=False,
+    )
+    digest = hashlib.sha1(payload.encode()).hexdigest()
+    return f"{versioned_key('poetry:search', Poet, Book, Poem)}:{digest}"
+
+
+class RankedResults:
+    """
+    Ranked primary keys of a search, hydrated a slice at a time; works with
+    Django's Paginator and ``KeysetPagination``. ``ids`` holds the cached
+    leading part of the ranking and ``total`` the full match count;
+    ``truncated`` tells whether slices past ``ids`` are ranked live.
+    """
+
+    def __init__(self, queryset, ids, query, total=None):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.ids = ids
+        self.query = query
+        self.total = len(ids) if total is None else total
+        self.truncated = self.total > len(ids)
+
+    def __len__(self):
+        return self.total
+
+    def count(self):
+        return self.total
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0] if index >= 0 else self[:][index]
+        start, stop, step = index.indices(self.total)
+        if stop > len(self.ids):
+            ids = list(matching_ids(self.queryset, self.query)[start:stop])[::step]
+        else:
+            ids = self.ids[start:stop:step]
+        rows = annotate_snippets(self.queryset, self.query).in_bulk(ids)
+        # Rows deleted since the ids were cached are skipped
+        return [rows[pk] for pk in ids if pk in rows]
+
+
+def matching_ids(queryset, query):
+    return search(queryset, query, snippets=False).values_list('pk', flat=True)
+
+
+def cached_search(queryset, query, **filters):
+    """RankedResults for query over queryset narrowed by filters"""
+    query = normalize_query(query)
+    queryset = queryset.filter(**filters)
+    if queryset.query.is_empty():
+        return RankedResults(queryset, [], query)
+
+    options = get_cache_settings()
+    key = result_key(queryset, query)
+    cached = cache.get(key)
+    if cached is None:
+        matches = matching_ids(queryset, query)
+        ids = list(matches[:options['MAX_RESULTS']])
+        total = matches.count() if len(ids) == options['MAX_RESULTS'] else len(ids)
+        cached = (ids, total)
+        cache.set(key, cached, options['TIMEOUT'])
+    ids, total = cached
+    return RankedResults(queryset, ids, query, total)
+
@@ -0,0 +1,339 @@
+"""
+Whoosh index file management: rebuilds, compaction and write-lock recovery.
+
+Whoosh readers open whatever generation the newest ``_MAIN_<n>.toc`` names, and
+a TOC is written to a temporary file and renamed into place. A rebuilt index
+therefore goes live atomically through one commit that copies the shard
+indexes built by the workers in (``add_reader`` copies postings without
+analyzing text again) and drops every old segment (the ``CLEAR`` merge type):
+readers see either the old generation or the new one, never a partial index,
+and readers still open on the old generation keep their already-open segment
+files.
+
+Compaction relies on the same property. A merge copies the live documents of
+the chosen segments into a new segment while searchers keep reading their own
+generation, and only the final TOC rename makes the merged segment visible.
+Replaced segment files are unlinked, which on POSIX leaves them readable for
+searchers that still have them open.
+
+Whoosh's write lock is an ``flock`` on ``MAIN_WRITELOCK``; the file itself
+stays behind after every commit and means nothing on its own. Writers created
+through ``TrackedWriter`` also record who holds the lock in
+``MAIN_WRITELOCK.owner``, so a lock held for too long, or held through a file
+descriptor inherited by a forked child after its owner exited, can be told
+apart from a writer that is simply busy.
+"""
+import json
+import os
+import shutil
+import socket
+import sys
+import time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from whoosh.index import TOC
+from whoosh.reading import SegmentReader
+from whoosh.writing import CLEAR, SegmentWriter
+
+from .conf import get_settings
+
+WATERMARK_FILE = 'build_watermark.json'
+LOCK_NAME = 'WRITELOCK'
+
+DEFAULT_SEARCH_INDEX_MAINTENANCE = {
+    'OFF_PEAK_HOURS': (2, 6),
+    'MAX_SEGMENTS': 8,
+    'MAX_DELETED_RATIO': 0.2,
+    'STALE_LOCK_AFTER': 600,
+    'WRITER_TIMEOUT': 30,
+}
+
+
+def get_maintenance_settings():
+    return get_settings('SEARCH_INDEX_MAINTENANCE', DEFAULT_SEARCH_INDEX_MAINTENANCE)
+
+
+class TrackedWriter(SegmentWriter):
+    """SegmentWriter that records its owner next to the write lock while holding it"""
+
+    def __init__(self, ix, **kwargs):
+        super().__init__(ix, **kwargs)
+        self.owner = write_lock_owner(self.storage, self.indexname) if self.writelock else None
+
+    def commit(self, *args, **kwargs):
+        try:
+            super().commit(*args, **kwargs)
+        finally:
+            self.release_owner()
+
+    def cancel(self):
+        try:
+            super().cancel()
+        finally:
+            self.release_owner()
+
+    def release_owner(self):
+        # Compared first: a writer may have taken the lock since it was released
+        if self.owner:
+            clear_lock_owner(self.storage, self.indexname, self.owner)
+            self.owner = None
+
+
+def replace_documents(ix, schema, shards, timeout=None):
+    """
+    Replace every document in ix with those of the shard indexes, in one
+    commit, and install ``schema`` (the shards' schema, e.g. after an
+    analyzer change).
+    """
+    writer = TrackedWriter(ix, timeout=timeout)
+    writer.schema = schema
+    try:
+        for shard in shards:
+            with shard.reader() as reader:
+                writer.add_reader(reader)
+    except BaseException:
+        writer.cancel()
+        raise
+    writer.commit(mergetype=CLEAR)
+
+
+def read_watermark(path):
+    """Time the index was last brought up to date, or None"""
+    try:
+        with open(os.path.join(path, WATERMARK_FILE), encoding='utf-8') as handle:
+            return parse_datetime(json.load(handle)['updated_since'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_watermark(path, when):
+    target = os.path.join(path, WATERMARK_FILE)
+    tmp = f'{target}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as handle:
+        json.dump({'updated_since': when.isoformat(), 'written_at': timezone.now().isoformat()}, handle)
+    os.replace(tmp, target)
+
+
+def staging_folder(path):
+    """Empty directory inside the live index folder (same filesystem, so moves are renames)"""
+    folder = os.path.join(path, f'.build-{os.getpid()}')
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    return folder
+
+
+# Write lock ownership
+
+def owner_path(storage, indexname):
+    return os.path.join(storage.folder, f'{indexname}_{LOCK_NAME}.owner')
+
+
+def write_lock_owner(storage, indexname):
+    owner = {
+        'pid': os.getpid(),
+        'host': socket.gethostname(),
+        'acquired_at': time.time(),
+        'command': ' '.join(sys.argv),
+    }
+    target = owner_path(storage, indexname)
+    tmp = f'{target}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as handle:
+        json.dump(owner, handle)
+    os.replace(tmp, target)
+    return owner
+
+
+def read_lock_owner(storage, indexname):
+    try:
+        with open(owner_path(storage, indexname), encoding='utf-8') as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def clear_lock_owner(storage, indexname, owner=None):
+    """Remove the owner record, only if it is still owner's when given"""
+    if owner is not None and read_lock_owner(storage, indexname) != owner:
+        # A writer that took over after this lock was broken
+        return
+    try:
+        os.remove(owner_path(storage, indexname))
+    except FileNotFoundError:
+        pass
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def lock_status(ix, stale_after=None):
+    """
+    State of the index write lock: whether it is held, who recorded holding
+    it, for how long, and whether it looks stale. A lock is stale when its
+    recorded owner on this host has exited (the lock lives on in an inherited
+    file descriptor) or it has been held longer than ``stale_after`` seconds.
+    """
+    if stale_after is None:
+        stale_after = get_maintenance_settings()['STALE_LOCK_AFTER']
+    lock = ix.lock(LOCK_NAME)
+    held = not lock.acquire(blocking=False)
+    if not held:
+        lock.release()
+
+    owner = read_lock_owner(ix.storage, ix.indexname)
+    status = {
+        'held': held, 'owner': owner, 'held_for': None,
+        'owner_exited': False, 'stale': False, 'reason': 'free',
+    }
+    if owner is None:
+        if held:
+            status['reason'] = 'held by a writer that does not record its owner'
+        return status
+    if not held:
+        # The owner died without cleaning up; flock already let go
+        status['reason'] = 'leftover owner record, lock is free'
+        return status
+
+    status['held_for'] = max(0.0, time.time() - owner.get('acquired_at', time.time()))
+    local = owner.get('host') == socket.gethostname()
+    if local and not pid_alive(owner.get('pid', 0)):
+        status['owner_exited'] = status['stale'] = True
+        status['reason'] = f"owner pid {owner.get('pid')} has exited"
+    elif status['held_for'] > stale_after:
+        status['stale'] = True
+        status['reason'] = f"held for {status['held_for']:.0f}s (limit {stale_after}s)"
+    else:
+        status['reason'] = f"held by pid {owner.get('pid')}"
+    return status
+
+
+def recover_lock(ix, stale_after=None):
+    """
+    Clear a stale write lock; returns a description of what was done, or None.
+
+    A leftover owner record is simply removed. A held lock is only broken
+    when its recorded owner, on this host, has exited: the lock then lives on
+    in a descriptor inherited by a child that never writes, and unlinking the
+    lock file lets new writers lock a fresh one. A lock whose owner is alive,
+    unknown or on another host is never broken, however long it has been
+    held, since the holder could still write alongside the next writer.
+    """
+    status = lock_status(ix, stale_after=stale_after)
+    if not status['held']:
+        if status['owner'] is None:
+            return None
+        clear_lock_owner(ix.storage, ix.indexname, status['owner'])
+        return status['reason']
+    if not status['owner_exited']:
+        return None
+    ix.storage.delete_file(f'{ix.indexname}_{LOCK_NAME}')
+    clear_lock_owner(ix.storage, ix.indexname, status['owner'])
+    return f"broke stale lock: {status['reason']}"
+
+
+# Segment statistics and compaction
+
+def read_toc(ix):
+    """The latest generation's table of contents (its generation and segments)"""
+    return TOC.read(ix.storage, ix.indexname)
+
+
+def index_status(ix):
+    """Generation, per-segment document counts and the deleted-document ratio"""
+    toc = read_toc(ix)
+    segments = [
+        {
+            'id': segment.segment_id(),
+            'docs': segment.doc_count_all(),
+            'deleted': segment.deleted_count(),
+        }
+        for segment in toc.segments
+    ]
+    total = sum(segment['docs'] for segment in segments)
+    deleted = sum(segment['deleted'] for segment in segments)
+    return {
+        'generation': toc.generation,
+        'segments': segments,
+        'doc_count': total - deleted,
+        'deleted_count': deleted,
+        'deleted_ratio': deleted / total if total else 0.0,
+    }
+
+
+def plan_merge(segments, max_segments, max_deleted_ratio):
+    """
+    Split segments into (merge, keep): segments with too many deleted
+    documents are rewritten, and the smallest segments are merged until at
+    most max_segments remain.
+    """
+    def deleted_ratio(segment):
+        total = segment.doc_count_all()
+        return segment.deleted_count() / total if total else 1.0
+
+    merge = [segment for segment in segments if deleted_ratio(segment) > max_deleted_ratio]
+    keep = sorted((segment for segment in segments if segment not in merge),
+                  key=lambda segment: segment.doc_count())
+    # The merged segments come back as one new segment
+    while keep and len(keep) + (1 if merge else 0) > max_segments:
+        merge.append(keep.pop(0))
+    if len(merge) == 1 and not merge[0].has_deletions():
+        return [], list(segments)
+    return merge, keep
+
+
+def merge_policy(merge, keep):
+    """Whoosh mergetype callable applying a precomputed plan"""
+
+    def policy(writer, segments):
+        for segment in merge:
+            reader = SegmentReader(writer.storage, writer.schema, segment)
+            writer.add_reader(reader)
+            reader.close()
+        return list(keep)
+
+    return policy
+
+
+def compact(ix, optimize=False, max_segments=None, max_deleted_ratio=None, timeout=None):
+    """
+    Merge segments by the merge policy, or all of them with ``optimize``;
+    returns how many segments were merged. Raises ``whoosh.index.LockError``
+    when the write lock stays busy past timeout.
+    """
+    options = get_maintenance_settings()
+    if max_segments is None:
+        max_segments = options['MAX_SEGMENTS']
+    if max_deleted_ratio is None:
+        max_deleted_ratio = options['MAX_DELETED_RATIO']
+    if timeout is None:
+        timeout = options['WRITER_TIMEOUT']
+
+    writer = TrackedWriter(ix, timeout=timeout)
+    segments = writer.segments
+    if optimize:
+        needed = len(segments) > 1 or any(segment.has_deletions() for segment in segments)
+        merge, keep = (list(segments), []) if needed else ([], segments)
+    else:
+        merge, keep = plan_merge(segments, max(1, max_segments), max_deleted_ratio)
+    if not merge:
+        writer.cancel()
+        return 0
+    writer.commit(mergetype=merge_policy(merge, keep))
+    return len(merge)
+
+
+def in_off_peak_window(now=None, hours=None):
+    """True when the local time falls inside the configured off-peak hours"""
+    start, end = hours or get_maintenance_settings()['OFF_PEAK_HOURS']
+    hour = timezone.localtime(now).hour
+    if start <= end:
+        return start <= hour < end
+    # A window across midnight, e.g. (23, 4)
+    return hour >= start or hour < end
@@ -1,11 +1,20 @@
 from haystack import indexes
+from .analysis import FoldingAnalyzer
 from .models import Poet, Book, Poem
 
 
+class FoldedCharField(indexes.CharField):
+    """CharField analyzed with the Tajik/Persian script-folding analyzer"""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('analyzer', FoldingAnalyzer())
+        super().__init__(**kwargs)
+
+
 class PoetIndex(indexes.SearchIndex, indexes.Indexable):
-    text = indexes.CharField(document=True, use_template=True)
-    name = indexes.CharField(model_attr='name')
-    biography = indexes.CharField(model_attr='biography')
+    text = FoldedCharField(document=True, use_template=True)
+    name = FoldedCharField(model_attr='name')
+    biography = FoldedCharField(model_attr='biography')
     birth_date = indexes.DateField(model_attr='birth_date', null=True)
     death_date = indexes.DateField(model_attr='death_date', null=True)
 
@@ -17,10 +26,10 @@ class PoetIndex(indexes.SearchIndex, indexes.Indexable):
 
 
 class BookIndex(indexes.SearchIndex, indexes.Indexable):
-    text = indexes.CharField(document=True, use_template=True)
-    title = indexes.CharField(model_attr='title')
-    description = indexes.CharField(model_attr='description')
-    poet = indexes.CharField(model_attr='poet__name')
+    text = FoldedCharField(document=True, use_template=True)
+    title = FoldedCharField(model_attr='title')
+    description = FoldedCharField(model_attr='description')
+    poet = FoldedCharField(model_attr='poet__name')
     publication_date = indexes.DateField(model_attr='publication_date', null=True)
 
     def get_model(self):
@@ -31,11 +40,11 @@ class BookIndex(indexes.SearchIndex, indexes.Indexable):
 
 
 class PoemIndex(indexes.SearchIndex, indexes.Indexable):
-    text = indexes.CharField(document=True, use_template=True)
-    title = indexes.CharField(model_attr='title')
-    content = indexes.CharField(model_attr='content')
-    book_title = indexes.CharField(model_attr='book__title')
-    poet_name = indexes.CharField(model_attr='book__poet__name')
+    text = FoldedCharField(document=True, use_template=True)
+    title = FoldedCharField(model_attr='title')
+    content = FoldedCharField(model_attr='content')
+    book_title = FoldedCharField(model_attr='book__title')
+    poet_name = FoldedCharField(model_attr='book__poet__name')
     order = indexes.IntegerField(model_attr='order')
 
     def get_model(self):
@@ -0,0 +1,108 @@
+"""
+Queued search index updates.
+
+Saves and deletes only insert an ``IndexQueueEntry`` row inside the request's
+transaction. ``drain()`` (run by the ``process_index_queue`` command) claims a
+batch, coalesces duplicate (model, pk) pairs so the newest action wins, and
+applies the batch through a single Whoosh writer, i.e. one commit and one new
+segment per batch regardless of how many rows were edited.
+
+Entries are deleted only after the Whoosh commit, so a crashed worker replays
+its last batch; index updates are idempotent, so replays are harmless.
+"""
+from django.apps import apps
+from haystack import connections
+from haystack.constants import ID
+from haystack.exceptions import NotHandled, SkipDocument
+
+from .models import IndexQueueEntry
+from .search_index import TrackedWriter, get_maintenance_settings
+
+
+def enqueue(model, object_id, action=IndexQueueEntry.ACTION_UPDATE):
+    IndexQueueEntry.objects.create(model=model._meta.label_lower, object_id=object_id, action=action)
+
+
+def enqueue_many(model, object_ids, action=IndexQueueEntry.ACTION_UPDATE):
+    """Queue index updates for rows written without signals (bulk_create, update)"""
+    label = model._meta.label_lower
+    IndexQueueEntry.objects.bulk_create(
+        [IndexQueueEntry(model=label, object_id=pk, action=action) for pk in object_ids],
+        batch_size=500,
+    )
+
+
+def coalesce(entries):
+    """Collapse entries to the last action per (model, pk)"""
+    actions = {}
+    for entry in entries:
+        actions[(entry.model, entry.object_id)] = entry.action
+    return actions
+
+
+def get_backend(using='default'):
+    """The Whoosh backend for using, set up and refreshed to the latest generation"""
+    backend = connections[using].get_backend()
+    if not backend.setup_complete:
+        backend.setup()
+    backend.index = backend.index.refresh()
+    return backend
+
+
+def prepare_document(backend, index, obj):
+    """Whoosh field values for obj, or None when the index skips it"""
+    try:
+        doc = index.full_prepare(obj)
+    except SkipDocument:
+        return None
+    for key in doc:
+        doc[key] = backend._from_python(doc[key])
+    doc.pop('boost', None)
+    return doc
+
+
+def drain(batch_size=500, using='default'):
+    """Apply one batch of queued updates; returns (entries, documents) handled"""
+    entries = list(IndexQueueEntry.objects.order_by('id')[:batch_size])
+    if not entries:
+        return 0, 0
+
+    actions = coalesce(entries)
+    updates = {}
+    deletes = []
+    for (label, pk), action in actions.items():
+        if action == IndexQueueEntry.ACTION_DELETE:
+            deletes.append((label, pk))
+        else:
+            updates.setdefault(label, []).append(pk)
+
+    unified_index = connections[using].get_unified_index()
+    backend = get_backend(using)
+    # Fails with LockError instead of queueing behind a stuck write lock forever
+    writer = TrackedWriter(backend.index, timeout=get_maintenance_settings()['WRITER_TIMEOUT'])
+
+    documents = 0
+    for label, pks in updates.items():
+        model = apps.get_model(label)
+        try:
+            index = unified_index.get_index(model)
+        except NotHandled:
+            continue
+        found = set()
+        for obj in index.index_queryset(using=using).filter(pk__in=pks):
+            found.add(obj.pk)
+            doc = prepare_document(backend, index, obj)
+            if doc is not None:
+                writer.update_document(**doc)
+                documents += 1
+        # Rows deleted after being queued for update
+        deletes.extend((label, pk) for pk in pks if pk not in found)
+
+    for label, pk in deletes:
+        writer.delete_by_term(ID, f'{label}.{pk}')
+        documents += 1
+
+    writer.commit()
+
+    IndexQueueEntry.objects.filter(id__lte=entries[-1].id).delete()
+    return len(entries), documents
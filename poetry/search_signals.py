@@ -0,0 +1,147 @@
+"""
+Haystack signal processors for the poetry app.
+
+``RealtimeSignalProcessor`` reindexes on every ``post_save``, including saves
+that only touch columns the search index never reads. The processor here works
+out which model fields each ``SearchIndex`` depends on and skips the index
+write when ``update_fields`` names none of them.
+"""
+import re
+import threading
+from collections import Counter
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.template import TemplateDoesNotExist
+from django.template.loader import get_template
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+
+TEMPLATE_ATTR_RE = re.compile(r'\bobject\.(\w+)')
+
+
+def get_signal_processor():
+    """Return the signal processor instance Haystack set up at startup"""
+    return apps.get_app_config('haystack').signal_processor
+
+
+def get_indexed_fields(index):
+    """
+    Return the set of model field names a SearchIndex reads, or None when
+    that cannot be determined (e.g. a custom ``prepare_<field>`` method), in
+    which case every save has to be treated as relevant.
+    """
+    model = index.get_model()
+    attrs = set()
+
+    for name, field in index.fields.items():
+        if hasattr(index, f'prepare_{name}'):
+            return None
+        if field.use_template:
+            template_attrs = _template_attrs(model, name, field)
+            if template_attrs is None:
+                return None
+            attrs.update(template_attrs)
+        elif field.model_attr:
+            attrs.add(field.model_attr.split('__')[0].split('.')[0])
+
+    fields = set()
+    for attr in attrs:
+        try:
+            fields.add(model._meta.get_field(attr).name)
+        except FieldDoesNotExist:
+            # Properties and methods may read anything on the instance
+            return None
+    return fields
+
+
+def _template_attrs(model, name, field):
+    template_names = field.template_name or [
+        f'search/indexes/{model._meta.app_label}/{model._meta.model_name}_{name}.txt'
+    ]
+    if isinstance(template_names, str):
+        template_names = [template_names]
+    for template_name in template_names:
+        try:
+            template = get_template(template_name)
+        except TemplateDoesNotExist:
+            continue
+        source = template.template.source
+        return set(TEMPLATE_ATTR_RE.findall(source))
+    return None
+
+
+class FieldAwareSignalProcessor(BaseSignalProcessor):
+    """Realtime processor that ignores saves of non-indexed fields"""
+
+    def setup(self):
+        self._lock = threading.Lock()
+        self._indexed_fields = {}
+        self.stats = Counter()
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def indexed_fields(self, using, sender):
+        key = (using, sender)
+        if key not in self._indexed_fields:
+            index = self.connections[using].get_unified_index().get_index(sender)
+            self._indexed_fields[key] = get_indexed_fields(index)
+        return self._indexed_fields[key]
+
+    def should_update(self, using, sender, update_fields):
+        if update_fields is None:
+            return True
+        fields = self.indexed_fields(using, sender)
+        return fields is None or not fields.isdisjoint(update_fields)
+
+    def handle_save(self, sender, instance, update_fields=None, **kwargs):
+        for using in self.connection_router.for_write(instance=instance):
+            try:
+                if not self.should_update(using, sender, update_fields):
+                    self.count('skipped')
+                    continue
+                index = self.connections[using].get_unified_index().get_index(sender)
+            except NotHandled:
+                continue
+            self.update_object(index, instance, using)
+            self.count('updated')
+
+    def handle_delete(self, sender, instance, **kwargs):
+        for using in self.connection_router.for_write(instance=instance):
+            try:
+                index = self.connections[using].get_unified_index().get_index(sender)
+            except NotHandled:
+                continue
+            self.remove_object(index, instance, using)
+            self.count('deleted')
+
+    def update_object(self, index, instance, using):
+        index.update_object(instance, using=using)
+
+    def remove_object(self, index, instance, using):
+        index.remove_object(instance, using=using)
+
+
+class QueuedSignalProcessor(FieldAwareSignalProcessor):
+    """
+    Field-aware processor that defers index writes to the durable queue
+    drained by ``manage.py process_index_queue``.
+    """
+
+    def update_object(self, index, instance, using):
+        from .search_queue import enqueue
+        enqueue(index.get_model(), instance.pk)
+
+    def remove_object(self, index, instance, using):
+        from .search_queue import enqueue
+        from .models import IndexQueueEntry
+        enqueue(index.get_model(), instance.pk, IndexQueueEntry.ACTION_DELETE)
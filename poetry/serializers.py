@@ -1,10 +1,30 @@
 from rest_framework import serializers
-from .models import Poet, Book, Poem
+from .models import Poet, Book, Poem, BookProgress
+from .search import render_snippet
+
+
+class CountField(serializers.ReadOnlyField):
+    """
+    Stored or annotated count. When the column was deferred, a prefetched
+    ``relation`` is counted in memory instead of loading it row by row.
+    """
+
+    def __init__(self, relation=None, **kwargs):
+        self.relation = relation
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        name = self.source_attrs[-1]
+        if name not in instance.__dict__:
+            prefetched = getattr(instance, '_prefetched_objects_cache', {})
+            if self.relation in prefetched:
+                return len(prefetched[self.relation])
+        return super().get_attribute(instance)
 
 
 class PoetSerializer(serializers.ModelSerializer):
-    books_count = serializers.SerializerMethodField()
-    poems_count = serializers.SerializerMethodField()
+    books_count = CountField(relation='books')
+    poems_count = CountField()
     
     class Meta:
         model = Poet
@@ -13,17 +33,11 @@ class PoetSerializer(serializers.ModelSerializer):
             'biography', 'photo', 'books_count', 'poems_count',
             'created_at', 'updated_at'
         ]
-    
-    def get_books_count(self, obj):
-        return obj.books.count()
-    
-    def get_poems_count(self, obj):
-        return Poem.objects.filter(book__poet=obj).count()
 
 
 class BookSerializer(serializers.ModelSerializer):
     poet = PoetSerializer(read_only=True)
-    poems_count = serializers.SerializerMethodField()
+    poems_count = CountField(relation='poems')
     
     class Meta:
         model = Book
@@ -32,9 +46,6 @@ class BookSerializer(serializers.ModelSerializer):
             'publication_date', 'cover_image', 'poems_count',
             'created_at', 'updated_at'
         ]
-    
-    def get_poems_count(self, obj):
-        return obj.poems.count()
 
 
 class PoemSerializer(serializers.ModelSerializer):
@@ -58,4 +69,54 @@ class PoemListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'slug', 'poet_name', 'book_title', 
             'order', 'created_at'
-        ]
\ No newline at end of file
+        ]
+
+class PoemSearchSerializer(PoemListSerializer):
+    """Poem list entry with the highlighted search snippet"""
+    snippet = serializers.SerializerMethodField()
+
+    class Meta(PoemListSerializer.Meta):
+        fields = PoemListSerializer.Meta.fields + ['snippet']
+
+    def get_snippet(self, obj):
+        return render_snippet(getattr(obj, 'search_snippet', ''))
+
+
+class SuggestionSerializer(serializers.Serializer):
+    kind = serializers.CharField()
+    label = serializers.CharField()
+    url = serializers.CharField()
+    weight = serializers.IntegerField()
+
+
+class ReadingEventSerializer(serializers.Serializer):
+    poem = serializers.IntegerField(min_value=1)
+    progress = serializers.IntegerField(min_value=0, max_value=100)
+    read_at = serializers.DateTimeField(required=False)
+
+
+class ReadingProgressBatchSerializer(serializers.Serializer):
+    MAX_EVENTS = 100
+
+    events = ReadingEventSerializer(many=True, allow_empty=False)
+
+    def validate_events(self, events):
+        if len(events) > self.MAX_EVENTS:
+            raise serializers.ValidationError(f'At most {self.MAX_EVENTS} events per batch')
+        return events
+
+
+class BookProgressSerializer(serializers.ModelSerializer):
+    book = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    book_title = serializers.CharField(source='book.title', read_only=True)
+    poet_name = serializers.CharField(source='book.poet.name', read_only=True)
+    poems_count = serializers.IntegerField(source='book.poems_count', read_only=True)
+    last_poem = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    last_poem_title = serializers.CharField(source='last_poem.title', read_only=True, default=None)
+
+    class Meta:
+        model = BookProgress
+        fields = [
+            'book', 'book_title', 'poet_name', 'read_count', 'poems_count', 'percent',
+            'last_poem', 'last_poem_title', 'last_read_at',
+        ]
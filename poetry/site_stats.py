@@ -0,0 +1,170 @@
+"""
+Materialized site statistics.
+
+The statistics page used to run three ``Sum('view_count')`` aggregates,
+three counts and six sorts over unindexed columns on every cache miss. The
+results now live in the single ``SiteStatistics`` row, so the page and the
+API are one primary-key read.
+
+The totals are kept current on the write paths, and the lists are
+recomputed lazily:
+
+* Creating or deleting a poet, book or poem adjusts its total with one
+  ``F()`` update, which also marks the snapshot ``dirty``. Saving a listed
+  row marks it dirty too. Nothing locks the row or re-reads a list here, so
+  content writes do not queue up behind the snapshot.
+* A view count flush (subscribed to the buffer) adds the views it wrote to
+  rows that still exist to ``total_views`` and marks the snapshot dirty.
+* ``get_statistics()`` serves a dirty snapshot until it is
+  ``REFRESH_INTERVAL`` seconds old, then one request (behind a ``cache.add``
+  lock) recomputes it while the others keep serving the old one.
+
+``refresh()`` (the ``refresh_site_statistics`` command) recomputes
+everything. Use it after writes that bypass signals, such as
+``import_corpus``, and periodically to repair drift between processes.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .buffers import view_counts
+from .conf import get_settings
+from .counters import adjust
+from .models import Book, Poem, Poet, SiteStatistics
+
+STATS_PK = 1
+
+DEFAULT_SITE_STATISTICS = {
+    'TOP_N': 10,
+    'RECENT_N': 5,
+    'REFRESH_INTERVAL': 60,
+}
+REFRESH_LOCK = 'poetry:site-statistics:refresh'
+
+# list name -> (model, total field, select_related)
+KINDS = {
+    'poets': (Poet, 'total_poets', ()),
+    'books': (Book, 'total_books', ('poet',)),
+    'poems': (Poem, 'total_poems', ('book__poet',)),
+}
+
+
+def get_statistics_settings():
+    return get_settings('SITE_STATISTICS', DEFAULT_SITE_STATISTICS)
+
+
+def kind_of(model):
+    return f'{model._meta.model_name}s'
+
+
+def entry(obj):
+    """JSON-safe summary of a poet, book or poem for the statistics lists"""
+    data = {'id': obj.pk, 'slug': obj.slug, 'view_count': obj.view_count}
+    if isinstance(obj, Poet):
+        data['name'] = obj.name
+    elif isinstance(obj, Book):
+        data.update(title=obj.title, poet=obj.poet.name)
+    else:
+        data.update(title=obj.title, book=obj.book.title, poet=obj.book.poet.name)
+    return data
+
+
+def read_list(kind, ordering, limit):
+    model, _, related = KINDS[kind]
+    return [entry(obj) for obj in model.objects.select_related(*related).order_by(*ordering)[:limit]]
+
+
+def top_list(kind):
+    return read_list(kind, ['-view_count', 'pk'], get_statistics_settings()['TOP_N'])
+
+
+def recent_list(kind):
+    return read_list(kind, ['-created_at', '-pk'], get_statistics_settings()['RECENT_N'])
+
+
+def refresh():
+    """Recompute the whole snapshot"""
+    # Cleared first, so writes made while this runs mark it dirty again
+    snapshot = SiteStatistics.objects.filter(pk=STATS_PK)
+    snapshot.update(dirty=False)
+    totals = {}
+    views = 0
+    for kind, (model, total_field, _) in KINDS.items():
+        totals[total_field] = model.objects.count()
+        views += model.objects.aggregate(total=Sum('view_count'))['total'] or 0
+    stats, _ = SiteStatistics.objects.update_or_create(pk=STATS_PK, defaults={
+        **totals,
+        'total_views': views,
+        'most_viewed': {kind: top_list(kind) for kind in KINDS},
+        'recent_additions': {kind: recent_list(kind) for kind in KINDS},
+        'refreshed_at': timezone.now(),
+    })
+    return stats
+
+
+def get_statistics():
+    """The snapshot row, computed on first use and refreshed when dirty and old enough"""
+    try:
+        stats = SiteStatistics.objects.get(pk=STATS_PK)
+    except SiteStatistics.DoesNotExist:
+        return refresh()
+    interval = get_statistics_settings()['REFRESH_INTERVAL']
+    if not stats.dirty or (
+        stats.refreshed_at and timezone.now() - stats.refreshed_at < timedelta(seconds=interval)
+    ):
+        return stats
+    # One refresh at a time; the others serve the snapshot they read
+    if not cache.add(REFRESH_LOCK, 1, timeout=max(interval, 30)):
+        return stats
+    try:
+        return refresh()
+    finally:
+        cache.delete(REFRESH_LOCK)
+
+
+def mark_dirty(**deltas):
+    """Adjust totals and mark the lists for recomputation in one UPDATE"""
+    adjust(SiteStatistics.objects.filter(pk=STATS_PK), values={'dirty': True}, **deltas)
+
+
+def record_views(batch, applied):
+    """Count the views a flush wrote to existing rows; the most viewed lists follow lazily"""
+    mark_dirty(total_views=applied)
+
+
+view_counts.connect(record_views)
+
+
+def listed(stats, kind, pk):
+    return any(
+        item['id'] == pk
+        for lists in (stats.most_viewed, stats.recent_additions)
+        for item in lists.get(kind, [])
+    )
+
+
+@receiver(post_save, sender=Poet)
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Poem)
+def content_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    kind = kind_of(sender)
+    if created:
+        mark_dirty(**{KINDS[kind][1]: 1})
+        return
+    stats = SiteStatistics.objects.filter(pk=STATS_PK).only('dirty', 'most_viewed', 'recent_additions').first()
+    if stats is not None and not stats.dirty and listed(stats, kind, instance.pk):
+        mark_dirty()
+
+
+@receiver(post_delete, sender=Poet)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Poem)
+def content_deleted(sender, instance, **kwargs):
+    # total_views is corrected by the refresh: the instance's view_count may be stale
+    mark_dirty(**{KINDS[kind_of(sender)][1]: -1})
@@ -0,0 +1,109 @@
+"""
+Unique slug allocation.
+
+The next free slug is resolved from one query that range-scans the slug
+index for ``<base>`` and ``<base>-*`` (``'-' < '.'`` in every collation
+SQLite and Postgres use for slugs), instead of probing ``<base>-1``,
+``<base>-2``, ... one query at a time. Concurrent inserts that race for the
+same slug are caught by the unique constraint and retried.
+"""
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .text import custom_slugify
+
+MAX_ATTEMPTS = 5
+# Keep OR-ed range lookups well under SQLite's expression depth limit
+BULK_QUERY_CHUNK = 100
+
+
+def slug_range(base):
+    """Q matching base itself and every base-<suffix> slug"""
+    return Q(slug=base) | Q(slug__gt=f'{base}-', slug__lt=f'{base}.')
+
+
+def pick_free_slug(base, taken):
+    """base, or base-N with the smallest N >= 1 that is not taken"""
+    if base not in taken:
+        return base
+    pattern = re.compile(rf'^{re.escape(base)}-(\d+)$')
+    used = {int(match.group(1)) for match in map(pattern.match, taken) if match}
+    counter = 1
+    while counter in used:
+        counter += 1
+    return f'{base}-{counter}'
+
+
+def next_free_slug(queryset, base):
+    taken = set(queryset.filter(slug_range(base)).order_by().values_list('slug', flat=True))
+    return pick_free_slug(base, taken)
+
+
+def scope_filter(instance):
+    """Field filter for the set of rows a slug must be unique within"""
+    attnames = [instance._meta.get_field(name).attname for name in instance.slug_scope]
+    return {attname: getattr(instance, attname) for attname in attnames}
+
+
+def assign_unique_slugs(objects):
+    """
+    Give every unsaved object in a batch a unique slug before bulk_create.
+
+    Objects must share a model. Existing slugs are read with one query per
+    BULK_QUERY_CHUNK distinct base slugs; uniqueness within the batch is
+    resolved in memory.
+    """
+    objects = [obj for obj in objects if not obj.slug]
+    if not objects:
+        return []
+
+    model = type(objects[0])
+    scope_names = [model._meta.get_field(name).attname for name in model.slug_scope]
+    bases = {}
+    for obj in objects:
+        scope = tuple(getattr(obj, name) for name in scope_names)
+        bases.setdefault((scope, custom_slugify(getattr(obj, obj.slug_source))), []).append(obj)
+
+    taken = {}
+    keys = list(bases)
+    for start in range(0, len(keys), BULK_QUERY_CHUNK):
+        condition = Q()
+        for scope, base in keys[start:start + BULK_QUERY_CHUNK]:
+            condition |= Q(slug_range(base), **dict(zip(scope_names, scope)))
+        rows = model._default_manager.filter(condition).order_by().values_list(*scope_names, 'slug')
+        for row in rows:
+            taken.setdefault(tuple(row[:-1]), set()).add(row[-1])
+
+    for (scope, base), group in bases.items():
+        scope_taken = taken.setdefault(scope, set())
+        for obj in group:
+            obj.slug = pick_free_slug(base, scope_taken)
+            scope_taken.add(obj.slug)
+    return objects
+
+
+class UniqueSlugMixin:
+    """
+    Fill an empty ``slug`` from ``slug_source`` on save, unique within the
+    rows sharing the ``slug_scope`` fields.
+    """
+    slug_source = 'title'
+    slug_scope = ()
+
+    def save(self, *args, **kwargs):
+        if self.slug:
+            return super().save(*args, **kwargs)
+
+        base = custom_slugify(getattr(self, self.slug_source))
+        queryset = type(self)._default_manager.filter(**scope_filter(self))
+        for attempt in range(MAX_ATTEMPTS):
+            self.slug = next_free_slug(queryset, base)
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                # Lost a race for this slug to a concurrent insert: try the next one
+                if attempt == MAX_ATTEMPTS - 1 or not queryset.filter(slug=self.slug).exists():
+                    raise
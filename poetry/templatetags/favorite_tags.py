@@ -0,0 +1,11 @@
+from django import template
+
+from poetry.favorites import is_favorited
+
+register = template.Library()
+
+
+@register.filter
+def favorited_by(obj, user):
+    """Whether user has favorited a poet, book or poem, from the cached favorites set"""
+    return is_favorited(user, obj)
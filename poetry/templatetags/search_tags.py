@@ -0,0 +1,11 @@
+from django import template
+
+from poetry.search import render_snippet
+
+register = template.Library()
+
+
+@register.filter
+def highlight(snippet):
+    """Render a search snippet with matched terms in <mark>"""
+    return render_snippet(snippet)
@@ -0,0 +1,77 @@
+"""
+Test support: the test runner and fixtures shared by the test modules.
+
+Tests clear the cache, so the suite must not share the development
+server's cache file: the runner points the default cache at a file in a
+temporary directory for the duration of the run and removes it afterwards.
+It also writes view counts and reading events through, so tests see them
+without flushing; ``BufferedWritesMixin`` restores buffering for the tests
+of the buffers themselves.
+"""
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .buffers import reading_events, view_counts
+
+BUFFERS = (view_counts, reading_events)
+
+
+def buffer_settings(**options):
+    return {
+        buffer.settings_name: {**getattr(settings, buffer.settings_name, {}), **options}
+        for buffer in BUFFERS
+    }
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_folder = tempfile.mkdtemp(prefix='guftaho-test-cache-')
+        caches = {alias: dict(options) for alias, options in settings.CACHES.items()}
+        caches['default']['LOCATION'] = os.path.join(self.cache_folder, 'default.sqlite3')
+        self.overrides = override_settings(CACHES=caches, **buffer_settings(WRITE_THROUGH=True))
+        self.overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.overrides.disable()
+        shutil.rmtree(self.cache_folder, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+
+class BufferedWritesMixin:
+    """
+    Buffer view counts and reading events as in production, starting each
+    test empty. Only explicit flushes write: the background flusher uses its
+    own connection, outside the test's transaction.
+    """
+
+    def setUp(self):
+        super().setUp()
+        overrides = override_settings(**buffer_settings(
+            WRITE_THROUGH=False, FLUSH_INTERVAL=3600, FLUSH_THRESHOLD=10 ** 6,
+        ))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for buffer in BUFFERS:
+            buffer.clear()
+            self.addCleanup(buffer.clear)
+
+
+class CatalogMixin:
+    """Creates a poet with one book of numbered poems"""
+
+    def create_catalog(self, poems=0, **poem_fields):
+        from .models import Book, Poem, Poet
+
+        self.poet = Poet.objects.create(name='Test Poet', biography='Test')
+        self.book = Book.objects.create(title='Test Book', poet=self.poet)
+        self.poems = [
+            Poem.objects.create(book=self.book, **{'title': f'Poem {i}', 'content': 'Test', 'order': i, **poem_fields})
+            for i in range(poems)
+        ]
+        return self.poems
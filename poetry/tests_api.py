@@ -0,0 +1,107 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from poetry.models import Poet, Book, Poem, ReadingHistory
+from poetry.pagination import KeysetPaginator
+from poetry.testing import CatalogMixin
+from datetime import timedelta
+from django.utils import timezone
+
+
+class ApiQueryCountTest(CatalogMixin, TestCase):
+    """Every API endpoint runs a fixed number of queries however many rows it returns"""
+    ENDPOINTS = [
+        ('/api/poets/', 2),
+        ('/api/books/', 2),
+        # Keyset pages: no COUNT(*)
+        ('/api/poems/', 1),
+        ('/api/poems/search/?q=Poem', 1),
+        ('/api/poems/{poem}/', 1),
+        ('/api/poets/{poet}/books/', 2),
+        ('/api/poets/{poet}/poems/', 2),
+        ('/api/books/{book}/poems/', 2),
+    ]
+
+    def setUp(self):
+        self.create_catalog()
+        self.poem = Poem.objects.create(title='Poem', book=self.book, content='Test')
+        self.rows = 1
+
+    def grow(self, count):
+        for i in range(self.rows, self.rows + count):
+            poet = Poet.objects.create(name=f'Poet {i}', biography='Test')
+            Book.objects.create(title=f'Book {i}', poet=poet)
+            Book.objects.create(title=f'Extra {i}', poet=self.poet)
+            Poem.objects.create(title=f'Poem {i}', book=self.book, content='Test', order=i)
+        self.rows += count
+
+    def get(self, url):
+        url = url.format(poet=self.poet.slug, book=self.book.slug, poem=self.poem.pk)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_query_count_is_constant(self):
+        for size in (2, 25):
+            self.grow(size - self.rows)
+            for url, queries in self.ENDPOINTS:
+                # Warm per-process state (e.g. the FTS5 availability check)
+                self.get(url)
+                with self.subTest(url=url, rows=size), self.assertNumQueries(queries):
+                    self.get(url)
+
+    def test_counts_come_from_columns(self):
+        self.grow(2)
+        data = self.get('/api/books/{book}/poems/').json()
+        self.assertEqual(data[0]['book']['poems_count'], 3)
+        self.assertEqual(data[0]['book']['poet']['books_count'], 3)
+        self.assertEqual(data[0]['book']['poet']['poems_count'], 3)
+
+
+class KeysetPaginationTest(CatalogMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+        # Repeated order values exercise the id tie-breaker
+        for i in range(7):
+            Poem.objects.create(title=f'Poem {i}', book=self.book, content='Test', order=i // 2)
+        self.expected = list(Poem.objects.order_by('order', 'id').values_list('id', flat=True))
+
+    def test_api_walks_forward_and_back_without_counting(self):
+        seen = []
+        url = '/api/poems/?page_size=3'
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                data = self.client.get(url).json()
+                seen.extend(poem['id'] for poem in data['results'])
+                last, url = url, data['next']
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+        data = self.client.get(self.client.get(last).json()['previous']).json()
+        self.assertEqual([poem['id'] for poem in data['results']], self.expected[3:6])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/poems/?cursor=bogus').status_code, 404)
+
+    def test_descending_datetime_keys(self):
+        user = User.objects.create_user(username='reader', password='test')
+        read_at = timezone.now()
+        for poem in Poem.objects.all():
+            ReadingHistory.objects.create(user=user, poem=poem)
+        # Equal timestamps with microseconds, broken by id
+        ReadingHistory.objects.update(read_at=read_at.replace(microsecond=123456))
+        ReadingHistory.objects.filter(pk__in=list(ReadingHistory.objects.values_list('pk', flat=True)[:2])).update(
+            read_at=read_at - timedelta(days=1)
+        )
+        history = ReadingHistory.objects.filter(user=user)
+        expected = list(history.order_by('-read_at', '-id').values_list('id', flat=True))
+
+        paginator = KeysetPaginator(history, 2, ordering=['-read_at', '-id'])
+        page = paginator.get_page()
+        seen = [entry.pk for entry in page]
+        while page.has_next():
+            page = paginator.get_page(page.next_cursor)
+            seen.extend(entry.pk for entry in page)
+        self.assertEqual(seen, expected)
+        self.assertEqual([entry.pk for entry in paginator.get_page('bogus')], expected[:2])
@@ -0,0 +1,172 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from poetry.models import Poet, ReadingHistory
+from poetry.buffers import reading_events, view_counts
+from poetry.testing import BufferedWritesMixin, CatalogMixin
+from datetime import timedelta
+from django.utils import timezone
+from unittest import mock
+import threading
+
+
+class ViewCountBufferTest(BufferedWritesMixin, CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_catalog()
+
+    def test_increments_are_buffered_until_flush(self):
+        for _ in range(3):
+            self.poet.increment_view_count()
+        self.book.increment_view_count()
+
+        self.poet.refresh_from_db()
+        self.assertEqual(self.poet.view_count, 0)
+        self.assertEqual(view_counts.pending_for(self.poet), 3)
+
+        self.assertEqual(view_counts.flush(), 2)
+        self.poet.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.poet.view_count, 3)
+        self.assertEqual(self.book.view_count, 1)
+        self.assertEqual(len(view_counts), 0)
+
+    def test_flush_threshold_wakes_flusher(self):
+        flushed_by = []
+        woken = threading.Event()
+
+        def flush():
+            flushed_by.append(threading.current_thread())
+            woken.set()
+            return 0
+
+        with self.settings(VIEW_COUNT_BUFFER={'FLUSH_THRESHOLD': 2, 'FLUSH_INTERVAL': 60}), \
+                mock.patch.object(view_counts, 'flush', side_effect=flush):
+            self.poet.increment_view_count()
+            self.poet.increment_view_count()
+            # The request thread only wakes the flusher thread
+            self.assertTrue(woken.wait(5))
+        self.assertIsNot(flushed_by[0], threading.current_thread())
+
+        view_counts.flush()
+        self.poet.refresh_from_db()
+        self.assertEqual(self.poet.view_count, 2)
+
+    def test_receivers_run_after_flush_and_cannot_undo_it(self):
+        self.addCleanup(setattr, view_counts, '_receivers', list(view_counts._receivers))
+        received = []
+        view_counts.connect(mock.Mock(side_effect=RuntimeError))
+        view_counts.connect(lambda batch, applied: received.append(applied))
+        self.poet.increment_view_count()
+        self.poet.increment_view_count()
+        self.book.increment_view_count()
+        gone = Poet.objects.create(name='Gone', biography='Test')
+        gone.increment_view_count()
+        Poet.objects.filter(pk=gone.pk).delete()
+
+        with self.assertLogs('poetry.buffers', 'ERROR'):
+            self.assertEqual(view_counts.flush(), 3)
+        # Only the views written to existing rows are reported
+        self.assertEqual(received, [3])
+        self.poet.refresh_from_db()
+        self.assertEqual(self.poet.view_count, 2)
+        self.assertEqual(len(view_counts), 0)
+
+
+class ReadingHistoryBufferTest(BufferedWritesMixin, CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.create_catalog(poems=3)
+
+    def test_events_are_upserted_in_bulk(self):
+        earlier = timezone.now() - timedelta(minutes=5)
+        reading_events.record(self.user.pk, self.poems[0].pk, 40)
+        reading_events.record(self.user.pk, self.poems[0].pk, 10, read_at=earlier)
+        reading_events.record(self.user.pk, self.poems[1].pk)
+        reading_events.record(self.user.pk, self.poems[2].pk)
+        self.poems[2].delete()
+        self.assertFalse(ReadingHistory.objects.exists())
+
+        self.assertEqual(reading_events.flush(), 3)
+        self.assertEqual(
+            dict(ReadingHistory.objects.values_list('poem_id', 'reading_progress')),
+            {self.poems[0].pk: 40, self.poems[1].pk: 0}
+        )
+
+        reading_events.record(self.user.pk, self.poems[0].pk, 90)
+        with CaptureQueriesContext(connection) as queries:
+            reading_events.flush()
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT')]), 1)
+        self.assertEqual(ReadingHistory.objects.get(poem=self.poems[0]).reading_progress, 90)
+        self.assertEqual(ReadingHistory.objects.count(), 2)
+
+    def test_flushes_never_move_a_row_backwards(self):
+        reading_events.record(self.user.pk, self.poems[0].pk, 80)
+        reading_events.flush()
+        latest = ReadingHistory.objects.get().read_at
+
+        # A page load after scrolling, then another process's late, older report
+        reading_events.record(self.user.pk, self.poems[0].pk, 0)
+        reading_events.flush()
+        reading_events.record(self.user.pk, self.poems[0].pk, 95, read_at=latest - timedelta(minutes=5))
+        reading_events.flush()
+        history = ReadingHistory.objects.get()
+        self.assertEqual(history.reading_progress, 95)
+        self.assertGreater(history.read_at, latest)
+
+    def test_flush_updates_only_the_batch_pairs(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        for user, poem in [(self.user, self.poems[0]), (other, self.poems[1])]:
+            reading_events.record(user.pk, poem.pk, 10)
+        reading_events.flush()
+
+        updated = []
+        original = QuerySet.update
+
+        def update(queryset, **kwargs):
+            rows = original(queryset, **kwargs)
+            if queryset.model is ReadingHistory:
+                updated.append(rows)
+            return rows
+
+        # Crossed pairs: their users x poems cover both existing rows, which the batch must not touch
+        reading_events.record(self.user.pk, self.poems[1].pk, 50)
+        reading_events.record(other.pk, self.poems[0].pk, 50)
+        with mock.patch.object(QuerySet, 'update', update):
+            reading_events.flush()
+        self.assertEqual(updated, [2])
+        self.assertEqual(
+            sorted(ReadingHistory.objects.values_list('user_id', 'poem_id', 'reading_progress')),
+            sorted([
+                (self.user.pk, self.poems[0].pk, 10), (other.pk, self.poems[1].pk, 10),
+                (self.user.pk, self.poems[1].pk, 50), (other.pk, self.poems[0].pk, 50),
+            ]),
+        )
+
+    def test_poem_page_records_the_starting_progress(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('poetry:poem_detail', kwargs={'slug': self.poems[0].slug}))
+        self.assertEqual(response.status_code, 200)
+        reading_events.flush()
+        self.assertEqual(ReadingHistory.objects.get(user=self.user).reading_progress, 0)
+
+    def test_batch_endpoint_buffers_progress(self):
+        url = reverse('poetry:reading-progress-list')
+        events = [{'poem': self.poems[0].pk, 'progress': 30}, {'poem': self.poems[1].pk, 'progress': 75}]
+        self.assertEqual(self.client.post(url, {'events': events}, content_type='application/json').status_code, 403)
+
+        self.client.force_login(self.user)
+        response = self.client.post(url, {'events': events}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'accepted': 2})
+        bad = self.client.post(url, {'events': [{'poem': 1, 'progress': 101}]}, content_type='application/json')
+        self.assertEqual(bad.status_code, 400)
+
+        reading_events.flush()
+        self.assertEqual(
+            sorted(ReadingHistory.objects.values_list('reading_progress', flat=True)), [30, 75]
+        )
@@ -0,0 +1,111 @@
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from poetry.models import Poem
+from poetry import caching
+from poetry.cache_backends import TwoTierCache
+from poetry.testing import CatalogMixin
+from unittest import mock
+import os
+import shutil
+import tempfile
+import time
+
+
+class TwoTierCacheTest(SimpleTestCase):
+    def setUp(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, True)
+        path = os.path.join(folder, 'cache.sqlite3')
+        # Two instances over one file stand in for two worker processes
+        self.a = TwoTierCache(path, {})
+        self.b = TwoTierCache(path, {})
+
+    def test_writes_invalidate_other_processes_l1(self):
+        self.a.set('key', [1])
+        self.assertEqual(self.b.get('key'), [1])
+        self.b.get('key').append(2)
+        self.assertEqual(self.b.get('key'), [1])
+        self.assertEqual((self.b.stats['l2_hits'], self.b.stats['l1_hits']), (1, 2))
+
+        self.a.set('key', [3])
+        self.assertEqual(self.b.get('key'), [3])
+        self.a.clear()
+        self.assertIsNone(self.b.get('key'))
+
+        self.assertTrue(self.a.add('count', 1))
+        self.assertFalse(self.b.add('count', 5))
+        self.assertEqual(self.b.incr('count'), 2)
+        self.assertEqual(self.a.get('count'), 2)
+        with self.assertRaises(ValueError):
+            self.a.incr('missing')
+
+    def test_hot_keys_refresh_early(self):
+        self.assertEqual(self.a.get_or_set('hot', lambda: 'first', timeout=60), 'first')
+        self.b.set('hot', 'first', timeout=60, delta=1.0)
+        with mock.patch('poetry.cache_backends.random.random', return_value=0.99):
+            self.assertEqual(self.b.get_or_set('hot', lambda: 'second', timeout=60), 'first')
+        with mock.patch('poetry.cache_backends.random.random', return_value=1e-30):
+            self.assertEqual(self.b.get_or_set('hot', lambda: 'second', timeout=60), 'second')
+        self.assertEqual(self.a.get('hot'), 'second')
+        self.assertEqual(self.b.stats['early_refreshes'], 1)
+
+        self.a.save_stats()
+        self.assertEqual(self.b.shared_stats(), self.a.stats + self.b.stats)
+        self.assertAlmostEqual(sum(self.a.hit_ratios(self.a.stats).values()), 1.0)
+
+    def test_cull_runs_once_per_interval(self):
+        cache = TwoTierCache(self.a.path, {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2}})
+        with mock.patch.object(cache, 'cull', wraps=cache.cull) as cull:
+            for number in range(10):
+                cache.set(f'key{number}', number)
+            cull.assert_not_called()
+            cache._culled_at -= cache.cull_interval
+            cache.set('last', 10)
+            cull.assert_called_once()
+        self.assertEqual(cache.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0], 4)
+
+    def test_serving_process_keeps_l2_under_max_entries(self):
+        options = {'MAX_ENTRIES': 4, 'STATS_INTERVAL': 30, 'CULL_INTERVAL': 60}
+        cache = TwoTierCache(self.a.path, {'OPTIONS': options})
+        clock = [time.monotonic()]
+        with mock.patch('poetry.cache_backends.time.monotonic', side_effect=lambda: clock[0]):
+            for number in range(30):
+                # Reads save the stats every STATS_INTERVAL in between the writes
+                for _ in range(3):
+                    clock[0] += 31
+                    cache.get('key0')
+                cache.set(f'key{number}', number)
+                count = cache.db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+                self.assertLessEqual(count, options['MAX_ENTRIES'])
+
+
+class HomeBlocksCacheTest(CatalogMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.create_catalog()
+        Poem.objects.create(title='Featured', book=self.book, content='Test', is_featured=True)
+
+    def test_blocks_are_cached_until_content_changes(self):
+        self.client.get(reverse('poetry:home'))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('poetry:home'))
+        self.assertEqual(response.context['total_poems'], 1)
+        self.assertEqual(response.context['paginator'].count, 1)
+
+        Poem.objects.create(title='Another', book=self.book, content='Test', is_featured=True)
+        response = self.client.get(reverse('poetry:home'))
+        self.assertEqual(response.context['total_poems'], 2)
+        self.assertEqual(len(response.context['featured_poems']), 2)
+
+    def test_single_flight_waits_for_the_lock_holder(self):
+        cache.add('block:lock', 1)
+        compute = mock.Mock(return_value='computed')
+        with mock.patch('poetry.caching.time.sleep', side_effect=lambda _: cache.set('block', 'filled')):
+            self.assertEqual(caching.single_flight('block', compute), 'filled')
+        compute.assert_not_called()
+
+        cache.delete('block')
+        with self.settings(BLOCK_CACHE={'WAIT': 0, 'POLL_INTERVAL': 0}):
+            self.assertEqual(caching.single_flight('block', compute), 'computed')
+        compute.assert_called_once_with()
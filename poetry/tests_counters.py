@@ -0,0 +1,162 @@
+from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.core.cache import cache
+from poetry.models import Poet, Book, Poem
+from poetry import site_stats
+from poetry.buffers import view_counts
+from poetry.testing import BufferedWritesMixin, CatalogMixin
+from datetime import timedelta
+from django.utils import timezone
+from io import StringIO
+
+
+class StoredCountersTest(TestCase):
+    def setUp(self):
+        self.poet = Poet.objects.create(name='Test Poet', biography='Test')
+        self.other = Poet.objects.create(name='Other Poet', biography='Test')
+        self.book = Book.objects.create(title='Test Book', poet=self.poet)
+        self.poems = [
+            Poem.objects.create(title=f'Poem {i}', book=self.book, content='Test', order=i)
+            for i in range(3)
+        ]
+
+    def counts(self):
+        return (
+            list(Poet.objects.order_by('pk').values_list('books_count', 'poems_count')),
+            list(Book.objects.order_by('pk').values_list('poems_count', flat=True)),
+        )
+
+    def test_create_and_delete(self):
+        self.assertEqual(self.counts(), ([(1, 3), (0, 0)], [3]))
+        self.poems[0].delete()
+        self.assertEqual(self.counts(), ([(1, 2), (0, 0)], [2]))
+
+    def test_moves(self):
+        second = Book.objects.create(title='Second', poet=self.poet)
+        poem = Poem.objects.get(pk=self.poems[0].pk)
+        poem.book = second
+        poem.save()
+        self.assertEqual(self.counts(), ([(2, 3), (0, 0)], [2, 1]))
+
+        book = Book.objects.get(pk=self.book.pk)
+        book.poet = self.other
+        book.save()
+        self.assertEqual(self.counts(), ([(1, 1), (1, 2)], [2, 1]))
+
+    def test_stale_instance_save_keeps_counts(self):
+        poet = Poet.objects.get(pk=self.poet.pk)
+        Book.objects.create(title='Second', poet=self.poet)
+        poet.name = 'Renamed'
+        poet.save()
+        self.assertEqual(self.counts()[0][0], (2, 3))
+
+    def test_cascade_delete(self):
+        self.book.delete()
+        self.assertEqual(self.counts(), ([(0, 0), (0, 0)], []))
+
+    def test_update_stats_repairs_drift(self):
+        Poet.objects.update(books_count=7, poems_count=7)
+        Book.objects.update(poems_count=7)
+        call_command('update_stats', model='all', workers=1, stdout=StringIO())
+        self.assertEqual(self.counts(), ([(1, 3), (0, 0)], [3]))
+
+    def test_featured_reads_column(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Poet.objects.featured()), [self.poet])
+
+
+class UpdateStatsTest(CatalogMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+        for i in range(3):
+            Poem.objects.create(title=f'Poem {i}', book=self.book, content='one two\nthree', order=i)
+        Poem.objects.update(word_count=0, line_count=0)
+
+    def test_recomputes_poem_stats(self):
+        out = StringIO()
+        call_command('update_stats', model='poems', workers=2, chunk_size=2, stdout=out)
+        self.assertEqual(
+            set(Poem.objects.values_list('word_count', 'line_count')), {(3, 2)}
+        )
+        self.assertIn('Successfully updated 3 of 3 poems', out.getvalue())
+
+    def test_since_skips_older_rows(self):
+        out = StringIO()
+        call_command('update_stats', model='poems', workers=1, since='2999-01-01', stdout=out)
+        self.assertIn('Successfully updated 0 of 0 poems', out.getvalue())
+
+    def test_since_repairs_whole_book_and_poet_counts(self):
+        other = Book.objects.create(title='Other Book', poet=self.poet)
+        Poem.objects.create(title='Other Poem', book=other, content='one', order=0)
+        Poem.objects.filter(book=self.book).update(updated_at=timezone.now() - timedelta(days=30))
+        Poem.objects.filter(pk=Poem.objects.filter(book=self.book).first().pk).update(updated_at=timezone.now())
+        Book.objects.update(poems_count=0)
+        Poet.objects.update(books_count=0, poems_count=0)
+
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        call_command('update_stats', model='all', workers=1, since=since, stdout=StringIO())
+        # Counted over all of a matched row's poems, not only the recently changed ones
+        self.book.refresh_from_db()
+        self.poet.refresh_from_db()
+        self.assertEqual(self.book.poems_count, 3)
+        self.assertEqual((self.poet.books_count, self.poet.poems_count), (2, 4))
+
+
+class SiteStatisticsTest(BufferedWritesMixin, CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_catalog(poems=3)
+
+    def test_write_paths_keep_the_snapshot_current(self):
+        self.addCleanup(cache.delete, site_stats.REFRESH_LOCK)
+        with self.settings(SITE_STATISTICS={'REFRESH_INTERVAL': 0}):
+            site_stats.get_statistics()
+            poem = Poem.objects.create(title='New', book=self.book, content='Test', order=9)
+            stats = site_stats.get_statistics()
+            self.assertEqual((stats.total_poets, stats.total_books, stats.total_poems), (1, 1, 4))
+            self.assertEqual(stats.recent_additions['poems'][0]['title'], 'New')
+
+            for _ in range(3):
+                self.poems[2].increment_view_count()
+            poem.increment_view_count()
+            view_counts.flush()
+            stats = site_stats.get_statistics()
+            self.assertEqual(stats.total_views, 4)
+            self.assertEqual([item['title'] for item in stats.most_viewed['poems'][:2]], ['Poem 2', 'New'])
+
+            poem.delete()
+            stats = site_stats.get_statistics()
+            self.assertEqual((stats.total_poems, stats.total_views), (3, 3))
+            self.assertNotIn('New', [item['title'] for item in stats.recent_additions['poems']])
+            self.assertFalse(stats.dirty)
+            self.assertEqual(stats.as_dict(), site_stats.refresh().as_dict() | {'refreshed_at': stats.refreshed_at})
+
+    def test_writes_adjust_totals_and_defer_the_lists(self):
+        site_stats.refresh()
+        with CaptureQueriesContext(connection) as queries:
+            poem = Poem.objects.create(title='New', book=self.book, content='Test', order=9)
+        statistics = [query['sql'] for query in queries.captured_queries if 'poetry_sitestatistics' in query['sql']]
+        self.assertEqual(len(statistics), 1)
+        self.assertTrue(statistics[0].startswith('UPDATE'))
+        # Within REFRESH_INTERVAL the totals are current and the lists are not
+        stats = site_stats.get_statistics()
+        self.assertTrue(stats.dirty)
+        self.assertEqual(stats.total_poems, 4)
+        self.assertNotEqual(stats.recent_additions['poems'][0]['title'], 'New')
+
+        poem.increment_view_count()
+        poem.increment_view_count()
+        self.poems[0].increment_view_count()
+        Poem.objects.filter(pk=poem.pk).delete()
+        view_counts.flush()
+        # Views buffered for the deleted poem were never written, so they are not counted
+        self.assertEqual(site_stats.get_statistics().total_views, 1)
+
+    def test_api_is_one_read(self):
+        site_stats.refresh()
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/statistics/').json()
+        self.assertEqual(data['total_poems'], 3)
+        self.assertEqual(data['most_viewed_books'][0]['poet'], 'Test Poet')
@@ -0,0 +1,83 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from poetry.models import Poet, Book, Poem, ImportCheckpoint
+from poetry.management.commands import import_corpus
+from unittest import mock
+from io import StringIO
+import json
+import os
+import tempfile
+
+
+class ImportCorpusTest(TestCase):
+    def write_corpus(self, directory, rows):
+        path = os.path.join(directory, 'corpus.jsonl')
+        with open(path, 'w', encoding='utf-8') as handle:
+            for row in rows:
+                handle.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return path
+
+    def test_import_and_resume(self):
+        rows = [
+            {'poet': 'Рӯдакӣ', 'book': 'Девон', 'title': 'ғазал', 'content': 'Бӯи ҷӯи Мӯлиён\nояд ҳаме'}
+            for _ in range(5)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_corpus(directory, rows)
+            checkpoint = 'rudaki'
+            call_command('import_corpus', path, batch_size=2, checkpoint=checkpoint, stdout=StringIO())
+
+            poems = Poem.objects.order_by('order')
+            self.assertEqual(poems.count(), 5)
+            self.assertEqual(Poet.objects.count(), 1)
+            self.assertEqual(Book.objects.count(), 1)
+            self.assertEqual([p.order for p in poems], [0, 1, 2, 3, 4])
+            self.assertEqual(len({p.slug for p in poems}), 5)
+            self.assertEqual((poems[0].word_count, poems[0].line_count), (5, 2))
+
+            # Every row is recorded as committed, so a rerun imports nothing
+            call_command('import_corpus', path, checkpoint=checkpoint, stdout=StringIO())
+            self.assertEqual(Poem.objects.count(), 5)
+
+    def test_checkpoint_commits_with_its_chunk(self):
+        rows = [
+            {'poet': 'Рӯдакӣ', 'book': 'Девон', 'title': f'ғазал {i}', 'content': 'Бӯи ҷӯи Мӯлиён'}
+            for i in range(5)
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_corpus(directory, rows)
+            # The second chunk fails after its insert: the rows and the checkpoint roll back together
+            with mock.patch.object(
+                import_corpus, 'enqueue_many', side_effect=[None, RuntimeError('crash')]
+            ), self.assertRaises(RuntimeError):
+                call_command('import_corpus', path, batch_size=2, checkpoint='rudaki', stdout=StringIO())
+            self.assertEqual(Poem.objects.count(), 2)
+            self.assertEqual(ImportCheckpoint.objects.get(name='rudaki').rows, 2)
+
+            call_command('import_corpus', path, batch_size=2, checkpoint='rudaki', stdout=StringIO())
+            self.assertEqual(
+                list(Poem.objects.order_by('order').values_list('title', flat=True)),
+                [row['title'] for row in rows],
+            )
+
+            other = self.write_corpus(tempfile.mkdtemp(dir=directory), rows)
+            with self.assertRaisesMessage(CommandError, 'Checkpoint rudaki belongs to'):
+                call_command('import_corpus', other, checkpoint='rudaki', stdout=StringIO())
+
+    def test_bad_rows_are_reported_with_line_numbers(self):
+        row = {'poet': 'Рӯдакӣ', 'book': 'Девон', 'content': 'Бӯи ҷӯи Мӯлиён'}
+        with tempfile.TemporaryDirectory() as directory:
+            path = self.write_corpus(directory, [
+                dict(row, title='якум'), dict(row, title='дуюм', order='first'), dict(row, title='сеюм'),
+                dict(row, title='чорум', order=-1), dict(row, title='панҷум', difficulty_level=9),
+            ])
+            stderr = StringIO()
+            call_command('import_corpus', path, stdout=StringIO(), stderr=stderr)
+            for number in (2, 4, 5):
+                self.assertIn(f'Line {number}:', stderr.getvalue())
+            self.assertEqual(sorted(Poem.objects.values_list('title', flat=True)), ['сеюм', 'якум'])
+
+            path = self.write_corpus(directory, [dict(row, title='якум'), ['not', 'an', 'object']])
+            with self.assertRaisesMessage(CommandError, 'Line 2: expected a JSON object'):
+                call_command('import_corpus', path, stdout=StringIO())
@@ -0,0 +1,103 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from poetry.models import Book, Poem
+from poetry import navigation
+from poetry.testing import CatalogMixin
+from unittest import mock
+
+
+class PoemNavigationTest(CatalogMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+        # Two poems share order 1; the book lists them by title
+        self.poems = [
+            Poem.objects.create(title=title, book=self.book, content='Test', order=order)
+            for title, order in [('Alpha', 0), ('Delta', 1), ('Charlie', 1), ('Bravo', 2)]
+        ]
+
+    def chain(self):
+        """Titles in the order of the stored links, checking they run both ways"""
+        links = {
+            pk: (title, previous_id, next_id)
+            for pk, title, previous_id, next_id in Poem.objects.filter(book=self.book).values_list(
+                'pk', 'title', 'previous_poem', 'next_poem'
+            )
+        }
+        titles = []
+        previous, pk = None, Poem.objects.get(book=self.book, previous_poem__isnull=True).pk
+        while pk is not None:
+            title, previous_id, next_id = links[pk]
+            self.assertEqual(previous_id, previous)
+            titles.append(title)
+            previous, pk = pk, next_id
+        return titles
+
+    def titles(self):
+        return list(self.book.poems.values_list('title', flat=True))
+
+    def test_links_follow_listing_order_with_ties(self):
+        self.assertEqual(self.titles(), ['Alpha', 'Charlie', 'Delta', 'Bravo'])
+        self.assertEqual(self.chain(), self.titles())
+        charlie = self.poems[2]
+        self.assertEqual(charlie.get_previous_poem(), self.poems[0])
+        self.assertEqual(charlie.get_next_poem(), self.poems[1])
+
+    def test_reorder_move_and_delete_relink(self):
+        alpha, delta, charlie, bravo = self.poems
+        bravo.order = 0
+        bravo.save()
+        self.assertEqual(self.chain(), ['Alpha', 'Bravo', 'Charlie', 'Delta'])
+
+        # A stale instance saved later must not write its old links back
+        charlie.title = 'Charlie 2'
+        charlie.save()
+        self.assertEqual(self.chain(), ['Alpha', 'Bravo', 'Charlie 2', 'Delta'])
+
+        other = Book.objects.create(title='Other Book', poet=self.poet)
+        bravo.book = other
+        bravo.save()
+        self.assertEqual(self.chain(), ['Alpha', 'Charlie 2', 'Delta'])
+        bravo.refresh_from_db()
+        self.assertEqual((bravo.previous_poem, bravo.next_poem), (None, None))
+
+        delta.delete()
+        self.assertEqual(self.chain(), ['Alpha', 'Charlie 2'])
+
+        Poem.objects.filter(pk=alpha.pk).update(order=5)
+        self.assertEqual(navigation.relink([self.book.pk]), 2)
+        self.assertEqual(self.chain(), ['Charlie 2', 'Alpha'])
+        self.assertEqual(navigation.relink(), 0)
+
+    def test_saves_relink_only_when_the_order_changes(self):
+        poem = Poem.objects.get(pk=self.poems[1].pk)
+        with mock.patch.object(navigation, 'relink', wraps=navigation.relink) as relink:
+            poem.content = 'Edited'
+            poem.is_featured = True
+            poem.save()
+            relink.assert_not_called()
+            poem.title = 'Echo'
+            poem.save()
+            relink.assert_called_once()
+        self.assertEqual(self.chain(), ['Alpha', 'Charlie', 'Echo', 'Bravo'])
+
+    def test_neighbors_of_stale_and_preloaded_instances(self):
+        alpha = self.poems[0]
+        # alpha's in-memory links predate the later poems' relinks
+        self.assertEqual(alpha.get_next_poem(), self.poems[2])
+        preloaded = Poem.objects.select_related('previous_poem', 'next_poem').get(pk=alpha.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual((preloaded.get_previous_poem(), preloaded.get_next_poem()), (None, self.poems[2]))
+
+    def test_detail_view_loads_neighbors_with_poem(self):
+        charlie = self.poems[2]
+        url = reverse('poetry:poem_detail', args=[charlie.slug])
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['previous_poem'], self.poems[0])
+        self.assertEqual(response.context['next_poem'], self.poems[1])
+        poem_reads = [q for q in queries if q['sql'].startswith('SELECT') and 'FROM "poetry_poem"' in q['sql']]
+        self.assertEqual(len(poem_reads), 1)
+        self.assertContains(response, self.poems[1].slug)
@@ -0,0 +1,155 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from poetry.models import Book, Poem, Favorite, ReadingHistory, BookProgress
+from poetry import favorites
+from poetry import progress as book_progress
+from poetry.buffers import reading_events
+from poetry.testing import BufferedWritesMixin, CatalogMixin
+from datetime import timedelta
+from django.utils import timezone
+
+
+class FavoritesServiceTest(CatalogMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.create_catalog(poems=3)
+
+    def test_hydrate_loads_each_type_once(self):
+        for poem in self.poems:
+            Favorite.objects.create(user=self.user, content_type='poem', object_id=poem.pk)
+        Favorite.objects.create(user=self.user, content_type='book', object_id=self.book.pk)
+        Favorite.objects.create(user=self.user, content_type='poet', object_id=self.poet.pk)
+        Favorite.objects.create(user=self.user, content_type='poem', object_id=10 ** 6)
+
+        with self.assertNumQueries(4):
+            objects = favorites.hydrate(Favorite.objects.filter(user=self.user).order_by('-created_at', '-id'))
+            self.assertEqual([poem.book.poet.name for poem in objects['poem']], ['Test Poet'] * 3)
+        self.assertEqual([poem.title for poem in objects['poem']], ['Poem 2', 'Poem 1', 'Poem 0'])
+        self.assertEqual(objects['book'], [self.book])
+
+    def test_cached_set_follows_toggles(self):
+        self.assertFalse(favorites.is_favorited(self.user, self.poems[0]))
+        with self.assertNumQueries(0):
+            self.assertFalse(any(favorites.is_favorited(self.user, poem) for poem in self.poems))
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('poetry:toggle_favorite'), {
+            'content_type': 'poem', 'object_id': self.poems[1].pk,
+        })
+        self.assertTrue(response.json()['is_favorited'])
+        user = User.objects.get(pk=self.user.pk)
+        self.assertTrue(favorites.is_favorited(user, self.poems[1]))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [poem.title for poem in self.poems if favorites.is_favorited(user, poem)], ['Poem 1']
+            )
+
+        self.assertFalse(favorites.toggle(user, 'poem', self.poems[1].pk))
+        self.assertFalse(favorites.is_favorited(user, self.poems[1]))
+        response = self.client.post(reverse('poetry:toggle_favorite'), {'content_type': 'user', 'object_id': 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_set_loaded_before_a_write_is_never_served(self):
+        version = favorites.favorites_version(self.user.pk)
+        Favorite.objects.create(user=self.user, content_type='poem', object_id=self.poems[0].pk)
+        # A concurrent request that read the rows before the write stores its set late
+        cache.set(favorites.cache_key(self.user.pk, version), frozenset(), 3600)
+        self.assertTrue(favorites.is_favorited(User.objects.get(pk=self.user.pk), self.poems[0]))
+
+    def test_list_cards_mark_favorites(self):
+        Favorite.objects.create(user=self.user, content_type='poem', object_id=self.poems[0].pk)
+        Favorite.objects.create(user=self.user, content_type='poem', object_id=self.poems[2].pk)
+        Favorite.objects.create(user=self.user, content_type='book', object_id=self.book.pk)
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('poetry:book_detail', kwargs={'slug': self.book.slug}))
+        self.assertEqual(response.content.decode().count('class="favorite-mark"'), 2)
+        self.assertEqual(sum('poetry_favorite' in query['sql'] for query in queries.captured_queries), 1)
+
+        response = self.client.get(reverse('poetry:poet_detail', kwargs={'slug': self.poet.slug}))
+        self.assertContains(response, 'class="favorite-mark"', count=1)
+        self.client.logout()
+        response = self.client.get(reverse('poetry:book_detail', kwargs={'slug': self.book.slug}))
+        self.assertNotContains(response, 'class="favorite-mark"')
+
+
+class BookProgressTest(BufferedWritesMixin, CatalogMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='reader', password='testpass123')
+        self.create_catalog(poems=4)
+        self.book.refresh_from_db()
+
+    def rollup(self):
+        return BookProgress.objects.get(user=self.user, book=self.book)
+
+    def test_flush_rolls_up_new_reads(self):
+        earlier = timezone.now() - timedelta(minutes=5)
+        reading_events.record(self.user.pk, self.poems[1].pk)
+        reading_events.record(self.user.pk, self.poems[0].pk, read_at=earlier)
+        reading_events.flush()
+        progress = self.rollup()
+        self.assertEqual(progress.read_count, 2)
+        self.assertEqual(progress.last_poem, self.poems[1])
+        self.assertEqual(progress.percent, 50)
+
+        # Re-reading a poem moves the bookmark without counting it twice
+        reading_events.record(self.user.pk, self.poems[0].pk)
+        reading_events.flush()
+        progress = self.rollup()
+        self.assertEqual(progress.read_count, 2)
+        self.assertEqual(progress.last_poem, self.poems[0])
+
+    def test_racing_flushes_count_a_read_once(self):
+        read_at = timezone.now()
+        # Both workers upsert the same (user, poem), then roll it up
+        ReadingHistory.objects.bulk_create([ReadingHistory(user=self.user, poem=self.poems[0], read_at=read_at)])
+        for _ in range(2):
+            book_progress.record_reads([(self.user.pk, self.poems[0].pk, self.book.pk, read_at)])
+        self.assertEqual(self.rollup().read_count, 1)
+
+    def test_direct_writes_and_rebuild(self):
+        ReadingHistory.objects.create(user=self.user, poem=self.poems[0])
+        latest = ReadingHistory.objects.create(user=self.user, poem=self.poems[2])
+        self.assertEqual(self.rollup().read_count, 2)
+
+        latest.delete()
+        progress = self.rollup()
+        self.assertEqual((progress.read_count, progress.last_poem), (1, self.poems[0]))
+
+        expected = list(BookProgress.objects.values_list('user', 'book', 'read_count', 'last_poem'))
+        BookProgress.objects.all().delete()
+        self.assertEqual(book_progress.rebuild(), 1)
+        self.assertEqual(list(BookProgress.objects.values_list('user', 'book', 'read_count', 'last_poem')), expected)
+
+        ReadingHistory.objects.all().delete()
+        self.assertFalse(BookProgress.objects.exists())
+
+    def test_continue_reading_shelf(self):
+        finished = Book.objects.create(title='Short Book', poet=self.poet)
+        Poem.objects.create(title='Only Poem', book=finished, content='Test')
+        reading_events.record(self.user.pk, self.poems[0].pk)
+        reading_events.record(self.user.pk, finished.poems.get().pk)
+        reading_events.flush()
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('poetry:book-progress-list'), {'unfinished': 1})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()
+        results = results.get('results', results)
+        self.assertEqual([row['book'] for row in results], [self.book.slug])
+        self.assertEqual(results[0]['last_poem'], self.poems[0].slug)
+        self.assertEqual(results[0]['percent'], 25)
+
+        response = self.client.get(reverse('poetry:book_detail', args=[self.book.slug]))
+        self.assertEqual(response.context['reading_progress'], 25)
+
+        response = self.client.get(reverse('poetry:continue_reading'))
+        self.assertEqual([progress.book for progress in response.context['shelf']], [self.book])
+        self.assertContains(response, self.poems[0].title)
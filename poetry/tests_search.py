@@ -0,0 +1,429 @@
+from django.test import SimpleTestCase, TestCase
+from django.core.management import call_command
+from django.core.cache import cache
+from poetry.models import Poet, Book, Poem, IndexQueueEntry
+from poetry import autocomplete
+from poetry import caching
+from poetry import search as full_text
+from poetry import search_cache
+from poetry.search_cache import cached_search, normalize_query
+from poetry.analysis import FoldingAnalyzer, fold
+from poetry.search_signals import get_signal_processor
+from poetry import search_index
+from poetry.search_queue import coalesce
+from poetry.testing import CatalogMixin
+from datetime import timedelta
+from django.utils import timezone
+from io import StringIO
+from unittest import mock
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+
+class SignalProcessorTest(TestCase):
+    def setUp(self):
+        self.processor = get_signal_processor()
+        self.poet = Poet.objects.create(name='Test Poet', biography='Test')
+
+    def test_indexed_fields(self):
+        self.assertEqual(
+            self.processor.indexed_fields('default', Poem),
+            {'title', 'content', 'book', 'order'}
+        )
+
+    def test_non_indexed_save_is_skipped(self):
+        before = dict(self.processor.stats)
+        self.poet.is_featured = True
+        self.poet.save(update_fields=['is_featured'])
+        self.assertEqual(self.processor.stats['skipped'], before.get('skipped', 0) + 1)
+        self.assertEqual(self.processor.stats['updated'], before.get('updated', 0))
+
+        self.poet.name = 'Renamed Poet'
+        self.poet.save(update_fields=['name'])
+        self.assertEqual(self.processor.stats['updated'], before.get('updated', 0) + 1)
+
+
+class IndexQueueTest(CatalogMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+
+    def test_saves_and_deletes_are_queued(self):
+        poem = Poem.objects.create(title='Queued', book=self.book, content='Test', order=1)
+        poem.title = 'Queued again'
+        poem.save()
+        self.assertEqual(
+            IndexQueueEntry.objects.filter(model='poetry.poem', object_id=poem.pk).count(), 2
+        )
+
+        pk = poem.pk
+        poem.delete()
+        self.assertEqual(
+            coalesce(IndexQueueEntry.objects.filter(model='poetry.poem')),
+            {('poetry.poem', pk): IndexQueueEntry.ACTION_DELETE}
+        )
+
+
+class BuildSearchIndexTest(CatalogMixin, TestCase):
+    def setUp(self):
+        from haystack import connections
+        self.connections = connections
+        self.path = tempfile.mkdtemp()
+        info = dict(connections.connections_info['default'], PATH=self.path)
+        patcher = mock.patch.dict(connections.connections_info, {'rebuild': info})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.path, True)
+        self.addCleanup(lambda: connections.thread_local.connections.pop('rebuild', None))
+        self.create_catalog(poems=5)
+
+    def build(self, *args):
+        out = StringIO()
+        call_command('build_search_index', '--using', 'rebuild', '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def indexed_ids(self):
+        backend = self.connections['rebuild'].get_backend()
+        with backend.index.refresh().searcher() as searcher:
+            return {fields['id'] for fields in searcher.all_stored_fields()}
+
+    def test_full_build_swaps_in_shards_in_one_commit(self):
+        self.build()
+        backend = self.connections['rebuild'].get_backend()
+        generation = backend.index.refresh().latest_generation()
+        out = self.build('--shard-size', '2')
+        self.assertIn('Indexed 7 documents from 5 shards', out)
+        ix = backend.index.refresh()
+        self.assertEqual(ix.latest_generation(), generation + 1)
+        self.assertEqual(ix.doc_count(), 7)
+        self.assertIn(f'poetry.poem.{self.poems[0].pk}', self.indexed_ids())
+        self.assertFalse([name for name in os.listdir(self.path) if name.startswith('.build')])
+
+    def test_incremental_build_updates_and_removes(self):
+        self.build()
+        Poem.objects.filter(pk=self.poems[0].pk).update(
+            title='Renamed', updated_at=timezone.now() + timedelta(minutes=1)
+        )
+        deleted = self.poems[1].pk
+        self.poems[1].delete()
+
+        out = self.build('--incremental')
+        self.assertIn('removed 1', out)
+        ids = self.indexed_ids()
+        self.assertNotIn(f'poetry.poem.{deleted}', ids)
+        backend = self.connections['rebuild'].get_backend()
+        with backend.index.refresh().searcher() as searcher:
+            stored = searcher.document(id=f'poetry.poem.{self.poems[0].pk}')
+        self.assertEqual(stored['title'], 'Renamed')
+
+    def test_status_reports_the_latest_generation(self):
+        self.build()
+        out = StringIO()
+        call_command('search_index_status', '--using', 'rebuild', stdout=out)
+        generation = self.connections['rebuild'].get_backend().index.refresh().latest_generation()
+        self.assertIn(f'(generation {generation})', out.getvalue())
+        self.assertIn('Documents: 7 live, 0 deleted', out.getvalue())
+        self.assertIn('Compaction not needed', out.getvalue())
+
+    def test_queries_reuse_pooled_searchers(self):
+        from haystack.query import SearchQuerySet
+        from poetry.search_backends import get_searcher_pool
+        self.build()
+        pool = get_searcher_pool(self.path)
+        self.addCleanup(pool.clear)
+        poems = SearchQuerySet(using='rebuild').models(Poem)
+
+        self.assertEqual(len(poems.filter(content='Test')), 5)
+        misses = pool.stats['misses']
+        self.assertEqual(len(poems.filter(content='Test')), 5)
+        self.assertEqual(pool.stats['misses'], misses)
+        self.assertGreater(pool.stats['hits'], 0)
+        # more_like_this checks out of the same pool
+        poems.more_like_this(self.poems[0]).count()
+        self.assertEqual(pool.stats['misses'], misses)
+
+        Poem.objects.filter(pk=self.poems[0].pk).update(
+            title='Renamed', updated_at=timezone.now() + timedelta(minutes=1)
+        )
+        self.build('--incremental')
+        self.assertEqual(len(poems.filter(title='Renamed')), 1)
+        self.assertEqual(pool.stats['refreshes'], 1)
+
+
+class SearchIndexMaintenanceTest(SimpleTestCase):
+    def setUp(self):
+        from whoosh.fields import ID, Schema, TEXT
+        from whoosh.filedb.filestore import FileStorage
+
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, True)
+        schema = Schema(id=ID(stored=True, unique=True), text=TEXT)
+        self.ix = FileStorage(self.path).create_index(schema)
+        for batch in range(5):
+            with self.ix.writer() as writer:
+                writer.merge = False
+                for i in range(2):
+                    writer.add_document(id=f'{batch}-{i}', text='ghazal')
+        with self.ix.writer() as writer:
+            writer.merge = False
+            writer.delete_by_term('id', '0-0')
+
+    def test_compaction_merges_small_and_deleted_segments(self):
+        from whoosh.query import Every
+        status = search_index.index_status(self.ix)
+        self.assertEqual((len(status['segments']), status['doc_count'], status['deleted_count']), (5, 9, 1))
+
+        with self.ix.searcher() as snapshot:
+            self.assertEqual(search_index.compact(self.ix, max_segments=2), 4)
+            # The open searcher keeps reading its own generation
+            self.assertEqual(len(snapshot.search(Every(), limit=None)), 9)
+
+        status = search_index.index_status(self.ix.refresh())
+        self.assertEqual(len(status['segments']), 2)
+        self.assertEqual((status['doc_count'], status['deleted_count']), (9, 0))
+        self.assertEqual(search_index.compact(self.ix, max_segments=2), 0)
+
+    def test_stale_lock_detection_and_recovery(self):
+        from whoosh.index import LockError
+        writer = search_index.TrackedWriter(self.ix)
+        status = search_index.lock_status(self.ix)
+        self.assertTrue(status['held'])
+        self.assertFalse(status['stale'])
+        self.assertIsNone(search_index.recover_lock(self.ix))
+        # Held past the limit, but the owner is alive: reported, never broken
+        self.assertTrue(search_index.lock_status(self.ix, stale_after=0)['stale'])
+        self.assertIsNone(search_index.recover_lock(self.ix, stale_after=0))
+        with self.assertRaises(LockError):
+            search_index.TrackedWriter(self.ix)
+        writer.cancel()
+        self.assertEqual(search_index.lock_status(self.ix)['reason'], 'free')
+
+        # A lock leaked through a descriptor whose recorded owner has exited
+        leaked = self.ix.lock('WRITELOCK')
+        self.assertTrue(leaked.acquire())
+        self.addCleanup(leaked.release)
+        owner = dict(search_index.write_lock_owner(self.ix.storage, self.ix.indexname), pid=2 ** 22 + 1)
+        with open(search_index.owner_path(self.ix.storage, self.ix.indexname), 'w') as handle:
+            json.dump(owner, handle)
+        self.assertTrue(search_index.lock_status(self.ix)['stale'])
+        self.assertIn('has exited', search_index.recover_lock(self.ix))
+
+        replacement = search_index.TrackedWriter(self.ix)
+        search_index.clear_lock_owner(self.ix.storage, self.ix.indexname, owner)
+        self.assertEqual(search_index.read_lock_owner(self.ix.storage, self.ix.indexname), replacement.owner)
+        replacement.cancel()
+
+    def test_off_peak_window(self):
+        night = timezone.make_aware(timezone.datetime(2024, 1, 1, 3))
+        noon = night.replace(hour=12)
+        self.assertTrue(search_index.in_off_peak_window(night, hours=(2, 6)))
+        self.assertFalse(search_index.in_off_peak_window(noon, hours=(2, 6)))
+        self.assertTrue(search_index.in_off_peak_window(night, hours=(23, 4)))
+
+
+class ScriptFoldingAnalyzerTest(TestCase):
+    def test_scripts_and_variants_share_keys(self):
+        for tajik, persian in [
+            ('Китобҳо', 'کتابها'), ('шоирон', 'شاعران'), ('Рудакӣ', 'رودکی'),
+            ('ҳофиз', 'حافظ'), ('ишқ', 'عشق'), ('Хуршед', 'خورشید'), ('ӯ', 'او'),
+        ]:
+            with self.subTest(tajik=tajik):
+                self.assertEqual(fold(tajik), fold(persian))
+        self.assertEqual(fold('рӯз'), fold('руз'))
+        self.assertEqual(fold('كتاب'), fold('کتاب'))  # Arabic kaf
+
+    def test_cyrillic_query_hits_persian_text(self):
+        from whoosh.fields import ID, Schema, TEXT
+        from whoosh.filedb.filestore import RamStorage
+        from whoosh.qparser import QueryParser
+
+        schema = Schema(id=ID(stored=True), text=TEXT(analyzer=FoldingAnalyzer()))
+        index = RamStorage().create_index(schema)
+        with index.writer() as writer:
+            writer.add_document(id='fa', text='دیوان حافظ شیرازی')
+            writer.add_document(id='tg', text='Ғазалҳои Ҳофиз')
+        with index.searcher() as searcher:
+            for query in ('Ҳофиз', 'حافظ'):
+                hits = searcher.search(QueryParser('text', schema).parse(query))
+                self.assertEqual({hit['id'] for hit in hits}, {'fa', 'tg'}, query)
+
+    def test_haystack_schema_uses_folding(self):
+        from haystack import connections
+        fields = connections['default'].get_unified_index().all_searchfields()
+        content_field, schema = connections['default'].get_backend().build_schema(fields)
+        self.assertEqual(fold('Ҳофиз'), [t.text for t in schema[content_field].analyzer('Ҳофиз')][0])
+
+
+class FullTextSearchTest(TestCase):
+    def setUp(self):
+        self.poet = Poet.objects.create(name='Ҳофизи Шерозӣ', biography='Шоири бузург')
+        self.book = Book.objects.create(title='Девони Ҳофиз', poet=self.poet)
+        self.in_title = Poem.objects.create(title='Ғазали зебо', book=self.book, content='Дил')
+        self.in_content = Poem.objects.create(title='Рубоӣ', book=self.book, content='Ин шеъри зебо аст')
+        Poem.objects.create(title='Дигар', book=self.book, content='Ҳеҷ')
+
+    def titles(self, query, queryset=None):
+        return [poem.title for poem in full_text.search(queryset or Poem.objects.all(), query)]
+
+    def test_ranks_prefix_matches_and_highlights(self):
+        self.assertTrue(full_text.fts_available())
+        self.assertEqual(self.titles('зеб'), ['Ғазали зебо', 'Рубоӣ'])
+        poem = full_text.search(Poem.objects.all(), 'шеъри')[0]
+        self.assertIn('<mark>шеъри</mark>', full_text.render_snippet(poem.search_snippet))
+
+    def test_triggers_follow_bulk_writes(self):
+        Poem.objects.bulk_create([Poem(title='Нав', slug='nav', book=self.book, content='Ситора')])
+        self.assertEqual(self.titles('ситора'), ['Нав'])
+        Poem.objects.filter(title='Нав').update(content='Моҳ')
+        self.assertEqual(self.titles('ситора'), [])
+        Poem.objects.filter(title='Нав').delete()
+        self.assertEqual(self.titles('моҳ'), [])
+
+    def test_related_matches_rank_last(self):
+        self.assertEqual(self.titles('шерозӣ'), ['Ғазали зебо', 'Рубоӣ', 'Дигар'])
+        self.assertEqual([p.name for p in full_text.search(Poet.objects.all(), 'бузург')], [self.poet.name])
+
+    def test_fallback_without_fts(self):
+        with mock.patch.dict(full_text._available, {'default': False}):
+            self.assertEqual(set(self.titles('зебо')), {'Ғазали зебо', 'Рубоӣ'})
+
+    def test_api_search_and_filter(self):
+        data = self.client.get('/api/poems/search/?q=зебо').json()
+        self.assertEqual([poem['title'] for poem in data['results']], ['Ғазали зебо', 'Рубоӣ'])
+        self.assertIn('<mark>', data['results'][1]['snippet'])
+        data = self.client.get('/api/books/?search=девон').json()
+        self.assertEqual([book['title'] for book in data['results']], ['Девони Ҳофиз'])
+
+
+class SearchResultCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.poet = Poet.objects.create(name='Ҳофизи Шерозӣ', biography='Шоири бузург')
+        self.book = Book.objects.create(title='Девони Ҳофиз', poet=self.poet)
+        self.in_title = Poem.objects.create(title='Ғазали зебо', book=self.book, content='Дил')
+        Poem.objects.create(title='Рубоӣ', book=self.book, content='Ин шеъри зебо аст')
+
+    def test_normalized_queries_share_cached_ids(self):
+        self.assertEqual(normalize_query('  ЗЕБО‌и   علي '), 'зебо и علی')
+        first = cached_search(Poem.objects.all(), 'зебо')
+        self.assertEqual([poem.title for poem in first], ['Ғазали зебо', 'Рубоӣ'])
+        with self.assertNumQueries(1):
+            again = cached_search(Poem.objects.all(), '  ЗЕБО ')
+            page = again[1:2]
+        self.assertEqual(again.ids, first.ids)
+        self.assertEqual([poem.title for poem in page], ['Рубоӣ'])
+        self.assertIn('<mark>', full_text.render_snippet(page[0].search_snippet))
+
+    def test_filters_and_writes_change_the_key(self):
+        other = Book.objects.create(title='Китоби дигар', poet=self.poet)
+        Poem.objects.create(title='Зебо', book=other, content='Нав')
+        self.assertEqual(len(cached_search(Poem.objects.all(), 'зебо')), 3)
+        self.assertEqual(len(cached_search(Poem.objects.all(), 'зебо', book__slug=other.slug)), 1)
+        # A pre-filtered base queryset is part of the key too
+        self.assertEqual(len(cached_search(Poem.objects.filter(book=other), 'зебо')), 1)
+        self.assertEqual(len(cached_search(Poem.objects.exclude(book=other), 'зебо')), 2)
+
+        key = search_cache.result_key(Poem.objects.all(), 'зебо')
+        self.in_title.delete()
+        self.assertNotEqual(search_cache.result_key(Poem.objects.all(), 'зебо'), key)
+        self.assertEqual(len(cached_search(Poem.objects.all(), 'зебо')), 2)
+
+    def test_results_past_the_cached_ids_are_ranked_live(self):
+        with self.settings(SEARCH_RESULT_CACHE={'MAX_RESULTS': 1}):
+            results = cached_search(Poem.objects.all(), 'зебо')
+        self.assertEqual((len(results.ids), results.count(), results.truncated), (1, 2, True))
+        self.assertEqual([poem.title for poem in results[1:2]], ['Рубоӣ'])
+        self.assertEqual([poem.title for poem in results], ['Ғазали зебо', 'Рубоӣ'])
+
+    def test_api_pages_cached_results_by_position(self):
+        data = self.client.get('/api/poems/search/', {'q': 'зебо', 'page_size': 1}).json()
+        self.assertEqual([poem['title'] for poem in data['results']], ['Ғазали зебо'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([poem['title'] for poem in data['results']], ['Рубоӣ'])
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        autocomplete.index.clear()
+        self.addCleanup(autocomplete.index.clear)
+        self.poet = Poet.objects.create(name='Ҳофизи Шерозӣ', biography='Шоир', view_count=5)
+        self.book = Book.objects.create(title='Девони Ҳофиз', poet=self.poet, view_count=10)
+        self.poem = Poem.objects.create(title='Ғазал', book=self.book, content='Дил')
+
+    def labels(self, query, **kwargs):
+        return [suggestion.label for suggestion in autocomplete.index.complete(query, **kwargs)]
+
+    def test_ranked_script_folded_prefixes(self):
+        self.assertEqual(self.labels('ҳоф'), ['Девони Ҳофиз', 'Ҳофизи Шерозӣ'])
+        self.assertEqual(self.labels('حاف'), self.labels('Хоф'))
+        self.assertEqual(self.labels('ҳоф', limit=1), ['Девони Ҳофиз'])
+        self.assertEqual(self.labels('ҳофиз дев'), ['Девони Ҳофиз'])
+        self.assertEqual(self.labels('ситора'), [])
+
+    def test_signals_and_version_changes_update_the_trie(self):
+        self.labels('ғаз')
+        Poem.objects.create(title='Ғазали нав', book=self.book, content='Нав', view_count=1)
+        self.assertEqual(self.labels('ғаз'), ['Ғазали нав', 'Ғазал'])
+        self.poet.delete()
+        self.assertEqual(self.labels('ҳоф'), [])
+
+        Poet.objects.create(name='Саъдӣ', biography='Шоир')
+        Poet.objects.filter(name='Саъдӣ').update(name='Ҳофизи дигар', updated_at=timezone.now())
+        caching.bump_model_version(Poet)
+        with self.settings(AUTOCOMPLETE={'SYNC_INTERVAL': -1}):
+            self.assertEqual(self.labels('ҳоф'), ['Ҳофизи дигар'])
+
+    def test_rebuild_reads_without_blocking_updates(self):
+        index = autocomplete.index
+        self.labels('ғаз')
+        rows = index.rows
+        written = []
+
+        def rows_with_concurrent_writes(kind, since=None):
+            if kind == 'poem' and since is None:
+                # Another thread's save and delete while the tables are read
+                worker = threading.Thread(target=lambda: (
+                    index.add(autocomplete.Suggestion('poem', 10 ** 6, 'Ғазали тоза', 'toza', 3)),
+                    index.remove(('poem', self.poem.pk)),
+                    written.append(True),
+                ))
+                worker.start()
+                worker.join(5)
+            return rows(kind, since)
+
+        with mock.patch.object(index, 'rows', side_effect=rows_with_concurrent_writes):
+            index.build()
+        self.assertEqual(written, [True])
+        self.assertEqual(self.labels('ғаз'), ['Ғазали тоза'])
+
+    def test_completion_while_the_trie_changes(self):
+        index = autocomplete.index
+        self.assertEqual(self.labels('ғ ғ'), ['Ғазал'])
+        node = index._walk(index.root, 'q')[-1]
+        added = autocomplete.Suggestion('poem', 10 ** 6, 'Ғам', 'gham', 0)
+        writer = threading.Thread(target=index.add, args=(added,))
+
+        class Children(dict):
+            def values(self):
+                # Another thread adds a child to this node halfway through the walk
+                children = iter(dict.values(self))
+                if writer.ident is None:
+                    yield next(children)
+                    writer.start()
+                    writer.join(0.2)
+                yield from children
+
+        node.children = Children(node.children)
+        self.assertEqual(self.labels('ғ ғ'), ['Ғазал'])
+        writer.join(5)
+        self.assertEqual(self.labels('ғ ғ'), ['Ғазал', 'Ғам'])
+
+    def test_api_returns_urls(self):
+        data = self.client.get('/api/autocomplete/', {'q': 'девон'}).json()
+        self.assertEqual(data['results'], [{
+            'kind': 'book', 'label': 'Девони Ҳофиз', 'url': f'/book/{self.book.slug}/', 'weight': 10,
+        }])
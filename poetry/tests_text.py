@@ -0,0 +1,92 @@
+from django.test import SimpleTestCase, TestCase
+from django.utils.text import slugify
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from poetry.models import Poet, Book, Poem
+from poetry.slugs import assign_unique_slugs
+from poetry.text import SLUG_CHAR_MAP, MultiPatternReplacer, custom_slugify, slugify_many
+from poetry.utils import convert_persian_to_tajik, convert_persian_to_tajik_stream
+from poetry.testing import CatalogMixin
+import re
+
+
+class SlugifyTest(SimpleTestCase):
+    samples = [
+        '', 'Рӯдакӣ', 'Ҳофизи Шерозӣ', 'Ғазали зебо', 'ابوعبدالله جعفر رودکی',
+        'Девони Ҳофиз - 2', 'Шеъри «Бӯи ҷӯи Мӯлиён»', '!!!', '🌙', 'Mixed Ҷ text آ',
+    ]
+
+    def reference_slugify(self, value):
+        # The original str.replace loop that custom_slugify must match
+        if not value:
+            return ''
+        value = str(value)
+        for char, latin in SLUG_CHAR_MAP.items():
+            value = value.replace(char, latin)
+        slug = slugify(value)
+        if not slug:
+            slug = re.sub(r'[^\w\s-]', '', value).strip().lower()
+            slug = re.sub(r'[-\s]+', '-', slug)
+            if not slug:
+                slug = 'item'
+        return slug
+
+    def test_matches_reference_implementation(self):
+        for value in self.samples:
+            self.assertEqual(custom_slugify(value), self.reference_slugify(value), value)
+
+    def test_slugify_many(self):
+        self.assertEqual(slugify_many(self.samples), [custom_slugify(v) for v in self.samples])
+
+
+class PersianToTajikTest(SimpleTestCase):
+    def test_longest_match_wins(self):
+        self.assertEqual(convert_persian_to_tajik('کتابها'), 'Китобҳо')
+        self.assertEqual(convert_persian_to_tajik('شاعری بزرگ'), 'шоире бузург')
+
+    def test_stream_matches_whole_text(self):
+        text = 'رودکی پدر شعر فارسی محسوب میشود و کتابها ' * 20
+        chunks = [text[i:i + 7] for i in range(0, len(text), 7)]
+        self.assertEqual(''.join(convert_persian_to_tajik_stream(chunks)), convert_persian_to_tajik(text))
+
+    def test_replacer_extension(self):
+        replacer = MultiPatternReplacer({'ab': 'X'})
+        replacer.add('abc', 'Y')
+        self.assertEqual(replacer.replace('abcab-a'), 'YX-a')
+
+
+class SlugAllocationTest(CatalogMixin, TestCase):
+    def setUp(self):
+        self.create_catalog()
+
+    def test_colliding_slugs_get_suffixes(self):
+        poems = [
+            Poem.objects.create(title='ғазал', book=self.book, content='Test', order=i)
+            for i in range(4)
+        ]
+        self.assertEqual([p.slug for p in poems], ['ghazal', 'ghazal-1', 'ghazal-2', 'ghazal-3'])
+
+        poems[1].delete()
+        poem = Poem.objects.create(title='ғазал', book=self.book, content='Test')
+        self.assertEqual(poem.slug, 'ghazal-1')
+
+    def test_slug_lookup_is_one_query(self):
+        for i in range(5):
+            Poet.objects.create(name='Same Name', biography='Test')
+        with CaptureQueriesContext(connection) as queries:
+            poet = Poet.objects.create(name='Same Name', biography='Test')
+        lookups = [q for q in queries if q['sql'].startswith('SELECT "poetry_poet"."slug"')]
+        self.assertEqual(len(lookups), 1)
+        self.assertEqual(poet.slug, 'same-name-5')
+
+    def test_assign_unique_slugs_in_bulk(self):
+        other_book = Book.objects.create(title='Other Book', poet=self.poet)
+        Poem.objects.create(title='ғазал', book=self.book, content='Test')
+        poems = [
+            Poem(title='ғазал', book=self.book, content='Test'),
+            Poem(title='ғазал', book=self.book, content='Test'),
+            Poem(title='ғазал', book=other_book, content='Test'),
+        ]
+        with self.assertNumQueries(1):
+            assign_unique_slugs(poems)
+        self.assertEqual([p.slug for p in poems], ['ghazal-1', 'ghazal-2', 'ghazal'])
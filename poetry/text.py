@@ -0,0 +1,239 @@
+"""
+Text processing helpers shared by models, commands and search.
+"""
+import re
+
+from django.utils.text import slugify
+
+# Tajik Cyrillic and Persian to Latin transliteration map
+SLUG_CHAR_MAP = {
+    # Tajik Cyrillic to Latin
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'ғ': 'gh', 'д': 'd', 'е': 'e', 'ё': 'yo', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'ӣ': 'i', 'й': 'y', 'к': 'k', 'қ': 'q', 'л': 'l', 'м': 'm', 'н': 'n',
+    'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ӯ': 'u', 'ф': 'f', 'х': 'kh',
+    'ҳ': 'h', 'ч': 'ch', 'ҷ': 'j', 'ш': 'sh', 'ъ': '', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+
+    # Persian/Arabic to Latin (for backward compatibility)
+    'ا': 'a', 'ب': 'b', 'پ': 'p', 'ت': 't', 'ث': 's', 'ج': 'j', 'چ': 'ch', 'ح': 'h', 'خ': 'kh',
+    'د': 'd', 'ذ': 'z', 'ر': 'r', 'ز': 'z', 'ژ': 'zh', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd',
+    'ط': 't', 'ظ': 'z', 'ع': 'a', 'غ': 'gh', 'ف': 'f', 'ق': 'q', 'ک': 'k', 'گ': 'g', 'ل': 'l',
+    'م': 'm', 'ن': 'n', 'و': 'v', 'ه': 'h', 'ی': 'y', 'ء': '', 'آ': 'a', 'أ': 'a', 'إ': 'e',
+    'ة': 'h', 'ى': 'a', 'ئ': 'y', 'ؤ': 'v'
+}
+
+# Every key is a single code point and no replacement contains a key, so one
+# str.translate() pass gives exactly the result of replacing keys one by one.
+SLUG_TRANSLATION = str.maketrans(SLUG_CHAR_MAP)
+
+_NON_WORD_RE = re.compile(r'[^\w\s-]')
+_SEPARATOR_RE = re.compile(r'[-\s]+')
+
+
+def custom_slugify(value):
+    """Custom slugify function that handles Persian/Tajik characters better"""
+    if not value:
+        return ''
+
+    value = str(value).translate(SLUG_TRANSLATION)
+
+    # Use Django's slugify for the rest
+    slug = slugify(value)
+
+    # If still empty after slugify, create a fallback
+    if not slug:
+        # Remove non-alphanumeric characters and create basic slug
+        slug = _NON_WORD_RE.sub('', value).strip().lower()
+        slug = _SEPARATOR_RE.sub('-', slug)
+        if not slug:
+            slug = 'item'  # fallback
+
+    return slug
+
+
+def text_stats(content):
+    """Return (word_count, line_count) for a poem's text"""
+    if not content:
+        return 0, 0
+    return len(content.split()), len([line for line in content.split('\n') if line.strip()])
+
+
+def slugify_many(values):
+    """Slugify an iterable of titles, computing each distinct title once"""
+    seen = {}
+    slugs = []
+    for value in values:
+        if value not in seen:
+            seen[value] = custom_slugify(value)
+        slugs.append(seen[value])
+    return slugs
+
+
+class MultiPatternReplacer:
+    """
+    Aho-Corasick automaton that replaces many patterns in one pass.
+
+    Matches are resolved leftmost-longest: among overlapping candidates the
+    one starting first wins, and of those the longest. Scanning cost depends
+    on the text length, not on the number of patterns, so a large external
+    dictionary can be added without slowing conversion down.
+    """
+
+    def __init__(self, mapping=None):
+        self._goto = [{}]
+        self._terminal = [None]
+        self._fail = [0]
+        self._depth = [0]
+        self._output = [None]
+        self._compiled = True
+        if mapping:
+            self.update(mapping)
+
+    def __len__(self):
+        return sum(1 for value in self._terminal if value is not None)
+
+    def add(self, pattern, replacement):
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._terminal.append(None)
+                self._depth.append(self._depth[node] + 1)
+            node = next_node
+        self._terminal[node] = replacement
+        self._compiled = False
+
+    def update(self, mapping):
+        for pattern, replacement in mapping.items():
+            self.add(pattern, replacement)
+
+    def load(self, path, delimiter='\t'):
+        """Add ``pattern<delimiter>replacement`` lines from a UTF-8 file"""
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                line = line.rstrip('\n')
+                if not line or line.startswith('#') or delimiter not in line:
+                    continue
+                pattern, replacement = line.split(delimiter, 1)
+                self.add(pattern, replacement)
+
+    def compile(self):
+        """Build failure links; called lazily after patterns change"""
+        goto, terminal, depth = self._goto, self._terminal, self._depth
+        fail = [0] * len(goto)
+        # Longest pattern that is a suffix of each node's string
+        output = [None] * len(goto)
+        queue = []
+        for child in goto[0].values():
+            output[child] = (depth[child], terminal[child]) if terminal[child] is not None else None
+            queue.append(child)
+        for node in queue:
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                if terminal[child] is not None:
+                    output[child] = (depth[child], terminal[child])
+                else:
+                    output[child] = output[fail[child]]
+                queue.append(child)
+        self._fail = fail
+        self._output = output
+        self._compiled = True
+
+    def stream(self):
+        if not self._compiled:
+            self.compile()
+        return _ReplacementStream(self)
+
+    def replace(self, text):
+        stream = self.stream()
+        return stream.feed(text) + stream.finish()
+
+    def replace_iter(self, chunks):
+        """Convert an iterable of text chunks, yielding output incrementally"""
+        stream = self.stream()
+        for chunk in chunks:
+            converted = stream.feed(chunk)
+            if converted:
+                yield converted
+        converted = stream.finish()
+        if converted:
+            yield converted
+
+
+class _ReplacementStream:
+    """Scanner state carried across chunks for MultiPatternReplacer"""
+
+    def __init__(self, replacer):
+        self.goto = replacer._goto
+        self.fail = replacer._fail
+        self.depth = replacer._depth
+        self.output = replacer._output
+        self.buffer = ''
+        self.position = 0
+        self.state = 0
+        # Best match seen so far that may still be beaten: (start, end, replacement)
+        self.candidate = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        return self._scan(final=False)
+
+    def finish(self):
+        return self._scan(final=True)
+
+    def _scan(self, final):
+        goto, fail, depth, output = self.goto, self.fail, self.depth, self.output
+        text = self.buffer
+        length = len(text)
+        emitted = []
+        start = 0
+        i, state, candidate = self.position, self.state, self.candidate
+
+        while True:
+            while i < length:
+                char = text[i]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                i += 1
+
+                match = output[state]
+                if match is not None:
+                    match_start = i - match[0]
+                    if candidate is None or match_start < candidate[0] or (
+                        match_start == candidate[0] and i > candidate[1]
+                    ):
+                        candidate = (match_start, i, match[1])
+
+                # Any later match starts at or after i - depth[state]
+                if candidate is not None and candidate[0] < i - depth[state]:
+                    emitted.append(text[start:candidate[0]])
+                    emitted.append(candidate[2])
+                    start = i = candidate[1]
+                    state, candidate = 0, None
+
+            if not final or candidate is None:
+                break
+            emitted.append(text[start:candidate[0]])
+            emitted.append(candidate[2])
+            start = i = candidate[1]
+            state, candidate = 0, None
+
+        # Text before the earliest possible match start is final
+        safe = length if final else i - depth[state]
+        emitted.append(text[start:safe])
+
+        self.buffer = text[safe:]
+        self.position = i - safe
+        self.state = state
+        if candidate is not None:
+            candidate = (candidate[0] - safe, candidate[1] - safe, candidate[2])
+        self.candidate = candidate
+        return ''.join(emitted)
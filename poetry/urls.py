@@ -8,6 +8,10 @@ router = DefaultRouter()
 router.register(r'poets', api_views.PoetViewSet)
 router.register(r'books', api_views.BookViewSet)
 router.register(r'poems', api_views.PoemViewSet)
+router.register(r'autocomplete', api_views.AutocompleteViewSet, basename='autocomplete')
+router.register(r'statistics', api_views.StatisticsViewSet, basename='statistics')
+router.register(r'reading-progress', api_views.ReadingProgressViewSet, basename='reading-progress')
+router.register(r'book-progress', api_views.BookProgressViewSet, basename='book-progress')
 
 app_name = 'poetry'
 
@@ -26,6 +30,7 @@ urlpatterns = [
     # User features (require authentication)
     path('favorites/', views.favorites_view, name='favorites'),
     path('reading-history/', views.reading_history_view, name='reading_history'),
+    path('continue-reading/', views.continue_reading_view, name='continue_reading'),
     path('toggle-favorite/', views.toggle_favorite, name='toggle_favorite'),
     
     # Statistics and analytics
@@ -1,6 +1,11 @@
 """
 Utility functions for Persian to Tajik Cyrillic text conversion
 """
+import threading
+
+from django.conf import settings
+
+from .text import MultiPatternReplacer
 
 # Persian to Tajik Cyrillic mapping dictionary
 PERSIAN_TO_TAJIK_MAPPING = {
@@ -81,10 +86,35 @@ PERSIAN_TO_TAJIK_MAPPING = {
     'بعدی': 'баъдӣ',
 }
 
+_converter = None
+_converter_lock = threading.Lock()
+
+
+def get_persian_to_tajik_converter():
+    """
+    Return the shared converter built from PERSIAN_TO_TAJIK_MAPPING plus the
+    optional tab-separated dictionary file in settings.PERSIAN_TO_TAJIK_DICTIONARY
+    """
+    global _converter
+    if _converter is None:
+        with _converter_lock:
+            if _converter is None:
+                converter = MultiPatternReplacer(PERSIAN_TO_TAJIK_MAPPING)
+                dictionary = getattr(settings, 'PERSIAN_TO_TAJIK_DICTIONARY', None)
+                if dictionary:
+                    converter.load(dictionary)
+                converter.compile()
+                _converter = converter
+    return _converter
+
+
 def convert_persian_to_tajik(text):
     """
     Convert Persian text to Tajik Cyrillic
     
+    Overlapping words are resolved longest-match-first in a single pass,
+    so e.g. 'کتابها' is never split into 'کتاب' + 'ها'.
+    
     Args:
         text (str): Persian text to convert
         
@@ -93,13 +123,18 @@ def convert_persian_to_tajik(text):
     """
     if not text:
         return text
-        
-    # Convert the text using the mapping dictionary
-    converted_text = text
-    for persian, tajik in PERSIAN_TO_TAJIK_MAPPING.items():
-        converted_text = converted_text.replace(persian, tajik)
+    return get_persian_to_tajik_converter().replace(text)
+
+
+def convert_persian_to_tajik_stream(chunks):
+    """
+    Convert an iterable of Persian text chunks (e.g. a whole book read
+    from a file) without holding the full text in memory
     
-    return converted_text
+    Yields:
+        str: Converted Tajik Cyrillic text as soon as it is final
+    """
+    return get_persian_to_tajik_converter().replace_iter(chunks)
 
 def get_tajik_translations():
     """
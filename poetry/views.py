@@ -1,19 +1,36 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
-from django.db.models import Q, Count, Prefetch, Sum
+from django.db.models import F, Prefetch, QuerySet
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_http_methods
-from django.views.decorators.cache import cache_page
 from django.utils.decorators import method_decorator
 from django.views.generic import ListView, DetailView
 from django.conf import settings
-from .models import Poet, Book, Poem, Favorite, ReadingHistory
+from .models import Poet, Book, Poem, Favorite, ReadingHistory, BookProgress
+from . import favorites
+from .buffers import reading_events
+from .caching import single_flight, versioned_key
 from .filters import PoetFilter, BookFilter, PoemFilter, AdvancedSearchFilter
+from .pagination import KeysetPaginator
+from .search_cache import cached_search
+from .site_stats import get_statistics
 import json
 
 
+def home_blocks():
+    """Featured and recent blocks and site totals shown on the home page"""
+    return {
+        'featured_poets': list(Poet.objects.featured()),
+        'recent_books': list(Book.objects.recent(6).select_related('poet')),
+        'featured_poems': list(Poem.objects.featured().select_related('book__poet')[:8]),
+        'total_poets': Poet.objects.count(),
+        'total_books': Book.objects.count(),
+        'total_poems': Poem.objects.count(),
+    }
+
+
 class HomeView(ListView):
     """Enhanced home page with featured content"""
     model = Poet
@@ -21,29 +38,32 @@ class HomeView(ListView):
     context_object_name = 'poets'
     paginate_by = 12
 
+    def get_blocks(self):
+        if not hasattr(self, '_blocks'):
+            key = versioned_key('poetry:home', Poet, Book, Poem)
+            self._blocks = single_flight(key, home_blocks)
+        return self._blocks
+
     def get_queryset(self):
         queryset = Poet.objects.with_stats()
         
         search_query = self.request.GET.get('search', '')
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(biography__icontains=search_query)
-            )
+            return cached_search(queryset, search_query)
         
         return queryset.order_by('-is_featured', 'name')
 
+    def get_paginator(self, queryset, per_page, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, **kwargs)
+        if isinstance(queryset, QuerySet):
+            # The unfiltered listing is every poet: reuse the cached total
+            paginator.count = self.get_blocks()['total_poets']
+        return paginator
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context.update({
-            'search_query': self.request.GET.get('search', ''),
-            'featured_poets': Poet.objects.featured()[:6],
-            'recent_books': Book.objects.recent(6),
-            'featured_poems': Poem.objects.featured()[:8],
-            'total_poets': Poet.objects.count(),
-            'total_books': Book.objects.count(),
-            'total_poems': Poem.objects.count(),
-        })
+        context['search_query'] = self.request.GET.get('search', '')
+        context.update(self.get_blocks())
         return context
 
 
@@ -73,8 +93,7 @@ class PoetDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         poet = self.object
         
-        # Get books with poem counts
-        books = poet.books.annotate(poems_count=Count('poems')).order_by('-publication_date')
+        books = poet.books.order_by('-publication_date')
         
         # Pagination for books
         paginator = Paginator(books, 10)
@@ -83,17 +102,13 @@ class PoetDetailView(DetailView):
         
         context.update({
             'books': page_obj,
-            'total_books': books.count(),
-            'total_poems': Poem.objects.filter(book__poet=poet).count(),
+            'total_books': poet.books_count,
+            'total_poems': poet.poems_count,
             'recent_poems': Poem.objects.filter(book__poet=poet)[:5],
         })
         
         if self.request.user.is_authenticated:
-            context['is_favorited'] = Favorite.objects.filter(
-                user=self.request.user,
-                content_type='poet',
-                object_id=poet.id
-            ).exists()
+            context['is_favorited'] = favorites.is_favorited(self.request.user, poet)
         
         return context
 
@@ -132,22 +147,16 @@ class BookDetailView(DetailView):
         context.update({
             'poems': page_obj,
             'page_obj': page_obj,
-            'total_poems': poems.count(),
+            'total_poems': book.poems_count,
         })
         
         if self.request.user.is_authenticated:
-            context['is_favorited'] = Favorite.objects.filter(
-                user=self.request.user,
-                content_type='book',
-                object_id=book.id
-            ).exists()
+            context['is_favorited'] = favorites.is_favorited(self.request.user, book)
             
-            # Get reading progress
-            read_poems = ReadingHistory.objects.filter(
-                user=self.request.user,
-                poem__book=book
-            ).count()
-            context['reading_progress'] = (read_poems / poems.count() * 100) if poems.count() > 0 else 0
+            # Get reading progress from the per-book rollup (one unique-index lookup)
+            progress = BookProgress.objects.filter(user=self.request.user, book=book).select_related('last_poem').first()
+            context['book_progress'] = progress
+            context['reading_progress'] = progress.percent if progress else 0
         
         return context
 
@@ -161,6 +170,12 @@ class PoemDetailView(DetailView):
     template_name = 'poetry/poem_detail.html'
     context_object_name = 'poem'
 
+    def get_queryset(self):
+        # The stored neighbor links load with the poem, without their texts
+        return Poem.objects.select_related('book__poet', 'previous_poem', 'next_poem').defer(
+            'previous_poem__content', 'next_poem__content'
+        )
+
     def get_object(self):
         book_slug = self.kwargs.get('book_slug')
         poem_slug = self.kwargs.get('poem_slug') or self.kwargs.get('slug')
@@ -168,21 +183,17 @@ class PoemDetailView(DetailView):
         if book_slug:
             # Full URL pattern with book
             book = get_object_or_404(Book, slug=book_slug)
-            poem = get_object_or_404(Poem, book=book, slug=poem_slug)
+            poem = get_object_or_404(self.get_queryset(), book=book, slug=poem_slug)
         else:
             # Simple URL pattern with just poem slug
-            poem = get_object_or_404(Poem, slug=poem_slug)
+            poem = get_object_or_404(self.get_queryset(), slug=poem_slug)
         
         # Increment view count
         poem.increment_view_count()
         
-        # Track reading history for authenticated users
+        # Track reading history for authenticated users; poem.js reports how far they read
         if self.request.user.is_authenticated:
-            ReadingHistory.objects.update_or_create(
-                user=self.request.user,
-                poem=poem,
-                defaults={'reading_progress': 100}
-            )
+            reading_events.record(self.request.user.pk, poem.pk, progress=0)
         
         return poem
 
@@ -190,22 +201,14 @@ class PoemDetailView(DetailView):
         context = super().get_context_data(**kwargs)
         poem = self.object
         
-        # Get previous and next poems for navigation
-        previous_poem = poem.get_previous_poem()
-        next_poem = poem.get_next_poem()
-        
         context.update({
             'book': poem.book,
-            'previous_poem': previous_poem,
-            'next_poem': next_poem,
+            'previous_poem': poem.get_previous_poem(),
+            'next_poem': poem.get_next_poem(),
         })
         
         if self.request.user.is_authenticated:
-            context['is_favorited'] = Favorite.objects.filter(
-                user=self.request.user,
-                content_type='poem',
-                object_id=poem.id
-            ).exists()
+            context['is_favorited'] = favorites.is_favorited(self.request.user, poem)
         
         return context
 
@@ -225,21 +228,19 @@ class AdvancedSearchView(ListView):
         self.book_filter = self.request.GET.get('book', '')
         
         queryset = Poem.objects.select_related('book__poet').all()
-        
-        # Apply search filters
-        if self.query:
-            queryset = queryset.filter(
-                Q(title__icontains=self.query) |
-                Q(content__icontains=self.query)
-            )
+        filters = {}
         
         if self.poet_filter:
-            queryset = queryset.filter(book__poet__slug=self.poet_filter)
+            filters['book__poet__slug'] = self.poet_filter
         
         if self.book_filter:
-            queryset = queryset.filter(book__slug=self.book_filter)
+            filters['book__slug'] = self.book_filter
         
-        return queryset.order_by('-created_at')
+        # Ranked full-text matches, best first
+        if self.query:
+            return cached_search(queryset, self.query, **filters)
+        
+        return queryset.filter(**filters).order_by('-created_at')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -268,18 +269,11 @@ def toggle_favorite(request):
     if not content_type or not object_id:
         return JsonResponse({'error': 'Missing parameters'}, status=400)
     
+    if content_type not in favorites.KINDS:
+        return JsonResponse({'error': 'Invalid content type'}, status=400)
+
     try:
-        favorite, created = Favorite.objects.get_or_create(
-            user=request.user,
-            content_type=content_type,
-            object_id=int(object_id)
-        )
-        
-        if not created:
-            favorite.delete()
-            is_favorited = False
-        else:
-            is_favorited = True
+        is_favorited = favorites.toggle(request.user, content_type, object_id)
         
         return JsonResponse({
             'is_favorited': is_favorited,
@@ -295,80 +289,46 @@ def toggle_favorite(request):
 @login_required
 def favorites_view(request):
     """User's favorites page"""
-    favorite_poets = []
-    favorite_books = []
-    favorite_poems = []
-    
-    favorites = Favorite.objects.filter(user=request.user).order_by('-created_at')
-    
-    for fav in favorites:
-        if fav.content_type == 'poet':
-            try:
-                poet = Poet.objects.get(id=fav.object_id)
-                favorite_poets.append(poet)
-            except Poet.DoesNotExist:
-                pass
-        elif fav.content_type == 'book':
-            try:
-                book = Book.objects.select_related('poet').get(id=fav.object_id)
-                favorite_books.append(book)
-            except Book.DoesNotExist:
-                pass
-        elif fav.content_type == 'poem':
-            try:
-                poem = Poem.objects.select_related('book__poet').get(id=fav.object_id)
-                favorite_poems.append(poem)
-            except Poem.DoesNotExist:
-                pass
+    objects = favorites.hydrate(Favorite.objects.filter(user=request.user).order_by('-created_at'))
     
     context = {
-        'favorite_poets': favorite_poets,
-        'favorite_books': favorite_books,
-        'favorite_poems': favorite_poems,
+        'favorite_poets': objects['poet'],
+        'favorite_books': objects['book'],
+        'favorite_poems': objects['poem'],
     }
     
     return render(request, 'poetry/favorites.html', context)
 
 
+@login_required
+def continue_reading_view(request):
+    """Books the user has started and not finished, most recently read first"""
+    shelf = BookProgress.objects.filter(
+        user=request.user, read_count__lt=F('book__poems_count')
+    ).select_related('book__poet', 'last_poem').order_by('-last_read_at')[:24]
+    
+    return render(request, 'poetry/continue_reading.html', {'shelf': shelf})
+
+
 @login_required
 def reading_history_view(request):
     """User's reading history"""
     history = ReadingHistory.objects.filter(user=request.user).select_related(
         'poem__book__poet'
-    ).order_by('-read_at')
+    )
     
-    paginator = Paginator(history, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pages: no COUNT(*) and no OFFSET scan however far back the user pages
+    paginator = KeysetPaginator(history, 20, ordering=['-read_at', '-id'])
+    page_obj = paginator.get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
-        'total_read': history.count(),
     }
     
     return render(request, 'poetry/reading_history.html', context)
 
 
-@cache_page(60 * 15)  # Cache for 15 minutes
 def statistics_view(request):
     """Site statistics page"""
-    stats = {
-        'total_poets': Poet.objects.count(),
-        'total_books': Book.objects.count(),
-        'total_poems': Poem.objects.count(),
-        'total_views': (
-            (Poet.objects.aggregate(total=Sum('view_count'))['total'] or 0) +
-            (Book.objects.aggregate(total=Sum('view_count'))['total'] or 0) +
-            (Poem.objects.aggregate(total=Sum('view_count'))['total'] or 0)
-        ),
-        'most_viewed_poets': Poet.objects.order_by('-view_count')[:10],
-        'most_viewed_books': Book.objects.select_related('poet').order_by('-view_count')[:10],
-        'most_viewed_poems': Poem.objects.select_related('book__poet').order_by('-view_count')[:10],
-        'recent_additions': {
-            'poets': Poet.objects.order_by('-created_at')[:5],
-            'books': Book.objects.select_related('poet').order_by('-created_at')[:5],
-            'poems': Poem.objects.select_related('book__poet').order_by('-created_at')[:5],
-        }
-    }
-    
+    stats = get_statistics().as_dict()
     return render(request, 'poetry/statistics.html', {'stats': stats})
\ No newline at end of file
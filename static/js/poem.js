@@ -78,4 +78,39 @@ document.addEventListener('DOMContentLoaded', function() {
     if (copyBtn) {
         copyBtn.addEventListener('click', copyToClipboard);
     }
-});
\ No newline at end of file
+
+    // Reading progress: the furthest point of the poem scrolled past,
+    // reported in one request when the page is hidden
+    const poemText = document.querySelector('.poem-text');
+    const poemData = window.poemData || {};
+    if (poemText && poemData.progressUrl) {
+        let progress = 0;
+        let reported = -1;
+        const measure = function() {
+            const rect = poemText.getBoundingClientRect();
+            const seen = (window.innerHeight - rect.top) / Math.max(rect.height, 1);
+            progress = Math.max(progress, Math.min(100, Math.max(0, Math.round(seen * 100))));
+        };
+        const report = function() {
+            if (progress === reported) {
+                return;
+            }
+            reported = progress;
+            fetch(poemData.progressUrl, {
+                method: 'POST',
+                keepalive: true,
+                credentials: 'same-origin',
+                headers: {'Content-Type': 'application/json', 'X-CSRFToken': poemData.csrfToken},
+                body: JSON.stringify({events: [{poem: poemData.id, progress: progress}]})
+            }).catch(function() {});
+        };
+        measure();
+        window.addEventListener('scroll', measure, {passive: true});
+        document.addEventListener('visibilitychange', function() {
+            if (document.visibilityState === 'hidden') {
+                report();
+            }
+        });
+        window.addEventListener('pagehide', report);
+    }
+});
@@ -109,6 +109,32 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     });
+
+    // Search box suggestions
+    document.querySelectorAll('input[data-autocomplete-url]').forEach(input => {
+        const list = document.getElementById(input.getAttribute('list'));
+        let timer = null;
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            const query = input.value.trim();
+            if (!list || !query) {
+                return;
+            }
+            timer = setTimeout(() => {
+                const url = `${input.dataset.autocompleteUrl}?q=${encodeURIComponent(query)}`;
+                fetch(url)
+                    .then(response => response.json())
+                    .then(data => {
+                        list.replaceChildren(...data.results.map(suggestion => {
+                            const option = document.createElement('option');
+                            option.value = suggestion.label;
+                            return option;
+                        }));
+                    })
+                    .catch(() => {});
+            }, 150);
+        });
+    });
 });
 
 // Share functionality